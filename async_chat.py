@@ -0,0 +1,169 @@
+import asyncio
+import sys
+import threading
+import time
+
+from tracing import tracer
+from tts_pipeline import SentenceSplitter
+
+EXIT_COMMANDS = ["종료", "exit", "quit"]
+
+
+class AsyncChatRuntime:
+    """입력, LLM 생성, 음성 합성, 재생을 협력하는 asyncio 태스크로 돌리는 채팅 런타임.
+
+    응답이 재생되는 중에도 입력을 받을 수 있고, 새 메시지가 들어오면(barge-in)
+    진행 중인 생성/합성을 취소하고 대기 중인 오디오를 버린 뒤 cancel_timeout 안에
+    재생을 멈춘다.
+
+    generate: (user_input, session_id) -> 텍스트 조각의 async iterator
+    synthesize: sentence -> 클립 (블로킹, 스레드에서 실행)
+    play: clip -> 재생이 끝날 때까지 블로킹 (스레드에서 실행)
+    flush: 대기 중인 오디오를 버리고 재생을 멈춘다
+    on_input: 입력 한 줄을 받자마자 (이전 응답을 끊기 전에) 읽기 스레드에서 호출된다.
+        컨텍스트 조회처럼 턴 준비 작업을 미리 시작하는 데 쓴다.
+    assembler_factory: 턴마다 ClipAssembler를 만드는 함수 (없거나 None을 돌려주면
+        클립을 그대로 재생). 끊긴 턴의 합성 스레드가 다음 턴의 상태를 건드리지 않도록
+        턴마다 새로 만든다.
+    """
+
+    def __init__(
+        self,
+        generate,
+        synthesize,
+        play,
+        flush,
+        session_id="unique_session_id",
+        name="メガミ",
+        cancel_timeout=0.5,
+        max_pending_audio=2,
+        assembler_factory=None,
+        on_input=None,
+    ):
+        self.generate = generate
+        self.synthesize = synthesize
+        self.play = play
+        self.flush = flush
+        self.session_id = session_id
+        self.name = name
+        self.cancel_timeout = cancel_timeout
+        self.max_pending_audio = max_pending_audio
+        self.assembler_factory = assembler_factory
+        self.on_input = on_input
+
+        self.inputs = asyncio.Queue()
+        self.turn_task = None
+
+    def _start_reader(self, loop):
+        # input()은 이벤트 루프를 막으므로 데몬 스레드에서 한 줄씩 읽어 큐로 넘긴다.
+        # (asyncio.to_thread를 쓰면 종료 시 executor가 readline을 기다리며 멈춘다)
+        def read():
+            try:
+                for line in sys.stdin:
+                    line = line.strip()
+                    if not line:
+                        continue
+                    if self.on_input is not None:
+                        try:
+                            self.on_input(line)
+                        except Exception as e:
+                            print(f"Error: 입력 처리 실패 - {e}")
+                    loop.call_soon_threadsafe(self.inputs.put_nowait, line)
+                loop.call_soon_threadsafe(self.inputs.put_nowait, None)
+            except RuntimeError:
+                pass  # 이벤트 루프가 이미 닫힘
+
+        threading.Thread(target=read, daemon=True).start()
+
+    async def _generate(self, user_input, sentences):
+        splitter = SentenceSplitter()
+        print(f"{self.name}: ", end="", flush=True)
+        try:
+            async for chunk in self.generate(user_input, self.session_id):
+                print(chunk, end="", flush=True)
+                for sentence in splitter.feed(chunk):
+                    await sentences.put(sentence)
+            for sentence in splitter.flush():
+                await sentences.put(sentence)
+        finally:
+            print()
+            await sentences.put(None)
+
+    async def _synthesize(self, sentences, clips):
+        assembler = self.assembler_factory() if self.assembler_factory else None
+        while True:
+            sentence = await sentences.get()
+            if sentence is None:
+                if assembler is not None:
+                    for clip in assembler.flush():
+                        await clips.put(clip)
+                await clips.put(None)
+                return
+            try:
+                clip = await asyncio.to_thread(self.synthesize, sentence)
+            except Exception as e:
+                print(f"Error: 음성 합성 실패 - {e}")
+                continue
+            if assembler is None:
+                await clips.put(clip)
+                continue
+            for part in assembler.process(clip):
+                await clips.put(part)
+
+    async def _play(self, clips, started_at):
+        first = True
+        while True:
+            clip = await clips.get()
+            if clip is None:
+                return
+            if first:
+                first = False
+                elapsed = time.perf_counter() - started_at
+                tracer.event("turn.time_to_first_audio", seconds=round(elapsed, 3))
+            await asyncio.to_thread(self.play, clip)
+
+    async def _turn(self, user_input):
+        sentences = asyncio.Queue()
+        clips = asyncio.Queue(maxsize=self.max_pending_audio)
+        started_at = time.perf_counter()
+        with tracer.turn(self.session_id):
+            await asyncio.gather(
+                self._generate(user_input, sentences),
+                self._synthesize(sentences, clips),
+                self._play(clips, started_at),
+            )
+
+    async def _barge_in(self):
+        """진행 중인 턴을 취소하고 오디오를 비운다."""
+        if self.turn_task is None or self.turn_task.done():
+            return
+        self.turn_task.cancel()
+        # 재생 스레드는 취소할 수 없으므로 오디오를 비워서 play()가 바로 끝나게 한다
+        await asyncio.to_thread(self.flush)
+        try:
+            await asyncio.wait_for(self.turn_task, self.cancel_timeout)
+        except (asyncio.CancelledError, asyncio.TimeoutError):
+            pass
+        except Exception as e:
+            print(f"Error: 이전 응답 취소 중 오류 - {e}")
+        # 취소 직전에 재생 스레드로 넘어간 클립이 있을 수 있으므로 한 번 더 비운다
+        await asyncio.to_thread(self.flush)
+
+    async def run(self):
+        print(f"{self.name}: hello!")
+        self._start_reader(asyncio.get_running_loop())
+        while True:
+            user_input = await self.inputs.get()
+            if user_input is None or user_input.lower() in EXIT_COMMANDS:
+                await self._barge_in()
+                print(f"{self.name}: 안녕히 가세요!")
+                return
+
+            await self._barge_in()
+            self.turn_task = asyncio.create_task(self._turn(user_input))
+            self.turn_task.add_done_callback(self._report_error)
+
+    @staticmethod
+    def _report_error(task):
+        if not task.cancelled() and task.exception() is not None:
+            print(f"Error: 응답 처리 실패 - {task.exception()}")
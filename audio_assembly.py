@@ -0,0 +1,184 @@
+"""합성과 재생 사이에서 문장 클립을 이어 붙이는 오디오 단계.
+
+VOICEVOX 클립마다 붙는 prePhonemeLength/postPhonemeLength 무음과 엔진 자체의
+앞 무음을 에너지 기준으로 잘라 내고, 연속된 클립은 짧은 크로스페이드로 잇고,
+음량을 목표 레벨에 맞춘다. WAV를 다시 인코딩하지 않고 PCM 버퍼를 NumPy로
+한 번에 처리하므로 클립 길이보다 훨씬 빨리 끝난다.
+
+    python audio_assembly.py   # 실시간 대비 처리 속도 측정
+"""
+
+import threading
+import time
+
+import numpy as np
+
+from audio_clip import AudioClip
+
+# 16bit PCM만 처리한다 (VOICEVOX 출력 형식). 다른 형식은 그대로 통과시킨다
+_FULL_SCALE = 32768.0
+
+
+def to_samples(clip):
+    """클립의 PCM을 복사 없이 (프레임, 채널) int16 배열로 본다."""
+    return np.frombuffer(clip.pcm, dtype=np.int16).reshape(-1, clip.channels)
+
+
+def frame_levels(samples, frame):
+    """frame 프레임 단위 RMS 레벨(dBFS) 배열."""
+    count = len(samples) // frame
+    if count == 0:
+        return np.empty(0, dtype=np.float32)
+    blocks = samples[: count * frame].reshape(count, -1).astype(np.float32)
+    blocks /= _FULL_SCALE
+    rms = np.sqrt(np.einsum("ij,ij->i", blocks, blocks) / blocks.shape[1])
+    return 20 * np.log10(np.maximum(rms, 1e-10))
+
+
+def voiced_bounds(samples, rate, threshold_db=-45.0, frame_ms=10, keep_ms=30):
+    """threshold_db보다 큰 구간의 (시작, 끝) 프레임 위치. 전부 무음이면 None.
+
+    자음이 잘리지 않도록 앞뒤로 keep_ms만큼 여유를 남긴다.
+    """
+    frame = max(1, rate * frame_ms // 1000)
+    voiced = np.flatnonzero(frame_levels(samples, frame) > threshold_db)
+    if len(voiced) == 0:
+        return None
+    keep = rate * keep_ms // 1000
+    start = max(0, voiced[0] * frame - keep)
+    end = min(len(samples), (voiced[-1] + 1) * frame + keep)
+    return start, end
+
+
+def loudness_gain(samples, rate, target_dbfs=-20.0, max_gain_db=12.0, frame_ms=10):
+    """말소리 구간의 RMS를 target_dbfs에 맞추는 배율 (클리핑하지 않는 범위로 제한)."""
+    frame = max(1, rate * frame_ms // 1000)
+    levels = frame_levels(samples, frame)
+    voiced = levels[levels > -60.0]
+    if len(voiced) == 0:
+        return 1.0
+    # 프레임별 dB를 파워 평균으로 합친다
+    level = 10 * np.log10(np.mean(10 ** (voiced / 10)))
+    gain_db = min(target_dbfs - level, max_gain_db)
+    peak = int(np.abs(samples).max())
+    if peak > 0:
+        gain_db = min(gain_db, 20 * np.log10(0.98 * _FULL_SCALE / peak))
+    return 10 ** (gain_db / 20)
+
+
+class ClipAssembler:
+    """문장 클립을 무음 없이 이어 재생하도록 다듬는다.
+
+    process()는 다듬은 클립에서 마지막 crossfade_ms를 남겨 두고 나머지를 돌려준다.
+    남긴 꼬리는 다음 클립의 머리와 섞여 나가고, 턴이 끝나면 flush()로 내보낸다.
+    턴을 새로 시작할 때는 reset()으로 이전 턴의 꼬리를 버린다.
+    """
+
+    def __init__(
+        self,
+        threshold_db=-45.0,
+        keep_ms=30,
+        crossfade_ms=15,
+        target_dbfs=-20.0,
+        max_gain_db=12.0,
+    ):
+        self.threshold_db = threshold_db
+        self.keep_ms = keep_ms
+        self.crossfade_ms = crossfade_ms
+        self.target_dbfs = target_dbfs
+        self.max_gain_db = max_gain_db
+
+        self._tail = None  # 아직 내보내지 않은 이전 클립의 끝 (float32)
+        self._format = None  # (channels, rate)
+        self._lock = threading.Lock()
+
+    def _shape(self, clip):
+        samples = to_samples(clip)
+        bounds = voiced_bounds(
+            samples, clip.rate, self.threshold_db, keep_ms=self.keep_ms
+        )
+        if bounds is None:
+            return None
+        samples = samples[bounds[0] : bounds[1]]
+        gain = loudness_gain(samples, clip.rate, self.target_dbfs, self.max_gain_db)
+        return samples.astype(np.float32) * gain
+
+    @staticmethod
+    def _to_clip(samples, channels, rate):
+        pcm = np.clip(np.rint(samples), -_FULL_SCALE, _FULL_SCALE - 1)
+        return AudioClip.from_pcm(pcm.astype(np.int16).tobytes(), 2, channels, rate)
+
+    def _release_tail(self):
+        tail, self._tail = self._tail, None
+        if tail is None or len(tail) == 0:
+            return []
+        return [self._to_clip(tail, *self._format)]
+
+    def process(self, clip):
+        """다듬은 클립 목록을 반환한다 (보통 하나, 재생할 부분이 없으면 빈 목록)."""
+        if clip.sample_width != 2:
+            # 16bit가 아니면 다듬지 않고 남은 꼬리 뒤에 그대로 내보낸다
+            with self._lock:
+                released = self._release_tail()
+                self._format = None
+                return released + [clip]
+
+        samples = self._shape(clip)
+        if samples is None:
+            return []
+        fmt = (clip.channels, clip.rate)
+        with self._lock:
+            released = []
+            if self._format != fmt:
+                # 형식이 바뀌면 섞지 않고 이전 꼬리를 먼저 내보낸다
+                released = self._release_tail()
+                self._format = fmt
+
+            fade = clip.rate * self.crossfade_ms // 1000
+            if self._tail is not None:
+                overlap = min(fade, len(self._tail), len(samples) // 2)
+                # 서로 다른 소리를 섞으므로 등전력(equal-power) 곡선을 쓴다
+                t = np.linspace(0.0, np.pi / 2, overlap, dtype=np.float32)[:, None]
+                head = samples[:overlap] * np.sin(t)
+                head += self._tail[len(self._tail) - overlap :] * np.cos(t)
+                samples = np.concatenate(
+                    [self._tail[: len(self._tail) - overlap], head, samples[overlap:]]
+                )
+
+            hold = min(fade, len(samples))
+            self._tail = samples[len(samples) - hold :]
+            body = samples[: len(samples) - hold]
+            if len(body):
+                released.append(self._to_clip(body, *fmt))
+            return released
+
+    def flush(self):
+        """남겨 둔 마지막 꼬리를 클립 목록으로 반환한다."""
+        with self._lock:
+            return self._release_tail()
+
+    def reset(self):
+        with self._lock:
+            self._tail = None
+            self._format = None
+
+
+def measure(seconds=5.0, rate=24000, repeat=20):
+    """무음이 앞뒤로 붙은 음성 형태의 클립으로 처리 속도를 잰다 (실시간 대비 배수)."""
+    t = np.arange(int(rate * seconds)) / rate
+    voice = 8000 * np.sin(2 * np.pi * 220 * t) * (0.5 + 0.5 * np.sin(2 * np.pi * 3 * t))
+    padding = np.zeros(int(rate * 0.15))
+    pcm = np.concatenate([padding, voice, padding]).astype(np.int16).tobytes()
+    clip = AudioClip.from_pcm(pcm, 2, 1, rate)
+
+    assembler = ClipAssembler()
+    started = time.perf_counter()
+    for _ in range(repeat):
+        assembler.process(clip)
+    assembler.flush()
+    elapsed = (time.perf_counter() - started) / repeat
+    return clip.duration / elapsed
+
+
+if __name__ == "__main__":
+    print(f"실시간 대비 {measure():.0f}배 빠르게 처리")
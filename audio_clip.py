@@ -0,0 +1,75 @@
+import io
+import wave
+
+# 재생 시 한 번에 쓰는 프레임 수 (기존 readframes(1024)와 동일)
+CHUNK_FRAMES = 1024
+
+
+class AudioClip:
+    """VOICEVOX 합성 결과를 디스크에 쓰지 않고 메모리에 들고 있는 클립.
+
+    wav: 원본 WAV 바이트 (winsound.SND_MEMORY 등에서 그대로 사용)
+    pcm: 헤더를 뗀 PCM 데이터의 memoryview (복사 없이 잘라서 재생)
+
+    from_pcm()으로 만든 클립은 wav를 처음 읽을 때 헤더만 붙여 만든다.
+    """
+
+    def __init__(self, wav, pcm, sample_width, channels, rate):
+        self._wav = wav
+        self.pcm = memoryview(pcm)
+        self.sample_width = sample_width
+        self.channels = channels
+        self.rate = rate
+
+    @classmethod
+    def from_wav_bytes(cls, wav):
+        with wave.open(io.BytesIO(wav), "rb") as wav_file:
+            return cls(
+                wav,
+                wav_file.readframes(wav_file.getnframes()),
+                wav_file.getsampwidth(),
+                wav_file.getnchannels(),
+                wav_file.getframerate(),
+            )
+
+    @classmethod
+    def from_pcm(cls, pcm, sample_width=2, channels=1, rate=24000):
+        """WAV로 다시 인코딩하지 않고 PCM 데이터로 바로 클립을 만든다."""
+        return cls(None, pcm, sample_width, channels, rate)
+
+    @classmethod
+    def silence(cls, seconds=0.0, rate=24000, sample_width=2, channels=1):
+        """무음 클립 (기본값은 VOICEVOX 출력 형식: 24kHz 16bit 모노)."""
+        sample = b"\x80" if sample_width == 1 else bytes(sample_width)
+        pcm = sample * (int(rate * seconds) * channels)
+        return cls.from_pcm(pcm, sample_width, channels, rate)
+
+    @property
+    def wav(self):
+        if self._wav is None:
+            buffer = io.BytesIO()
+            with wave.open(buffer, "wb") as wav_file:
+                wav_file.setnchannels(self.channels)
+                wav_file.setsampwidth(self.sample_width)
+                wav_file.setframerate(self.rate)
+                wav_file.writeframes(self.pcm)
+            self._wav = buffer.getvalue()
+        return self._wav
+
+    @property
+    def frame_size(self):
+        return self.sample_width * self.channels
+
+    @property
+    def num_frames(self):
+        return len(self.pcm) // self.frame_size
+
+    @property
+    def duration(self):
+        return self.num_frames / self.rate
+
+    def chunks(self, frames=CHUNK_FRAMES):
+        """PCM 데이터를 frames 단위의 memoryview 조각으로 돌려준다."""
+        step = frames * self.frame_size
+        for start in range(0, len(self.pcm), step):
+            yield self.pcm[start : start + step]
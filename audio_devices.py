@@ -0,0 +1,237 @@
+"""이름으로 오디오 출력 장치를 찾는 레지스트리.
+
+장치 번호는 재부팅할 때마다 바뀔 수 있으므로 "CABLE Input" 같은 이름 패턴으로
+찾고, 찾은 결과(번호, 이름, 포맷 정보)를 디스크에 캐시해 다음 실행 때는 장치
+전체를 다시 훑지 않는다. 캐시된 번호는 처음 쓸 때 그 번호 하나만 조회해서
+이름이 그대로인지 확인하고, 달라졌으면 그때만 다시 찾는다.
+
+    python audio_devices.py list             # 장치 목록 (vb_cable.py와 같은 출력)
+    python audio_devices.py resolve "CABLE Input"
+    python audio_devices.py resolve-input "Microphone"
+    python audio_devices.py refresh          # 캐시를 지우고 다시 찾기
+"""
+
+import json
+import os
+import sys
+import threading
+
+DEFAULT_CACHE_PATH = ".audio_devices.json"
+
+# 역할별 장치 이름 패턴 기본값. VB_CABLE_DEVICE / SPEAKER_DEVICE / MICROPHONE_DEVICE
+# 환경 변수로 덮어쓴다. 빈 값이면 시스템 기본 장치
+DEFAULT_DEVICES = {"vb_cable": "CABLE Input", "speaker": "", "microphone": ""}
+
+# 역할별 방향 (microphone만 입력 장치)
+DEVICE_DIRECTIONS = {"microphone": "input"}
+
+# 방향별로 채널 수를 확인할 장치 정보 키
+_CHANNEL_KEYS = {"output": "maxOutputChannels", "input": "maxInputChannels"}
+
+
+class AudioDeviceError(Exception):
+    pass
+
+
+def device_pattern(role):
+    return os.environ.get(f"{role.upper()}_DEVICE", DEFAULT_DEVICES[role])
+
+
+def _device_entry(info):
+    return {
+        "index": info["index"],
+        "name": info["name"],
+        "max_output_channels": info.get("maxOutputChannels", 0),
+        "max_input_channels": info.get("maxInputChannels", 0),
+        "default_sample_rate": info.get("defaultSampleRate"),
+        "host_api": info.get("hostApi"),
+    }
+
+
+class DeviceRegistry:
+    """이름 패턴 -> 장치 번호를 찾아 주고 결과를 디스크에 캐시한다.
+
+    pa를 주지 않으면 처음 필요할 때 PyAudio를 만든다. 캐시가 맞으면 장치 전체를
+    나열하지 않고 캐시된 번호 하나만 조회한다.
+    """
+
+    def __init__(self, pa=None, cache_path=DEFAULT_CACHE_PATH):
+        self._pa = pa
+        self._owns_pa = pa is None
+        self.cache_path = cache_path
+        self._cache = self._load()
+        self._validated = set()  # 이번 프로세스에서 확인을 마친 패턴
+        self._lock = threading.Lock()
+
+    @property
+    def pa(self):
+        if self._pa is None:
+            import pyaudio
+
+            self._pa = pyaudio.PyAudio()
+        return self._pa
+
+    def _load(self):
+        try:
+            with open(self.cache_path, "r", encoding="utf-8") as file:
+                return json.load(file)
+        except (OSError, ValueError):
+            return {}
+
+    def _save(self):
+        # 쓰다가 중단돼도 깨진 파일이 남지 않도록 임시 파일에 쓴 뒤 교체
+        tmp_path = f"{self.cache_path}.tmp"
+        try:
+            with open(tmp_path, "w", encoding="utf-8") as file:
+                json.dump(self._cache, file, ensure_ascii=False, indent=2)
+            os.replace(tmp_path, self.cache_path)
+        except OSError as e:
+            print(f"Error: 오디오 장치 캐시 저장 실패 - {e}")
+
+    def devices(self):
+        """모든 장치 정보를 나열한다 (느릴 수 있으므로 캐시가 틀렸을 때만 쓴다)."""
+        return [
+            self.pa.get_device_info_by_index(i)
+            for i in range(self.pa.get_device_count())
+        ]
+
+    def _find(self, pattern, direction="output"):
+        needle = pattern.lower()
+        channels = _CHANNEL_KEYS[direction]
+        for info in self.devices():
+            if info.get(channels, 0) > 0 and needle in info["name"].lower():
+                return _device_entry(info)
+        kind = "입력" if direction == "input" else "출력"
+        raise AudioDeviceError(f"'{pattern}' 이름의 {kind} 장치를 찾을 수 없습니다.")
+
+    def _still_valid(self, entry, direction="output"):
+        try:
+            info = self.pa.get_device_info_by_index(entry["index"])
+        except (OSError, IOError):
+            return False
+        channels = _CHANNEL_KEYS[direction]
+        return info["name"] == entry["name"] and info.get(channels, 0) > 0
+
+    def resolve(self, pattern, direction="output"):
+        """pattern이 이름에 들어간 장치 번호. 빈 값이면 None(기본 장치)."""
+        entry = self.lookup(pattern, direction)
+        return None if entry is None else entry["index"]
+
+    def resolve_or_default(self, pattern, direction="output"):
+        """resolve()와 같지만 장치가 없으면 경고를 출력하고 None(기본 장치)을 반환한다."""
+        try:
+            return self.resolve(pattern, direction)
+        except AudioDeviceError as e:
+            print(f"Error: {e} 기본 장치를 사용합니다.")
+            return None
+
+    def lookup(self, pattern, direction="output"):
+        """pattern에 맞는 장치의 캐시 항목 (번호, 이름, 채널 수, 기본 샘플레이트)."""
+        if not pattern:
+            return None
+        # 출력 장치는 예전 캐시와 호환되도록 패턴을 그대로 키로 쓴다
+        key = pattern if direction == "output" else f"{direction}:{pattern}"
+        with self._lock:
+            entry = self._cache.get(key)
+            if entry is not None and key in self._validated:
+                return entry
+            if entry is None or not self._still_valid(entry, direction):
+                entry = self._find(pattern, direction)
+                self._cache[key] = entry
+                self._save()
+            self._validated.add(key)
+            return entry
+
+    def supports(self, device, rate=24000, sample_width=2, channels=1):
+        """출력 장치 번호가 해당 포맷을 열 수 있는지. 결과는 장치 항목과 함께 캐시된다.
+
+        PyAudioSink가 스트림을 열기 전에 부른다. 기본 장치(None)나 이 레지스트리로
+        찾지 않은 장치는 확인하지 않는다 (PyAudio가 알아서 변환한다).
+        """
+        if device is None:
+            return True
+        with self._lock:
+            entry = next(
+                (
+                    entry
+                    for entry in self._cache.values()
+                    if entry.get("index") == device
+                    and entry.get("max_output_channels", 0) > 0
+                ),
+                None,
+            )
+            if entry is None:
+                return True
+            formats = entry.setdefault("formats", {})
+            key = f"{rate}/{sample_width}/{channels}"
+            if key in formats:
+                return formats[key]
+        try:
+            supported = self.pa.is_format_supported(
+                rate,
+                output_device=device,
+                output_channels=channels,
+                output_format=self.pa.get_format_from_width(sample_width),
+            )
+        except ValueError:
+            supported = False
+        with self._lock:
+            formats[key] = supported
+            self._save()
+        return supported
+
+    def invalidate(self, pattern=None):
+        """캐시를 버린다. 장치가 열리지 않을 때 다음 resolve()에서 다시 찾게 한다."""
+        with self._lock:
+            if pattern is None:
+                self._cache.clear()
+                self._validated.clear()
+            else:
+                self._cache.pop(pattern, None)
+                self._validated.discard(pattern)
+            self._save()
+
+    def close(self):
+        if self._owns_pa and self._pa is not None:
+            self._pa.terminate()
+            self._pa = None
+
+
+def print_devices(registry):
+    for info in registry.devices():
+        # 입력 채널이 있으면 마이크 같은 입력 장치
+        kind = "입력" if info.get("maxInputChannels", 0) > 0 else "출력"
+        print(f"{kind}: {info['name']} , Device Index: {info['index']}")
+
+
+def main(argv=None):
+    argv = sys.argv[1:] if argv is None else argv
+    command = argv[0] if argv else "list"
+    registry = DeviceRegistry()
+    try:
+        if command == "list":
+            print_devices(registry)
+        elif command == "resolve" and len(argv) > 1:
+            print(json.dumps(registry.lookup(argv[1]), ensure_ascii=False))
+        elif command == "resolve-input" and len(argv) > 1:
+            entry = registry.lookup(argv[1], "input")
+            print(json.dumps(entry, ensure_ascii=False))
+        elif command == "refresh":
+            registry.invalidate()
+            for role in DEFAULT_DEVICES:
+                direction = DEVICE_DIRECTIONS.get(role, "output")
+                entry = registry.lookup(device_pattern(role), direction)
+                print(f"{role}: {json.dumps(entry, ensure_ascii=False)}")
+        else:
+            print(__doc__)
+            return 1
+    except AudioDeviceError as e:
+        print(f"Error: {e}")
+        return 1
+    finally:
+        registry.close()
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
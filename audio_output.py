@@ -0,0 +1,170 @@
+import queue
+import threading
+import time
+
+import pyaudio
+
+from tracing import tracer
+
+# 장치가 사라졌을 때 스트림을 다시 여는 최대 횟수와 대기 시간(초)
+MAX_REOPEN_ATTEMPTS = 5
+REOPEN_BACKOFF = 0.2
+
+_STOP = object()
+
+
+class _EmptyClip:
+    """flush() 후 재생 스레드가 대기 상태로 돌아왔는지 확인하기 위한 빈 클립."""
+
+    @staticmethod
+    def chunks():
+        return iter(())
+
+
+class _DeviceStream:
+    """(장치, 샘플레이트, 샘플 폭, 채널) 하나에 대해 열어 둔 출력 스트림과 재생 큐."""
+
+    def __init__(self, pa, key):
+        self.pa = pa
+        self.key = key
+        self.stream = None
+        self.queue = queue.Queue()
+        self.abort = threading.Event()
+        self.thread = threading.Thread(target=self._run, daemon=True)
+        self.thread.start()
+
+    def _open(self):
+        device, rate, width, channels = self.key
+        with tracer.span("audio.open_device", device=device):
+            self.stream = self.pa.open(
+                format=self.pa.get_format_from_width(width),
+                channels=channels,
+                rate=rate,
+                output_device_index=device,
+                output=True,
+            )
+
+    def _close_stream(self):
+        if self.stream is None:
+            return
+        try:
+            self.stream.stop_stream()
+            self.stream.close()
+        except Exception:
+            pass
+        self.stream = None
+
+    def _reopen(self):
+        """장치가 사라지거나 에러가 나면 스트림을 닫고 백오프하며 다시 연다."""
+        self._close_stream()
+        for attempt in range(MAX_REOPEN_ATTEMPTS):
+            time.sleep(REOPEN_BACKOFF * (2**attempt))
+            try:
+                self._open()
+                return
+            except Exception as e:
+                print(f"Error: 오디오 장치 재연결 실패 ({attempt + 1}) - {e}")
+        raise OSError(f"오디오 장치를 다시 열 수 없습니다: {self.key}")
+
+    def _write(self, clip):
+        if self.stream is None:
+            self._open()
+        for data in clip.chunks():
+            if self.abort.is_set():
+                return
+            try:
+                self.stream.write(data)
+            except OSError:
+                self._reopen()
+                self.stream.write(data)
+
+    def _run(self):
+        while True:
+            item = self.queue.get()
+            if item is _STOP:
+                break
+            clip, done = item
+            try:
+                if not self.abort.is_set():
+                    self._write(clip)
+            except Exception as e:
+                print(f"Error: 오디오 재생 실패 - {e}")
+            finally:
+                done.set()
+        self._close_stream()
+
+    def flush(self):
+        """대기 중인 클립을 버리고 재생 중인 클립을 멈춘다."""
+        self.abort.set()
+        while True:
+            try:
+                item = self.queue.get_nowait()
+            except queue.Empty:
+                break
+            if item is _STOP:
+                # 종료 중이면 재생 스레드가 표식을 받지 않으므로 기다리지 않는다
+                self.queue.put(item)
+                return
+            item[1].set()
+        # 재생 스레드가 현재 클립을 빠져나간 뒤 다시 받기 시작
+        marker = threading.Event()
+        self.queue.put((_EmptyClip, marker))
+        # stop()과 겹쳐 재생 스레드가 먼저 끝났으면 표식은 처리되지 않는다
+        while not marker.wait(0.1):
+            if not self.thread.is_alive():
+                break
+        self.abort.clear()
+
+    def stop(self):
+        self.queue.put(_STOP)
+        self.thread.join()
+
+
+class AudioOutputManager:
+    """PyAudio를 한 번만 초기화하고 출력 스트림을 열어 둔 채로 재사용하는 관리자.
+
+    클립은 장치별 큐로 들어가므로 연속된 문장이 장치 준비 시간 없이 이어서 재생된다.
+    """
+
+    def __init__(self):
+        self.pa = pyaudio.PyAudio()
+        self._streams = {}
+        self._lock = threading.Lock()
+        self._closed = False
+
+    def _get_stream(self, clip, device):
+        key = (device, clip.rate, clip.sample_width, clip.channels)
+        with self._lock:
+            if self._closed:
+                raise RuntimeError("AudioOutputManager가 이미 종료되었습니다.")
+            if key not in self._streams:
+                self._streams[key] = _DeviceStream(self.pa, key)
+            return self._streams[key]
+
+    def play(self, clip, device=None):
+        """클립을 재생 큐에 넣고, 재생이 끝나면 set 되는 Event를 반환한다."""
+        done = threading.Event()
+        self._get_stream(clip, device).queue.put((clip, done))
+        return done
+
+    def play_sync(self, clip, device=None):
+        self.play(clip, device).wait()
+
+    def flush(self, device=None):
+        """큐에 쌓인 오디오를 버리고 재생을 멈춘다. device가 None이면 모든 장치."""
+        with self._lock:
+            streams = list(self._streams.values())
+        for stream in streams:
+            if device is None or stream.key[0] == device:
+                stream.flush()
+
+    def close(self):
+        with self._lock:
+            if self._closed:
+                return
+            self._closed = True
+            streams = list(self._streams.values())
+            self._streams.clear()
+        for stream in streams:
+            stream.stop()
+        self.pa.terminate()
@@ -0,0 +1,413 @@
+import queue
+import threading
+import time
+import wave
+
+import numpy as np
+
+from audio_clip import AudioClip
+from tracing import tracer
+
+_STOP = object()
+
+# 장치가 사라졌을 때 스트림을 다시 여는 최대 횟수와 대기 시간(초) (audio_output과 같은 값)
+MAX_REOPEN_ATTEMPTS = 5
+REOPEN_BACKOFF = 0.2
+
+# 샘플 폭(바이트) -> numpy dtype (볼륨 적용용)
+_DTYPES = {1: np.uint8, 2: np.int16, 4: np.int32}
+
+
+class RingBuffer:
+    """고정 크기 bytearray 위의 스레드 안전한 링 버퍼.
+
+    출력에서는 feeder 스레드가 write 하고 PyAudio 콜백이 read 한다.
+    입력(voice_input)에서는 반대로 콜백이 write 하고 VAD 스레드가 read 한다.
+    total_read는 지금까지 재생된 바이트 수로, 클립 재생 완료 판정에 쓴다.
+    """
+
+    def __init__(self, capacity):
+        self._buf = bytearray(capacity)
+        self._capacity = capacity
+        self._read_pos = 0
+        self._size = 0
+        self.total_written = 0
+        self.total_read = 0
+        self.cond = threading.Condition()
+
+    @property
+    def free(self):
+        return self._capacity - self._size
+
+    @property
+    def empty(self):
+        return self._size == 0
+
+    def write(self, data, timeout=None):
+        """data를 모두 쓸 때까지 공간이 나기를 기다리며 쓴다. 쓴 바이트 수를 반환."""
+        data = memoryview(data).cast("B")
+        written = 0
+        with self.cond:
+            while written < len(data):
+                if self.free == 0:
+                    if not self.cond.wait(timeout):
+                        break
+                    continue
+                n = min(len(data) - written, self.free)
+                start = (self._read_pos + self._size) % self._capacity
+                first = min(n, self._capacity - start)
+                self._buf[start : start + first] = data[written : written + first]
+                self._buf[0 : n - first] = data[written + first : written + n]
+                self._size += n
+                self.total_written += n
+                written += n
+            self.cond.notify_all()
+        return written
+
+    def wait_readable(self, n, timeout=None):
+        """n바이트 이상 쌓일 때까지 기다린다 (입력 캡처용). 쌓였으면 True."""
+        with self.cond:
+            return self.cond.wait_for(lambda: self._size >= n, timeout)
+
+    def read(self, n):
+        with self.cond:
+            n = min(n, self._size)
+            first = min(n, self._capacity - self._read_pos)
+            out = bytes(self._buf[self._read_pos : self._read_pos + first])
+            out += bytes(self._buf[0 : n - first])
+            self._read_pos = (self._read_pos + n) % self._capacity
+            self._size -= n
+            self.total_read += n
+            self.cond.notify_all()
+        return out
+
+    def clear(self):
+        with self.cond:
+            self.total_read += self._size
+            self._read_pos = 0
+            self._size = 0
+            self.cond.notify_all()
+
+
+def apply_volume(data, sample_width, volume):
+    if volume == 1.0 or sample_width not in _DTYPES:
+        return data
+    dtype = _DTYPES[sample_width]
+    samples = np.frombuffer(data, dtype=dtype).astype(np.float32)
+    if dtype is np.uint8:
+        samples = (samples - 128.0) * volume + 128.0
+    else:
+        samples *= volume
+    info = np.iinfo(dtype)
+    return np.clip(samples, info.min, info.max).astype(dtype).tobytes()
+
+
+class Sink:
+    """라우터 출력 하나. 각 싱크는 자기 feeder 스레드를 가지므로 한 싱크가 멈춰도 다른 싱크는 계속 재생된다."""
+
+    def __init__(self, name, volume=1.0, latency=0.0):
+        self.name = name
+        self.volume = volume
+        self.latency = latency  # 초 단위 지연 보정 (느린 장치에 맞추기 위해 앞에 넣는 무음)
+        self.generation = 0  # flush() 때마다 증가, 진행 중인 클립 쓰기를 중단시킨다
+        self.queue = queue.Queue()
+        self.thread = threading.Thread(target=self._run, daemon=True)
+        self.thread.start()
+
+    def submit(self, clip):
+        done = threading.Event()
+        self.queue.put((clip, done))
+        return done
+
+    def _run(self):
+        while True:
+            item = self.queue.get()
+            if item is _STOP:
+                break
+            clip, done = item
+            try:
+                self.consume(clip, done)
+            except Exception as e:
+                print(f"Error: [{self.name}] 오디오 출력 실패 - {e}")
+                done.set()
+        self.shutdown()
+
+    def consume(self, clip, done):
+        raise NotImplementedError
+
+    def flush(self):
+        self.generation += 1
+        while True:
+            try:
+                item = self.queue.get_nowait()
+            except queue.Empty:
+                break
+            if item is _STOP:
+                self.queue.put(item)
+                break
+            item[1].set()
+
+    def shutdown(self):
+        pass
+
+    def close(self):
+        self.queue.put(_STOP)
+        self.thread.join()
+
+
+class PyAudioSink(Sink):
+    """PyAudio 콜백 모드 출력. 콜백은 링 버퍼에서 읽고, 비어 있으면 무음을 채운다.
+
+    pyaudio는 스트림을 처음 열 때 불러오므로, 이 모듈은 PortAudio가 없는
+    환경(벤치마크, 헤드리스 실행)에서도 NullSink/FileSink와 함께 쓸 수 있다.
+
+    supports(device, rate, sample_width, channels)를 주면 (DeviceRegistry.supports)
+    스트림을 열기 전에 장치가 그 포맷을 받는지 캐시된 결과로 확인한다.
+
+    콜백이 stall_timeout초 동안 링 버퍼를 읽지 않거나 스트림이 멈추면 장치가
+    사라진 것으로 보고 백오프하며 스트림을 다시 연다 (버퍼 내용은 그대로 이어 재생).
+    """
+
+    def __init__(
+        self,
+        pa,
+        device=None,
+        name=None,
+        volume=1.0,
+        latency=0.0,
+        buffer_seconds=1.0,
+        supports=None,
+        stall_timeout=2.0,
+    ):
+        self.pa = pa
+        self.device = device
+        self.supports = supports
+        self.buffer_seconds = buffer_seconds
+        self.stall_timeout = stall_timeout
+        self.stream = None
+        self.format = None
+        self.ring = None
+        self._continue = None  # pyaudio.paContinue (스트림을 열 때 채운다)
+        self._starved = True  # 링 버퍼가 바닥나 무음을 채운 적이 있는지
+        self._last_callback = 0.0  # 콜백이 마지막으로 불린 시각 (장치 멈춤 감지)
+        self._pending = []  # (재생 완료 위치, Event)
+        super().__init__(name or f"device {device}", volume, latency)
+
+    def _callback(self, in_data, frame_count, time_info, status):
+        self._last_callback = time.monotonic()
+        frame_size = self.format[1] * self.format[2]
+        want = frame_count * frame_size
+        data = self.ring.read(want)
+        starved = len(data) < want
+        if starved:
+            silence = b"\x80" if self.format[1] == 1 else b"\x00"
+            data += silence * (want - len(data))
+
+        # 재생 위치가 클립 끝을 지났으면 완료 통지
+        with self.ring.cond:
+            if starved:
+                self._starved = True
+            while self._pending and self.ring.total_read >= self._pending[0][0]:
+                self._pending.pop(0)[1].set()
+        return (data, self._continue)
+
+    def _open(self, clip):
+        fmt = (clip.rate, clip.sample_width, clip.channels)
+        if self.stream is not None and self.format == fmt:
+            return
+        self.shutdown()
+
+        if self.supports is not None and not self.supports(self.device, *fmt):
+            raise ValueError(
+                f"{fmt[0]}Hz/{fmt[1] * 8}bit/{fmt[2]}ch 포맷은 "
+                f"장치 {self.device}에서 지원하지 않습니다."
+            )
+        self.format = fmt
+        frame_size = clip.sample_width * clip.channels
+        self.ring = RingBuffer(int(clip.rate * self.buffer_seconds) * frame_size)
+        self._starved = True
+        self._start_stream()
+
+    def _start_stream(self):
+        import pyaudio
+
+        self._continue = pyaudio.paContinue
+        rate, sample_width, channels = self.format
+        with tracer.span("audio.open_device", device=self.device):
+            self.stream = self.pa.open(
+                format=self.pa.get_format_from_width(sample_width),
+                channels=channels,
+                rate=rate,
+                output_device_index=self.device,
+                output=True,
+                stream_callback=self._callback,
+            )
+        self._last_callback = time.monotonic()
+        self.stream.start_stream()
+
+    def _close_stream(self):
+        if self.stream is None:
+            return
+        try:
+            self.stream.stop_stream()
+            self.stream.close()
+        except Exception:
+            pass
+        self.stream = None
+
+    def _reopen(self):
+        """장치가 멈추거나 사라지면 스트림을 닫고 백오프하며 다시 연다."""
+        self._close_stream()
+        for attempt in range(MAX_REOPEN_ATTEMPTS):
+            time.sleep(REOPEN_BACKOFF * (2**attempt))
+            try:
+                self._start_stream()
+                return
+            except Exception as e:
+                print(f"Error: [{self.name}] 오디오 장치 재연결 실패 ({attempt + 1}) - {e}")
+        # 다음 클립에서 처음부터 다시 열도록 하고, 기다리는 쪽은 풀어 준다
+        self.shutdown()
+        raise OSError(f"오디오 장치를 다시 열 수 없습니다: {self.name}")
+
+    def _write(self, data):
+        view = memoryview(data)
+        while view:
+            written = self.ring.write(view, timeout=self.stall_timeout)
+            view = view[written:]
+            if view:
+                # 콜백이 버퍼를 읽어 가지 않는다 = 장치가 멈췄거나 사라졌다
+                print(f"Error: [{self.name}] 오디오 장치가 응답하지 않아 다시 엽니다.")
+                self._reopen()
+
+    def _stalled(self):
+        # 스트림이 돌고 있으면 버퍼가 비어 있어도 콜백은 계속 불린다
+        if not self.stream.is_active():
+            return True
+        return time.monotonic() - self._last_callback > self.stall_timeout
+
+    def consume(self, clip, done):
+        self._open(clip)
+        if self._stalled():
+            print(f"Error: [{self.name}] 오디오 장치가 멈춰 있어 다시 엽니다.")
+            self._reopen()
+        generation = self.generation
+        # 지연 보정: 이 싱크만 앞에 무음을 넣어 다른 장치와 재생 시점을 맞춘다.
+        # 버퍼가 바닥났으면 (스트림을 막 열었거나 클립 사이 언더런) 보정이 사라졌으므로
+        # 클립마다 다시 넣는다
+        with self.ring.cond:
+            starved, self._starved = self._starved, False
+        if self.latency > 0 and starved:
+            frame_size = clip.sample_width * clip.channels
+            self._write(bytes(int(clip.rate * self.latency) * frame_size))
+        for data in clip.chunks():
+            if generation != self.generation:
+                break
+            self._write(apply_volume(data, clip.sample_width, self.volume))
+        with self.ring.cond:
+            self._pending.append((self.ring.total_written, done))
+
+    def flush(self):
+        super().flush()
+        if self.ring is not None:
+            self.ring.clear()
+            with self.ring.cond:
+                while self._pending:
+                    self._pending.pop(0)[1].set()
+
+    def shutdown(self):
+        if self.stream is not None:
+            # 남은 오디오가 재생될 때까지 기다린 뒤 닫는다
+            with self.ring.cond:
+                self.ring.cond.wait_for(lambda: self.ring.empty, 5)
+            self._close_stream()
+        for _, done in self._pending:
+            done.set()
+        self._pending = []
+
+
+class FileSink(Sink):
+    """라우터로 들어온 오디오를 WAV 파일로 기록하는 레코더 싱크."""
+
+    def __init__(self, path, name=None, volume=1.0):
+        self.path = path
+        self.wav_file = None
+        super().__init__(name or path, volume)
+
+    def consume(self, clip, done):
+        if self.wav_file is None:
+            self.wav_file = wave.open(self.path, "wb")
+            self.wav_file.setnchannels(clip.channels)
+            self.wav_file.setsampwidth(clip.sample_width)
+            self.wav_file.setframerate(clip.rate)
+        self.wav_file.writeframes(
+            apply_volume(clip.pcm, clip.sample_width, self.volume)
+        )
+        done.set()
+
+    def shutdown(self):
+        if self.wav_file is not None:
+            self.wav_file.close()
+            self.wav_file = None
+
+
+class NullSink(Sink):
+    """오디오를 버리는 싱크 (벤치마크/헤드리스 실행용).
+
+    realtime=True면 실제 장치처럼 클립 길이만큼 기다렸다가 완료를 알린다.
+    """
+
+    def __init__(self, name="null", realtime=False):
+        self.realtime = realtime
+        super().__init__(name)
+
+    def consume(self, clip, done):
+        if self.realtime:
+            generation = self.generation
+            deadline = time.perf_counter() + clip.duration
+            # flush()되면 남은 시간을 기다리지 않고 끝낸다
+            while generation == self.generation:
+                remaining = deadline - time.perf_counter()
+                if remaining <= 0:
+                    break
+                time.sleep(min(remaining, 0.05))
+        done.set()
+
+
+class AudioRouter:
+    """디코딩된 클립 하나를 여러 싱크로 동시에 내보내는 라우터.
+
+    play_sync()는 클립 길이 + stall_timeout초까지만 기다리므로 멈춘 장치 하나가
+    대화 전체를 막지 않는다.
+    """
+
+    def __init__(self, sinks, stall_timeout=5.0):
+        self.sinks = list(sinks)
+        self.stall_timeout = stall_timeout
+
+    def add_sink(self, sink):
+        self.sinks.append(sink)
+
+    def play(self, clip):
+        """모든 싱크에 클립을 넣고, 싱크별 재생 완료 Event 목록을 반환한다."""
+        return [sink.submit(clip) for sink in self.sinks]
+
+    def play_sync(self, clip):
+        timeout = clip.duration + self.stall_timeout
+        deadline = time.monotonic() + timeout
+        for sink, done in zip(self.sinks, self.play(clip)):
+            if not done.wait(max(0, deadline - time.monotonic())):
+                # 밀린 오디오를 버려서 다음 클립이 뒤에 쌓이지 않게 한다
+                print(f"Error: [{sink.name}] {timeout:.1f}초 안에 재생이 끝나지 않았습니다.")
+                sink.flush()
+
+    def prepare(self, rate=24000, sample_width=2, channels=1):
+        """빈 클립을 보내 각 싱크의 장치 스트림을 미리 열어 둔다. 완료 Event 목록을 반환."""
+        return self.play(AudioClip.silence(0.0, rate, sample_width, channels))
+
+    def flush(self):
+        for sink in self.sinks:
+            sink.flush()
+
+    def close(self):
+        for sink in self.sinks:
+            sink.close()
@@ -0,0 +1,236 @@
+"""로컬 스텁 서버로 응답 파이프라인의 지연 시간을 재는 오프라인 벤치마크.
+
+OpenAI 키나 VOICEVOX 도커 컨테이너 없이 실행된다.
+
+    python benchmark.py --lengths 40,120,400 --concurrency 1,4 --turns 5
+    python benchmark.py --json result.json
+    python benchmark.py --baseline result.json --tolerance 0.2  # 회귀 시 종료 코드 1
+"""
+
+import argparse
+import json
+import os
+import sys
+import tempfile
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+from audio_router import AudioRouter, NullSink
+from stub_servers import StubOpenAIServer, StubVoicevoxServer
+from tts_pipeline import speak_streaming
+
+# 벤치마크 중에는 OpenAI 예산 대기가 없도록 run.py의 기본 한도 대신 쓰는 값
+BENCH_LIMITS = {"OPENAI_RPM": "100000", "OPENAI_TPM": "100000000"}
+BENCH_INPUT = "今日の予定を教えて"
+METRICS = ("ttft", "ttfa", "e2e")
+
+
+def percentile(values, p):
+    """선형 보간 백분위수 (p는 0~100)."""
+    values = sorted(values)
+    if not values:
+        return None
+    position = (len(values) - 1) * p / 100
+    lower = int(position)
+    upper = min(lower + 1, len(values) - 1)
+    return values[lower] + (values[upper] - values[lower]) * (position - lower)
+
+
+class PipelineBenchmark:
+    """run.py가 실제로 쓰는 구성 요소로 스트리밍 턴을 스텁 서버에 대고 돌린다.
+
+    구성 요소는 run.load_components()로 만들므로 LLMScheduler, HistoryManager,
+    PronunciationConverter, TTSCache, ClipAssembler를 모두 거친다. 환경 변수로
+    스텁 서버와 임시 세션 DB/합성 캐시 디렉터리를 가리키게 한 뒤 불러온다.
+
+    재생은 턴마다 NullSink 라우터로 보내므로 오디오 장치(pyaudio)가 필요 없다.
+    realtime=True면 클립 길이만큼 재생 시간을 흉내 내서 end-to-end 시간에 포함시킨다.
+    """
+
+    def __init__(self, llm_server, tts_server, realtime=False):
+        self.llm_server = llm_server
+        self.realtime = realtime
+        self.workdir = tempfile.TemporaryDirectory(prefix="benchmark-")
+
+        os.environ.update(
+            OPENAI_API_KEY="stub",
+            OPENAI_BASE_URL=llm_server.base_url,
+            VOICEVOX_HOST=tts_server.host,
+            VOICEVOX_PORT=str(tts_server.port),
+            SESSION_DB_PATH=os.path.join(self.workdir.name, "sessions.db"),
+            TTS_CACHE_DIR=os.path.join(self.workdir.name, "tts_cache"),
+        )
+        # 예산 대기 시간이 측정값에 섞이지 않도록 한도를 넉넉히 (직접 지정하면 그 값)
+        for name, value in BENCH_LIMITS.items():
+            os.environ.setdefault(name, value)
+
+        import run
+
+        self.app = run
+        # 동시 세션이 서로의 재생을 기다리지 않도록 라우터는 턴마다 따로 만든다
+        run.load_components(sinks=[])
+
+    def run_turn(self, user_input, session_id):
+        """한 턴을 실행하고 {ttft, ttfa, e2e} 초 단위 측정값을 반환한다."""
+        router = AudioRouter([NullSink(realtime=self.realtime)])
+        first_token_at = None
+
+        def on_text(chunk):
+            nonlocal first_token_at
+            if first_token_at is None:
+                first_token_at = time.perf_counter()
+
+        started_at = time.perf_counter()
+        try:
+            _, time_to_first_audio = speak_streaming(
+                self.app.generate_response_stream(user_input, session_id),
+                self.app.synthesize_sentence,
+                router.play_sync,
+                on_text=on_text,
+                assembler=self.app.new_clip_assembler(),
+            )
+        finally:
+            router.close()
+        finished_at = time.perf_counter()
+
+        return {
+            "ttft": None if first_token_at is None else first_token_at - started_at,
+            "ttfa": time_to_first_audio,
+            "e2e": finished_at - started_at,
+        }
+
+    def run_scenario(self, reply_chars, concurrency, turns, warmup=1):
+        """동시 세션 concurrency개가 각각 turns턴씩 대화할 때의 측정값 목록."""
+        self.llm_server.reply_chars = reply_chars
+
+        def session(worker):
+            session_id = f"bench-{reply_chars}-{concurrency}-{worker}"
+            for _ in range(warmup):
+                self.run_turn(BENCH_INPUT, session_id)
+            return [self.run_turn(BENCH_INPUT, session_id) for _ in range(turns)]
+
+        with ThreadPoolExecutor(max_workers=concurrency) as executor:
+            results = executor.map(session, range(concurrency))
+            return [sample for samples in results for sample in samples]
+
+    def close(self):
+        try:
+            self.app.shutdown()
+        finally:
+            self.workdir.cleanup()
+
+
+def summarize(samples):
+    summary = {"n": len(samples)}
+    for metric in METRICS:
+        values = [s[metric] for s in samples if s[metric] is not None]
+        summary[metric] = {"p50": percentile(values, 50), "p95": percentile(values, 95)}
+    return summary
+
+
+def _format_seconds(value):
+    return "     -" if value is None else f"{value:6.3f}"
+
+
+def print_report(results):
+    print(
+        f"{'chars':>6} {'conc':>5} {'n':>4} | "
+        + " | ".join(f"{metric + ' p50':>10} {'p95':>6}" for metric in METRICS)
+    )
+    for result in results:
+        cells = " | ".join(
+            f"{_format_seconds(result[metric]['p50']):>10} "
+            f"{_format_seconds(result[metric]['p95']):>6}"
+            for metric in METRICS
+        )
+        print(
+            f"{result['reply_chars']:>6} {result['concurrency']:>5} "
+            f"{result['n']:>4} | {cells}"
+        )
+
+
+def find_regressions(results, baseline, tolerance):
+    """baseline보다 p95가 tolerance(비율) 넘게 느려진 항목 목록."""
+    previous = {
+        (item["reply_chars"], item["concurrency"]): item for item in baseline
+    }
+    regressions = []
+    for result in results:
+        before = previous.get((result["reply_chars"], result["concurrency"]))
+        if before is None:
+            continue
+        for metric in METRICS:
+            old, new = before[metric]["p95"], result[metric]["p95"]
+            if old is not None and new is not None and new > old * (1 + tolerance):
+                regressions.append(
+                    f"{metric} p95 (chars={result['reply_chars']}, "
+                    f"concurrency={result['concurrency']}): {old:.3f}s -> {new:.3f}s"
+                )
+    return regressions
+
+
+def _int_list(text):
+    return [int(value) for value in text.split(",") if value]
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--lengths", type=_int_list, default=[40, 120, 400])
+    parser.add_argument("--concurrency", type=_int_list, default=[1, 4])
+    parser.add_argument("--turns", type=int, default=5, help="세션당 측정 턴 수")
+    parser.add_argument("--warmup", type=int, default=1, help="세션당 버리는 턴 수")
+    parser.add_argument("--first-token-latency", type=float, default=0.3)
+    parser.add_argument("--token-interval", type=float, default=0.02)
+    parser.add_argument("--query-latency", type=float, default=0.02)
+    parser.add_argument("--synthesis-latency", type=float, default=0.1)
+    parser.add_argument("--wav-seconds", type=float, default=1.0)
+    parser.add_argument("--realtime", action="store_true", help="재생 시간을 흉내 낸다")
+    parser.add_argument("--json", help="결과를 JSON 파일로 저장")
+    parser.add_argument("--baseline", help="비교할 이전 결과 JSON 파일")
+    parser.add_argument("--tolerance", type=float, default=0.2)
+    args = parser.parse_args(argv)
+
+    llm_server = StubOpenAIServer(
+        first_token_latency=args.first_token_latency,
+        token_interval=args.token_interval,
+    ).start()
+    tts_server = StubVoicevoxServer(
+        query_latency=args.query_latency,
+        synthesis_latency=args.synthesis_latency,
+        wav_seconds=args.wav_seconds,
+    ).start()
+    benchmark = PipelineBenchmark(llm_server, tts_server, realtime=args.realtime)
+
+    results = []
+    try:
+        for reply_chars in args.lengths:
+            for concurrency in args.concurrency:
+                samples = benchmark.run_scenario(
+                    reply_chars, concurrency, args.turns, args.warmup
+                )
+                result = summarize(samples)
+                result.update(reply_chars=reply_chars, concurrency=concurrency)
+                results.append(result)
+    finally:
+        benchmark.close()
+        llm_server.close()
+        tts_server.close()
+
+    print_report(results)
+
+    if args.json:
+        with open(args.json, "w", encoding="utf-8") as file:
+            json.dump(results, file, indent=2)
+
+    if args.baseline:
+        with open(args.baseline, "r", encoding="utf-8") as file:
+            regressions = find_regressions(results, json.load(file), args.tolerance)
+        for regression in regressions:
+            print(f"회귀: {regression}")
+        if regressions:
+            return 1
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,105 @@
+import bisect
+import threading
+import time
+from datetime import datetime, timedelta
+
+from dateutil import parser
+from pytz import timezone
+
+from tracing import tracer
+
+SEOUL = timezone("Asia/Seoul")
+
+
+class EventIndex:
+    """캘린더 이벤트를 시간순으로 정렬해 두고 bisect로 조회하는 인덱스.
+
+    타임스탬프는 데이터를 받아올 때 한 번만 파싱해 Asia/Seoul 시간으로 바꿔 둔다.
+    ttl이 지나면 다음 조회 때 백그라운드 스레드에서 새로 받아 오고,
+    그동안에는 이전 데이터로 바로 응답한다 (최초 한 번만 로드를 기다린다).
+    """
+
+    def __init__(self, fetch, ttl=300, tz=SEOUL):
+        self.fetch = fetch
+        self.ttl = ttl
+        self.tz = tz
+
+        self._snapshot = ([], [])  # (정렬된 시각, 같은 순서의 이벤트)
+        self._loaded_at = None
+        self._refreshing = False
+        self._closed = False
+        self._thread = None  # 진행 중인 갱신 스레드
+        self._lock = threading.Lock()
+        self._loaded = threading.Event()
+
+    def _build(self, events):
+        parsed = []
+        for event in events:
+            try:
+                event_time = parser.isoparse(event["time"]).astimezone(self.tz)
+            except Exception as e:
+                print(f"이벤트 시간 파싱 에러: {e}")
+                continue
+            parsed.append((event_time, event))
+        parsed.sort(key=lambda item: item[0])
+        return [t for t, _ in parsed], [e for _, e in parsed]
+
+    def refresh(self):
+        try:
+            with tracer.span("calendar.fetch"):
+                times, events = self._build(self.fetch())
+        except Exception as e:
+            print(f"Google Calendar API 호출 중 에러 발생: {e}")
+            times, events = None, None
+
+        with self._lock:
+            if times is not None:
+                # 스냅샷을 통째로 교체하므로 조회 중인 쪽은 이전 스냅샷을 계속 쓴다
+                self._snapshot = (times, events)
+            self._loaded_at = time.monotonic()
+            self._refreshing = False
+        self._loaded.set()
+
+    def _ensure_fresh(self, wait=True):
+        with self._lock:
+            stale = (
+                self._loaded_at is None
+                or time.monotonic() - self._loaded_at > self.ttl
+            )
+            start = stale and not self._refreshing and not self._closed
+            if start:
+                self._refreshing = True
+                self._thread = threading.Thread(target=self.refresh, daemon=True)
+        if start:
+            self._thread.start()
+        if wait and not self._loaded.is_set():
+            self._loaded.wait()
+        return self._snapshot
+
+    def start(self):
+        """시작할 때 백그라운드에서 미리 불러 둔다."""
+        self._ensure_fresh(wait=False)
+        return self
+
+    def close(self, timeout=5.0):
+        """새 갱신을 시작하지 않고, 진행 중인 갱신이 끝나기를 기다린다."""
+        with self._lock:
+            self._closed = True
+            thread = self._thread
+        if thread is not None:
+            thread.join(timeout)
+        self._loaded.set()  # 처음 로드를 기다리던 조회는 빈 결과로 끝낸다
+
+    def next_upcoming(self, now=None):
+        """now 이후 가장 가까운 이벤트 (없으면 None)."""
+        times, events = self._ensure_fresh()
+        now = now or datetime.now(self.tz)
+        index = bisect.bisect_right(times, now)
+        return events[index] if index < len(events) else None
+
+    def on_date(self, date):
+        """Asia/Seoul 기준으로 date 날짜에 있는 이벤트 목록."""
+        times, events = self._ensure_fresh()
+        start = self.tz.localize(datetime.combine(date, datetime.min.time()))
+        end = start + timedelta(days=1)
+        return events[bisect.bisect_left(times, start) : bisect.bisect_left(times, end)]
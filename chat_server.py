@@ -0,0 +1,380 @@
+"""여러 클라이언트(방송 오버레이, 디스코드 브리지 등)를 한 프로세스에서 받는 채팅 서버.
+
+    python run.py --serve   # CHAT_SERVER_HOST / CHAT_SERVER_PORT (기본 127.0.0.1:8080)
+
+WebSocket  GET /ws?session=<id>   (session이 없으면 연결마다 새 세션)
+    보내기  {"type": "message", "text": "..."}
+    받기    {"type": "text", "delta": "..."}         토큰이 도착하는 대로
+            {"type": "audio", "index": n, "format": "wav"}  바로 다음 바이너리 프레임이 WAV
+            {"type": "done", "text": "전체 응답"}
+            {"type": "error", "message": "..."}
+
+HTTP       POST /chat  {"session_id": "...", "text": "..."}
+    같은 메시지를 한 줄에 하나씩 JSON으로 스트리밍한다 (audio는 "data"에 base64 WAV).
+HTTP       GET /health
+"""
+
+import asyncio
+import base64
+import collections
+import contextvars
+import json
+import time
+import uuid
+from concurrent.futures import ThreadPoolExecutor
+
+from aiohttp import WSMsgType, web
+
+from tracing import tracer
+from tts_pipeline import SentenceSplitter
+
+
+class RequestLimiter:
+    """LLM 요청의 동시 실행 수와 분당 요청 수를 제한한다."""
+
+    def __init__(self, max_concurrency=4, requests_per_minute=None):
+        self.requests_per_minute = requests_per_minute
+        self._semaphore = asyncio.Semaphore(max_concurrency)
+        self._started = collections.deque()  # 최근 1분 동안 요청을 시작한 시각
+        self._lock = asyncio.Lock()
+
+    async def _wait_for_rate(self):
+        if not self.requests_per_minute:
+            return
+        async with self._lock:
+            while True:
+                now = time.monotonic()
+                while self._started and now - self._started[0] >= 60:
+                    self._started.popleft()
+                if len(self._started) < self.requests_per_minute:
+                    self._started.append(now)
+                    return
+                await asyncio.sleep(60 - (now - self._started[0]))
+
+    async def __aenter__(self):
+        await self._semaphore.acquire()
+        try:
+            await self._wait_for_rate()
+        except BaseException:
+            self._semaphore.release()
+            raise
+        return self
+
+    async def __aexit__(self, exc_type, exc, tb):
+        self._semaphore.release()
+        return False
+
+
+class FairSynthesisQueue:
+    """모든 세션이 공유하는 음성 합성 큐.
+
+    세션마다 따로 줄을 세우고 워커가 세션을 돌아가며 하나씩 꺼내므로, 한 세션의
+    긴 응답이 다른 세션의 첫 문장을 막지 않는다. 세션당 처리 중인 문장 수는
+    max_pending_per_session, 전체 대기 수는 maxsize로 제한되어 넘치면 submit()이
+    자리가 날 때까지 기다린다.
+
+    synthesize: sentence -> 클립 (블로킹, 워커 스레드에서 실행)
+    """
+
+    def __init__(self, synthesize, workers=2, maxsize=32, max_pending_per_session=4):
+        self.synthesize = synthesize
+        self.workers = workers
+        self.maxsize = maxsize
+        self.max_pending_per_session = max_pending_per_session
+
+        self._queues = collections.OrderedDict()  # session_id -> deque (순서 = 차례)
+        self._pending = collections.Counter()  # 세션별 대기 + 합성 중인 문장 수
+        self._size = 0
+        self._condition = None
+        self._tasks = []
+        self.executor = ThreadPoolExecutor(
+            max_workers=workers, thread_name_prefix="synthesis"
+        )
+
+    def start(self):
+        self._condition = asyncio.Condition()
+        self._tasks = [asyncio.create_task(self._worker()) for _ in range(self.workers)]
+        return self
+
+    def _has_room(self, session_id):
+        return (
+            self._size < self.maxsize
+            and self._pending[session_id] < self.max_pending_per_session
+        )
+
+    async def submit(self, session_id, sentence):
+        """합성 작업을 넣고, 결과 클립이 담길 Future를 반환한다."""
+        future = asyncio.get_running_loop().create_future()
+        # 워커 스레드의 span도 요청한 세션의 턴에 묶이도록 컨텍스트를 함께 넣는다
+        item = (sentence, future, contextvars.copy_context())
+        async with self._condition:
+            await self._condition.wait_for(lambda: self._has_room(session_id))
+            self._queues.setdefault(session_id, collections.deque()).append(item)
+            self._pending[session_id] += 1
+            self._size += 1
+            self._condition.notify_all()
+        return future
+
+    async def _next(self):
+        async with self._condition:
+            await self._condition.wait_for(lambda: self._size > 0)
+            session_id, queue = self._queues.popitem(last=False)
+            item = queue.popleft()
+            if queue:
+                self._queues[session_id] = queue  # 맨 뒤로 보내 다음 세션에 차례를 넘긴다
+            self._size -= 1
+            return session_id, item
+
+    async def _done(self, session_id):
+        async with self._condition:
+            self._pending[session_id] -= 1
+            if self._pending[session_id] <= 0:
+                del self._pending[session_id]
+            self._condition.notify_all()
+
+    async def _worker(self):
+        loop = asyncio.get_running_loop()
+        while True:
+            session_id, (sentence, future, context) = await self._next()
+            try:
+                if not future.cancelled():
+                    clip = await loop.run_in_executor(
+                        self.executor, context.run, self.synthesize, sentence
+                    )
+                    if not future.cancelled():
+                        future.set_result(clip)
+            except Exception as e:
+                if not future.cancelled():
+                    future.set_exception(e)
+            finally:
+                await self._done(session_id)
+
+    async def cancel(self, session_id):
+        """연결이 끊긴 세션의 대기 중인 작업을 버린다."""
+        async with self._condition:
+            queue = self._queues.pop(session_id, None) or ()
+            for _, future, _ in queue:
+                future.cancel()
+            self._size -= len(queue)
+            self._pending[session_id] -= len(queue)
+            if self._pending[session_id] <= 0:
+                del self._pending[session_id]
+            self._condition.notify_all()
+
+    def qsize(self):
+        return self._size
+
+    async def close(self):
+        for task in self._tasks:
+            task.cancel()
+        await asyncio.gather(*self._tasks, return_exceptions=True)
+        self.executor.shutdown(wait=False, cancel_futures=True)
+
+
+class ChatServer:
+    """generate()와 세션 스토어를 감싸서 여러 연결을 동시에 처리하는 서버.
+
+    generate: (user_input, session_id) -> 텍스트 조각의 async iterator
+    synthesize: sentence -> AudioClip (블로킹)
+    on_startup / on_cleanup: 서버의 이벤트 루프 안에서 실행할 coroutine 함수.
+        on_startup은 기다리지 않고 백그라운드로 돌린다 (비동기 클라이언트 사전 연결 등).
+
+    LLM 호출은 RequestLimiter 아래에서 동시에 돌고, 합성은 FairSynthesisQueue
+    하나를 모든 세션이 나눠 쓴다. 생성은 합성을 기다리지 않으므로 합성이 밀려도
+    LLM 자리를 붙잡고 있지 않는다.
+    """
+
+    def __init__(
+        self,
+        generate,
+        synthesize,
+        llm_concurrency=4,
+        requests_per_minute=None,
+        synthesis_workers=2,
+        synthesis_queue_size=32,
+        max_pending_per_session=4,
+        on_startup=None,
+        on_cleanup=None,
+    ):
+        self.generate = generate
+        self.synthesize = synthesize
+        self.llm_concurrency = llm_concurrency
+        self.requests_per_minute = requests_per_minute
+        self.synthesis_workers = synthesis_workers
+        self.synthesis_queue_size = synthesis_queue_size
+        self.max_pending_per_session = max_pending_per_session
+        self.on_startup = on_startup
+        self.on_cleanup = on_cleanup
+
+        self.limiter = None
+        self.synthesis = None
+        self._startup_task = None
+        self.sessions = set()  # 현재 연결된 세션
+
+        self.app = web.Application()
+        self.app.router.add_get("/ws", self.handle_websocket)
+        self.app.router.add_post("/chat", self.handle_chat)
+        self.app.router.add_get("/health", self.handle_health)
+        self.app.on_startup.append(self._on_startup)
+        self.app.on_cleanup.append(self._on_cleanup)
+
+    async def _on_startup(self, app):
+        # asyncio 객체는 서버의 이벤트 루프 안에서 만든다
+        self.limiter = RequestLimiter(self.llm_concurrency, self.requests_per_minute)
+        self.synthesis = FairSynthesisQueue(
+            self.synthesize,
+            workers=self.synthesis_workers,
+            maxsize=self.synthesis_queue_size,
+            max_pending_per_session=self.max_pending_per_session,
+        ).start()
+        if self.on_startup is not None:
+            self._startup_task = asyncio.create_task(self.on_startup())
+
+    async def _on_cleanup(self, app):
+        if self._startup_task is not None:
+            self._startup_task.cancel()
+        await self.synthesis.close()
+        if self.on_cleanup is not None:
+            await self.on_cleanup()
+
+    async def _generate(self, user_input, session_id, sentences, send):
+        splitter = SentenceSplitter()
+        collected = []
+        try:
+            async with self.limiter:
+                async for chunk in self.generate(user_input, session_id):
+                    collected.append(chunk)
+                    await send({"type": "text", "delta": chunk})
+                    for sentence in splitter.feed(chunk):
+                        sentences.put_nowait(sentence)
+            for sentence in splitter.flush():
+                sentences.put_nowait(sentence)
+        finally:
+            sentences.put_nowait(None)
+        return "".join(collected)
+
+    async def _submit(self, session_id, sentences, clips):
+        try:
+            while True:
+                sentence = await sentences.get()
+                if sentence is None:
+                    return
+                await clips.put(await self.synthesis.submit(session_id, sentence))
+        finally:
+            await clips.put(None)
+
+    async def _send_audio(self, clips, send):
+        index = 0
+        while True:
+            future = await clips.get()
+            if future is None:
+                return
+            try:
+                clip = await future
+            except Exception as e:
+                print(f"Error: 음성 합성 실패 - {e}")
+                continue
+            await send({"type": "audio", "index": index, "format": "wav"}, clip.wav)
+            index += 1
+
+    async def turn(self, user_input, session_id, send):
+        """한 턴을 처리한다. send(message, audio=None)로 텍스트 조각과 오디오를 보낸다."""
+        sentences = asyncio.Queue()
+        clips = asyncio.Queue()
+        with tracer.turn(session_id):
+            tasks = [
+                asyncio.ensure_future(coroutine)
+                for coroutine in (
+                    self._generate(user_input, session_id, sentences, send),
+                    self._submit(session_id, sentences, clips),
+                    self._send_audio(clips, send),
+                )
+            ]
+            try:
+                text, _, _ = await asyncio.gather(*tasks)
+            except BaseException:
+                # 연결이 끊기면 나머지 단계도 멈추고 대기 중인 합성을 버린다
+                for task in tasks:
+                    task.cancel()
+                await self.synthesis.cancel(session_id)
+                raise
+        await send({"type": "done", "text": text})
+
+    async def handle_websocket(self, request):
+        ws = web.WebSocketResponse(heartbeat=30)
+        await ws.prepare(request)
+        session_id = request.query.get("session") or uuid.uuid4().hex
+        lock = asyncio.Lock()
+
+        async def send(message, audio=None):
+            # 오디오 헤더와 바이너리 프레임 사이에 다른 메시지가 끼지 않게 한다
+            async with lock:
+                await ws.send_json(message)
+                if audio is not None:
+                    await ws.send_bytes(audio)
+
+        self.sessions.add(session_id)
+        await send({"type": "session", "session_id": session_id})
+        try:
+            async for msg in ws:
+                if msg.type != WSMsgType.TEXT:
+                    continue
+                try:
+                    text = json.loads(msg.data).get("text", "").strip()
+                except (ValueError, AttributeError):
+                    await send({"type": "error", "message": "JSON이 아닙니다."})
+                    continue
+                if not text:
+                    continue
+                try:
+                    await self.turn(text, session_id, send)
+                except ConnectionError:
+                    break
+                except Exception as e:
+                    print(f"Error: 응답 처리 실패 ({session_id}) - {e}")
+                    await send({"type": "error", "message": str(e)})
+        finally:
+            self.sessions.discard(session_id)
+            await self.synthesis.cancel(session_id)
+        return ws
+
+    async def handle_chat(self, request):
+        try:
+            body = await request.json()
+            text = body["text"].strip()
+        except (ValueError, KeyError, AttributeError):
+            raise web.HTTPBadRequest(text='{"text": "..."} 형식의 JSON이 필요합니다.')
+        session_id = body.get("session_id") or uuid.uuid4().hex
+
+        response = web.StreamResponse(
+            headers={"Content-Type": "application/x-ndjson; charset=utf-8"}
+        )
+        await response.prepare(request)
+
+        async def send(message, audio=None):
+            if audio is not None:
+                message = dict(message, data=base64.b64encode(audio).decode("ascii"))
+            line = json.dumps(message, ensure_ascii=False) + "\n"
+            await response.write(line.encode("utf-8"))
+
+        await send({"type": "session", "session_id": session_id})
+        try:
+            await self.turn(text, session_id, send)
+        except ConnectionError:
+            return response
+        except Exception as e:
+            print(f"Error: 응답 처리 실패 ({session_id}) - {e}")
+            await send({"type": "error", "message": str(e)})
+        await response.write_eof()
+        return response
+
+    async def handle_health(self, request):
+        return web.json_response(
+            {
+                "sessions": len(self.sessions),
+                "synthesis_queue": self.synthesis.qsize(),
+            }
+        )
+
+    def run(self, host="127.0.0.1", port=8080):
+        web.run_app(self.app, host=host, port=port, print=None)
@@ -0,0 +1,105 @@
+import contextvars
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from concurrent.futures import TimeoutError as FutureTimeoutError
+
+from tracing import tracer
+
+
+class ContextProvider:
+    """system 프롬프트에 덧붙일 컨텍스트를 만드는 공급자.
+
+    fetch(user_input) -> 문자열 (없으면 None)
+    """
+
+    def __init__(self, name, fetch, keywords=None, trigger=None, deadline=1.0):
+        self.name = name
+        self.fetch = fetch
+        self.keywords = keywords or []
+        self.trigger = trigger
+        self.deadline = deadline  # 초. 이 시간 안에 못 끝내면 이번 턴에서는 건너뛴다
+
+    def matches(self, text):
+        if self.trigger is not None:
+            return self.trigger(text)
+        return any(keyword in text for keyword in self.keywords)
+
+
+class ContextPipeline:
+    """등록된 공급자를 스레드 풀에서 동시에 실행해 컨텍스트를 모은다.
+
+    입력을 받자마자 observe()를 부르면 트리거가 맞는 공급자의 fetch를 바로 시작하고,
+    같은 입력으로 gather()를 부를 때 그 결과를 그대로 쓴다. 그 사이의 작업(명령 처리,
+    이전 응답 끊기 등)과 조회가 겹친다. gather()는 공급자별 deadline까지만 기다리므로
+    느린 공급자가 턴을 붙잡지 못한다.
+    """
+
+    def __init__(self, max_workers=4):
+        self.providers = []
+        self.executor = ThreadPoolExecutor(
+            max_workers=max_workers, thread_name_prefix="context"
+        )
+        self._observed = None  # (입력, {공급자: Future}) observe()가 시작한 조회
+        self._lock = threading.Lock()
+
+    def register(self, name, fetch, **options):
+        self.providers.append(ContextProvider(name, fetch, **options))
+
+    def _submit(self, user_input):
+        return {
+            provider: self.executor.submit(
+                contextvars.copy_context().run, provider.fetch, user_input
+            )
+            for provider in self.providers
+            if provider.matches(user_input)
+        }
+
+    def observe(self, user_input):
+        """트리거가 맞는 공급자의 fetch를 미리 시작한다 (기다리지 않는다)."""
+        with self._lock:
+            if self._observed is not None:
+                if self._observed[0] == user_input:
+                    return
+                # 쓰이지 않은 이전 입력의 조회는 아직 시작 전이면 취소
+                for future in self._observed[1].values():
+                    future.cancel()
+            self._observed = (user_input, self._submit(user_input))
+
+    def _take_observed(self, user_input):
+        with self._lock:
+            observed, self._observed = self._observed, None
+        if observed is not None and observed[0] == user_input:
+            return observed[1]
+        if observed is not None:
+            for future in observed[1].values():
+                future.cancel()
+        return None
+
+    def gather(self, user_input):
+        """트리거가 맞는 공급자를 동시에 실행해 {이름: 컨텍스트}를 반환한다.
+
+        observe()로 이미 시작한 조회가 있으면 새로 실행하지 않고 그 결과를 기다린다.
+        """
+        started = time.monotonic()
+        futures = self._take_observed(user_input)
+        if futures is None:
+            futures = self._submit(user_input)
+
+        contexts = {}
+        for provider, future in futures.items():
+            remaining = provider.deadline - (time.monotonic() - started)
+            try:
+                result = future.result(timeout=max(remaining, 0))
+            except FutureTimeoutError:
+                tracer.event("context.timeout", provider=provider.name)
+                continue
+            except Exception as e:
+                print(f"Error: context provider '{provider.name}' 실패 - {e}")
+                continue
+            if result:
+                contexts[provider.name] = result
+        return contexts
+
+    def close(self):
+        self.executor.shutdown(wait=False, cancel_futures=True)
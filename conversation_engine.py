@@ -0,0 +1,273 @@
+import asyncio
+
+import httpx
+from langchain_openai import ChatOpenAI
+from langchain_core.prompts import ChatPromptTemplate, MessagesPlaceholder
+from langchain_core.runnables.history import RunnableWithMessageHistory
+
+from history_manager import count_tokens
+from llm_scheduler import BACKGROUND, INTERACTIVE
+from tracing import tracer
+
+# 샘플링 기본값.
+# top_k는 OpenAI Chat Completions API에 존재하지 않는 파라미터라서 넘기지 않는다.
+DEFAULT_SAMPLING = {"temperature": 1.0, "top_p": 1.0}
+
+
+def build_prompt(system_prompt=None):
+    """대화 프롬프트 템플릿. system_prompt를 주면 그 내용을 미리 채워 둔다.
+
+    system 프롬프트는 변수로 넘겨서, 파일 내용의 { } 가 템플릿으로 해석되지 않게 한다.
+    """
+    prompt = ChatPromptTemplate.from_messages(
+        [
+            ("system", "{system_prompt}"),
+            MessagesPlaceholder(variable_name="history"),
+            ("human", "{question}"),
+        ]
+    )
+    if system_prompt is None:
+        return prompt
+    return prompt.partial(system_prompt=system_prompt)
+
+
+class ConversationEngine:
+    """ChatOpenAI 클라이언트, HTTP 커넥션 풀, 프롬프트를 한 번만 만들어 재사용하는 대화 엔진.
+
+    매 턴마다 클라이언트/체인을 새로 만들던 generate_response()의 준비 비용과
+    새 TLS 핸드셰이크를 없앤다. 세션이 달라도 같은 체인을 공유한다.
+
+    호출마다 persona(personas.Persona)를 주면 그 페르소나의 미리 만든 프롬프트와
+    샘플링 값으로 응답한다. 페르소나별 체인은 처음 쓸 때 한 번 만들어 재사용한다.
+
+    scheduler(llm_scheduler.LLMScheduler)를 주면 모든 호출이 RPM/TPM 예산과
+    우선순위를 거쳐 나가고, 429/5xx 재시도도 스케줄러가 맡는다.
+    """
+
+    def __init__(
+        self,
+        api_key,
+        system_prompt,
+        get_session_history,
+        model_name="gpt-4",
+        temperature=DEFAULT_SAMPLING["temperature"],
+        top_p=DEFAULT_SAMPLING["top_p"],
+        max_connections=10,
+        timeout=60.0,
+        base_url=None,
+        scheduler=None,
+        completion_tokens=500,
+    ):
+        self.system_prompt = system_prompt
+        self.get_session_history = get_session_history
+        self.scheduler = scheduler
+        self.completion_tokens = completion_tokens  # 예산 계산용 응답 토큰 예약분
+
+        # keep-alive 커넥션 풀: 두 번째 턴부터는 TLS 핸드셰이크 없이 요청이 나간다
+        limits = httpx.Limits(
+            max_connections=max_connections,
+            max_keepalive_connections=max_connections,
+        )
+        self.http_client = httpx.Client(limits=limits, timeout=timeout)
+        self.http_async_client = httpx.AsyncClient(limits=limits, timeout=timeout)
+
+        # 스케줄러가 백오프 재시도를 맡으므로 클라이언트 자체 재시도는 끈다
+        retry_options = {} if scheduler is None else {"max_retries": 0}
+
+        # temperature/top_p를 클라이언트에 명시적으로 넘겨야 요청에 실제로 반영된다
+        self.llm = ChatOpenAI(
+            openai_api_key=api_key,
+            model_name=model_name,
+            temperature=temperature,
+            top_p=top_p,
+            openai_api_base=base_url,  # None이면 기본 OpenAI 엔드포인트
+            http_client=self.http_client,
+            http_async_client=self.http_async_client,
+            stream_usage=True,  # 스트림 마지막 조각에 실제 토큰 사용량을 받는다
+            **retry_options,
+        )
+
+        self.prompt = build_prompt()
+        self.chain_with_memory = self._with_memory(self.prompt | self.llm)
+        self._persona_chains = {}  # 페르소나 이름 -> (version, 체인)
+
+    def _with_memory(self, runnable):
+        return RunnableWithMessageHistory(
+            runnable,
+            self.get_session_history,
+            input_messages_key="question",
+            history_messages_key="history",
+        )
+
+    def _chain(self, persona):
+        if persona is None:
+            return self.chain_with_memory
+        cached = self._persona_chains.get(persona.name)
+        if cached is not None and cached[0] == persona.version:
+            return cached[1]
+        # 파일이 바뀌어 version이 올라간 경우에만 다시 만든다
+        llm = self.llm.bind(**persona.sampling) if persona.sampling else self.llm
+        chain = self._with_memory(persona.prompt_template | llm)
+        self._persona_chains[persona.name] = (persona.version, chain)
+        return chain
+
+    def _system_prompt(self, system_prompt, persona):
+        if system_prompt:
+            return system_prompt
+        return persona.prompt if persona is not None else self.system_prompt
+
+    def _inputs(self, user_input, system_prompt, persona):
+        inputs = {"question": user_input}
+        # 페르소나 템플릿에는 system 프롬프트가 이미 채워져 있다
+        if system_prompt or persona is None:
+            inputs["system_prompt"] = self._system_prompt(system_prompt, persona)
+        return inputs
+
+    @staticmethod
+    def _config(session_id):
+        return {"configurable": {"session_id": session_id}}
+
+    def estimate_tokens(self, user_input, session_id, system_prompt=None, persona=None):
+        """이번 턴의 예상 토큰 수 (system 프롬프트 + 기록 + 질문 + 응답 예약분)."""
+        history = self.get_session_history(session_id).messages
+        text = "".join(
+            [self._system_prompt(system_prompt, persona), user_input]
+            + [str(message.content) for message in history]
+        )
+        return count_tokens(text) + self.completion_tokens
+
+    @staticmethod
+    def _usage(response):
+        return (getattr(response, "usage_metadata", None) or {}).get("total_tokens")
+
+    def _stream_usage(self, estimated):
+        """스트림 조각마다 지금까지 쓴 토큰 수를 돌려주는 함수를 만든다.
+
+        마지막 조각의 usage_metadata가 있으면 그 값을, 없으면 (usage를 보내지 않는
+        호환 서버) 프롬프트 추정치 + 받은 조각의 토큰 수를 쓴다. 스트림이 끝나면
+        스케줄러가 이 값으로 응답 예약분 중 쓰지 않은 몫을 돌려받는다.
+        """
+        counted = estimated - self.completion_tokens
+
+        def usage(chunk):
+            nonlocal counted
+            reported = self._usage(chunk)
+            if reported:
+                return reported
+            if chunk.content:
+                counted += count_tokens(str(chunk.content))
+            return counted
+
+        return usage
+
+    def invoke(self, user_input, session_id, system_prompt=None, persona=None):
+        """전체 응답 텍스트를 반환한다. system_prompt를 주면 이번 턴에만 대신 사용한다."""
+
+        def call():
+            return self._chain(persona).invoke(
+                self._inputs(user_input, system_prompt, persona),
+                config=self._config(session_id),
+            )
+
+        with tracer.span("llm.invoke"):
+            if self.scheduler is None:
+                response = call()
+            else:
+                tokens = self.estimate_tokens(
+                    user_input, session_id, system_prompt, persona
+                )
+                response = self.scheduler.run(
+                    call, INTERACTIVE, tokens, usage=self._usage
+                )
+        return response.content
+
+    def stream(self, user_input, session_id, system_prompt=None, persona=None):
+        """토큰이 도착하는 대로 텍스트 조각을 돌려준다."""
+
+        def chunks():
+            return self._chain(persona).stream(
+                self._inputs(user_input, system_prompt, persona),
+                config=self._config(session_id),
+            )
+
+        if self.scheduler is not None:
+            tokens = self.estimate_tokens(
+                user_input, session_id, system_prompt, persona
+            )
+            scheduled = self.scheduler.stream(
+                chunks, INTERACTIVE, tokens, usage=self._stream_usage(tokens)
+            )
+        else:
+            scheduled = chunks()
+
+        with tracer.span("llm.stream") as span:
+            for chunk in scheduled:
+                if chunk.content:
+                    span.mark("first_token")
+                    yield chunk.content
+
+    async def astream(self, user_input, session_id, system_prompt=None, persona=None):
+        """stream()의 asyncio 버전. 태스크가 취소되면 HTTP 요청도 함께 끊긴다."""
+
+        def chunks():
+            return self._chain(persona).astream(
+                self._inputs(user_input, system_prompt, persona),
+                config=self._config(session_id),
+            )
+
+        if self.scheduler is not None:
+            tokens = self.estimate_tokens(
+                user_input, session_id, system_prompt, persona
+            )
+            scheduled = self.scheduler.astream(
+                chunks, INTERACTIVE, tokens, usage=self._stream_usage(tokens)
+            )
+        else:
+            scheduled = chunks()
+
+        with tracer.span("llm.stream") as span:
+            async for chunk in scheduled:
+                if chunk.content:
+                    span.mark("first_token")
+                    yield chunk.content
+
+    def background(self, fn, tokens=0, key=None):
+        """요약, 발음 조회 같은 뒷작업 LLM 호출 fn(llm)을 낮은 우선순위로 실행한다.
+
+        같은 key의 요청이 이미 진행 중이면 새로 보내지 않고 그 결과를 같이 받는다.
+        """
+        if self.scheduler is None:
+            return fn(self.llm)
+        return self.scheduler.run(lambda: fn(self.llm), BACKGROUND, tokens, key=key)
+
+    def _models_request(self):
+        # 클라이언트가 실제로 쓰는 주소 (openai_api_base, OPENAI_BASE_URL, 기본값 순)
+        base_url = str(self.llm.root_client.base_url).rstrip("/")
+        api_key = self.llm.openai_api_key.get_secret_value()
+        return f"{base_url}/models", {"Authorization": f"Bearer {api_key}"}
+
+    def warm_up(self):
+        """LLM 엔드포인트에 미리 연결해 둔다 (첫 턴의 DNS 조회와 TLS 핸드셰이크 제거).
+
+        응답 내용은 쓰지 않는다. 커넥션이 풀에 남아 첫 요청이 재사용한다.
+        """
+        url, headers = self._models_request()
+        self.http_client.get(url, headers=headers)
+
+    async def awarm_up(self):
+        """warm_up()의 asyncio 버전. stream()이 아니라 astream()을 쓰는 경로용.
+
+        비동기 커넥션은 이벤트 루프에 묶이므로 그 경로가 도는 루프 안에서 호출한다.
+        """
+        url, headers = self._models_request()
+        await self.http_async_client.get(url, headers=headers)
+
+    async def aclose(self):
+        """비동기 HTTP 클라이언트를 그 클라이언트를 쓴 이벤트 루프 안에서 닫는다."""
+        await self.http_async_client.aclose()
+
+    def close(self):
+        self.http_client.close()
+        # asyncio 경로는 aclose()로 먼저 닫는다. 쓰지 않았으면 여기서 닫는다
+        if not self.http_async_client.is_closed:
+            asyncio.run(self.http_async_client.aclose())
@@ -0,0 +1,205 @@
+import threading
+from collections import OrderedDict
+from concurrent.futures import ThreadPoolExecutor
+
+from langchain_core.chat_history import BaseChatMessageHistory
+from langchain_core.messages import HumanMessage, SystemMessage
+
+try:
+    import tiktoken
+
+    _encoding = tiktoken.get_encoding("cl100k_base")
+except Exception:  # tiktoken이 없으면 대략적인 추정치로 대체
+    _encoding = None
+
+
+SUMMARY_PROMPT = (
+    "다음은 지금까지의 대화 요약과 그 이후의 대화입니다. "
+    "중요한 사실, 사용자 정보, 약속을 빠짐없이 담아 하나의 짧은 요약으로 갱신하세요.\n\n"
+    "[기존 요약]\n{summary}\n\n[대화]\n{conversation}"
+)
+
+
+def count_tokens(text):
+    if _encoding is not None:
+        return len(_encoding.encode(text))
+    # 일본어/한국어는 대략 UTF-8 3바이트 = 1토큰
+    return max(1, len(text.encode("utf-8")) // 3)
+
+
+def summarize_messages(llm, summary, messages):
+    """기존 요약과 밀려난 메시지들을 합쳐 새 요약을 만든다."""
+    conversation = "\n".join(f"{m.type}: {m.content}" for m in messages)
+    prompt = SUMMARY_PROMPT.format(
+        summary=summary or "(없음)", conversation=conversation
+    )
+    return llm.invoke([HumanMessage(content=prompt)]).content
+
+
+class TokenBudgetHistory(BaseChatMessageHistory):
+    """프롬프트에 들어가는 history를 토큰 예산 안으로 유지하는 대화 기록.
+
+    메시지별 토큰 수는 추가할 때 한 번만 세어 캐시한다. 예산을 넘으면 오래된
+    메시지를 창에서 빼고, 백그라운드에서 실행되는 요약에 넘긴다. 요약은
+    SystemMessage 하나로 history 맨 앞에 붙는다.
+
+    backing을 주면 (예: SQLiteSessionStore의 기록) 처음 메시지를 거기서 읽고,
+    추가되는 메시지도 함께 저장한다. 요약도 backing에 저장해 두었다가 다시 읽을 때
+    이어서 쓰므로, 재시작하거나 세션이 LRU로 내려가도 이미 요약한 메시지를 다시
+    요약하지 않는다.
+    """
+
+    def __init__(self, max_tokens, summarize=None, executor=None, backing=None):
+        self.max_tokens = max_tokens
+        self.summarize = summarize
+        self.executor = executor
+        self.backing = backing
+
+        self._window = []  # (메시지, 토큰 수)
+        self._window_tokens = 0
+        self._summary = ""
+        self._summary_tokens = 0
+        self._summarized = 0  # 요약에 들어간 메시지 수 (세션 처음부터 센다)
+        self._pending = []  # 요약되기를 기다리는 메시지
+        self._summarizing = False
+        self._lock = threading.Lock()
+
+        if backing is not None:
+            self._summary, covered = backing.load_summary()
+            self._summary_tokens = count_tokens(self._summary) if self._summary else 0
+            # 창 앞쪽의 읽지 못한 메시지는 요약에 들어간 것으로 친다
+            self._summarized = max(covered, backing.offset)
+            self._append(backing.messages[self._summarized - backing.offset :])
+
+    @property
+    def messages(self):
+        with self._lock:
+            window = [message for message, _ in self._window]
+            if not self._summary:
+                return window
+            summary = SystemMessage(content=f"지금까지의 대화 요약: {self._summary}")
+            return [summary] + window
+
+    @property
+    def total_tokens(self):
+        return self._window_tokens + self._summary_tokens
+
+    def add_message(self, message):
+        self.add_messages([message])
+
+    def add_messages(self, messages):
+        if self.backing is not None:
+            self.backing.add_messages(messages)
+        self._append(messages)
+
+    def _append(self, messages):
+        with self._lock:
+            for message in messages:
+                tokens = count_tokens(message.content)
+                self._window.append((message, tokens))
+                self._window_tokens += tokens
+            self._trim()
+        self._schedule_summary()
+
+    def _trim(self):
+        # 최근 메시지 하나는 항상 남긴다
+        while len(self._window) > 1 and self.total_tokens > self.max_tokens:
+            message, tokens = self._window.pop(0)
+            self._window_tokens -= tokens
+            self._pending.append(message)
+
+    def _schedule_summary(self):
+        with self._lock:
+            if self.summarize is None:
+                self._pending.clear()  # 요약기가 없으면 밀려난 메시지는 버린다
+                return
+            if self._summarizing or not self._pending:
+                return
+            self._summarizing = True
+            pending, self._pending = self._pending, []
+            summary = self._summary
+
+        if self.executor is None:
+            self._run_summary(summary, pending)
+        else:
+            self.executor.submit(self._run_summary, summary, pending)
+
+    def _run_summary(self, summary, pending):
+        try:
+            new_summary = self.summarize(summary, pending)
+        except Exception as e:
+            print(f"Error: 대화 요약 실패 - {e}")
+            with self._lock:
+                # 다음 메시지가 추가될 때 다시 요약하도록 되돌려 놓는다
+                self._pending = pending + self._pending
+                self._summarizing = False
+            return
+
+        with self._lock:
+            self._summary = new_summary
+            self._summary_tokens = count_tokens(new_summary) if new_summary else 0
+            self._summarized += len(pending)
+            summarized = self._summarized
+            self._summarizing = False
+            self._trim()
+        if self.backing is not None:
+            self.backing.save_summary(new_summary, summarized)
+        # 요약하는 동안 더 밀려난 메시지가 있으면 이어서 요약
+        self._schedule_summary()
+
+    def clear(self):
+        with self._lock:
+            self._window.clear()
+            self._window_tokens = 0
+            self._summary = ""
+            self._summary_tokens = 0
+            self._summarized = 0
+            self._pending.clear()
+        if self.backing is not None:
+            self.backing.clear()
+
+
+class HistoryManager:
+    """세션별 TokenBudgetHistory를 관리한다. get_session_history를 그대로 넘길 수 있다.
+
+    store(get_session_history를 가진 영구 스토어)를 주면 각 세션 기록이 그 위에 얹힌다.
+    메모리에는 최근에 쓴 max_sessions개 세션만 유지한다.
+    """
+
+    def __init__(self, max_tokens=2000, summarize=None, store=None, max_sessions=64):
+        self.max_tokens = max_tokens
+        self.summarize = summarize
+        self.store = store
+        self.max_sessions = max_sessions
+        # 요약은 한 번에 하나씩, 대화 턴과는 별개의 스레드에서
+        self.executor = ThreadPoolExecutor(
+            max_workers=1, thread_name_prefix="summary"
+        )
+        self.sessions = OrderedDict()
+        self._lock = threading.Lock()
+
+    def get_session_history(self, session_id):
+        with self._lock:
+            if session_id in self.sessions:
+                self.sessions.move_to_end(session_id)
+                return self.sessions[session_id]
+
+            backing = None
+            if self.store is not None:
+                backing = self.store.get_session_history(session_id)
+            history = TokenBudgetHistory(
+                self.max_tokens, self.summarize, self.executor, backing
+            )
+            self.sessions[session_id] = history
+            while len(self.sessions) > self.max_sessions:
+                self.sessions.popitem(last=False)
+            return history
+
+    def close(self):
+        """진행 중인 요약이 끝날 때까지 기다린 뒤 영구 스토어를 닫는다.
+
+        요약은 LLM 클라이언트를 쓰므로 엔진을 닫기 전에 호출해야 한다.
+        """
+        self.executor.shutdown(wait=True)
+        if self.store is not None:
+            self.store.close()
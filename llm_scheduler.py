@@ -0,0 +1,363 @@
+import asyncio
+import heapq
+import itertools
+import random
+import threading
+import time
+from collections import deque
+from concurrent.futures import Future
+
+from tracing import register_metrics, tracer, unregister_metrics
+
+# 우선순위 (작을수록 먼저)
+INTERACTIVE = 0
+BACKGROUND = 1
+
+PRIORITY_NAMES = {INTERACTIVE: "interactive", BACKGROUND: "background"}
+
+# 재시도할 HTTP 상태 코드 (요청 한도 초과, 서버 오류)
+RETRY_STATUS = {429, 500, 502, 503, 504}
+
+
+def _status_code(error):
+    # openai.APIStatusError는 status_code, httpx 오류는 response.status_code를 가진다
+    status = getattr(error, "status_code", None)
+    if status is None:
+        status = getattr(getattr(error, "response", None), "status_code", None)
+    return status
+
+
+def _retry_after(error):
+    headers = getattr(getattr(error, "response", None), "headers", None) or {}
+    try:
+        return float(headers.get("retry-after"))
+    except (TypeError, ValueError):
+        return None
+
+
+def _quantiles(values):
+    values = sorted(values)
+    if not values:
+        return {}
+    return {
+        quantile: values[min(len(values) - 1, int(len(values) * quantile))]
+        for quantile in (0.5, 0.95)
+    }
+
+
+def is_retryable(error):
+    if _status_code(error) in RETRY_STATUS:
+        return True
+    # 연결 끊김/타임아웃 (openai.APIConnectionError, httpx.TransportError)
+    return type(error).__name__ in {
+        "APIConnectionError",
+        "APITimeoutError",
+        "ConnectError",
+        "ReadTimeout",
+    }
+
+
+class Ticket:
+    """acquire()로 받은 실행 허가. release()에 돌려준다."""
+
+    def __init__(self, priority, tokens, submitted_at):
+        self.priority = priority
+        self.tokens = tokens
+        self.submitted_at = submitted_at
+        self.admitted_at = None
+        self._usage = None  # 분당 사용량 창에 들어간 [시각, 토큰] 항목
+
+    @property
+    def wait(self):
+        return self.admitted_at - self.submitted_at
+
+
+class LLMScheduler:
+    """ChatOpenAI 호출 앞에서 분당 요청 수(RPM)와 토큰 수(TPM)를 지키는 스케줄러.
+
+    - 대화 턴(INTERACTIVE)은 요약/발음 조회 같은 BACKGROUND 작업보다 항상 먼저
+      허가된다. 같은 우선순위 안에서는 들어온 순서대로.
+    - 최근 60초 동안 허가한 요청 수와 예상 토큰 수가 예산을 넘으면 창이 비워질
+      때까지 기다린다. 예산보다 큰 요청 하나는 창이 비어 있으면 보낸다.
+      예상치는 실행이 끝나면 실제 사용량(usage)으로 바로잡는다.
+    - 기본값(500 RPM / 10,000 TPM)은 gpt-4 최하위 등급 한도에 맞춘 보수적인 값이다.
+      대화 턴마다 기록 전체가 다시 들어가므로 실제 계정 한도로 바꿔 쓰는 것이 좋다.
+    - BACKGROUND 대기열이 max_background를 넘으면 제출하는 쪽이 자리가 날 때까지
+      기다린다 (backpressure).
+    - 429/5xx는 지터를 섞은 지수 백오프로 재시도하고, 429를 받으면 Retry-After
+      동안 새 요청도 내보내지 않는다.
+    - 같은 key를 가진 BACKGROUND 요청은 하나로 합쳐 결과를 나눠 받는다.
+    """
+
+    def __init__(
+        self,
+        requests_per_minute=500,
+        tokens_per_minute=10000,
+        max_concurrency=4,
+        max_background=16,
+        max_retries=4,
+        backoff=1.0,
+        max_backoff=30.0,
+    ):
+        self.requests_per_minute = requests_per_minute
+        self.tokens_per_minute = tokens_per_minute
+        self.max_concurrency = max_concurrency
+        self.max_background = max_background
+        self.max_retries = max_retries
+        self.backoff = backoff
+        self.max_backoff = max_backoff
+
+        self._cond = threading.Condition()
+        self._waiting = []  # (priority, 순번, Ticket) 힙
+        self._seq = itertools.count()
+        self._window = deque()  # 최근 60초 동안 허가한 [시각, 토큰]
+        self._window_tokens = 0
+        self._running = 0
+        self._paused_until = 0.0
+        self._coalesced = {}  # key -> Future
+        self._closed = False
+
+        self._waits = {priority: deque(maxlen=500) for priority in PRIORITY_NAMES}
+        self.retries = 0
+        self.coalesced = 0
+        register_metrics(self.render_metrics)
+
+    def _expire(self, now):
+        while self._window and now - self._window[0][0] >= 60:
+            self._window_tokens -= self._window.popleft()[1]
+
+    def _delay(self, tokens, now):
+        """지금 허가할 수 있으면 0, 아니면 다시 확인할 때까지 기다릴 초."""
+        if now < self._paused_until:
+            return self._paused_until - now
+        if self._running >= self.max_concurrency:
+            return None  # release()가 깨워 준다
+        if not self._window:
+            return 0
+        over_requests = (
+            self.requests_per_minute and len(self._window) >= self.requests_per_minute
+        )
+        over_tokens = (
+            self.tokens_per_minute
+            and self._window_tokens + tokens > self.tokens_per_minute
+        )
+        if over_requests or over_tokens:
+            return max(0.01, 60 - (now - self._window[0][0]))
+        return 0
+
+    def _background_waiting(self):
+        return sum(1 for item in self._waiting if item[0] == BACKGROUND)
+
+    def acquire(self, priority=INTERACTIVE, tokens=0):
+        """차례와 예산이 될 때까지 기다린 뒤 Ticket을 반환한다."""
+        ticket = Ticket(priority, tokens, time.monotonic())
+        with self._cond:
+            if priority == BACKGROUND:
+                self._cond.wait_for(
+                    lambda: self._closed
+                    or self._background_waiting() < self.max_background
+                )
+            item = (priority, next(self._seq), ticket)
+            heapq.heappush(self._waiting, item)
+            while True:
+                if self._closed:
+                    self._waiting.remove(item)
+                    heapq.heapify(self._waiting)
+                    raise RuntimeError("LLMScheduler가 이미 종료되었습니다.")
+                now = time.monotonic()
+                self._expire(now)
+                delay = None
+                if self._waiting[0] is item:
+                    delay = self._delay(tokens, now)
+                    if delay == 0:
+                        break
+                self._cond.wait(delay)
+            heapq.heappop(self._waiting)
+            ticket.admitted_at = now
+            ticket._usage = [now, tokens]
+            self._window.append(ticket._usage)
+            self._window_tokens += tokens
+            self._running += 1
+            self._waits[priority].append(ticket.wait)
+            self._cond.notify_all()
+        tracer.event(
+            "llm.admitted",
+            priority=PRIORITY_NAMES[priority],
+            wait=round(ticket.wait, 3),
+            tokens=tokens,
+        )
+        return ticket
+
+    def release(self, ticket, used_tokens=None):
+        """실행이 끝났음을 알린다. 실제 사용 토큰 수를 알면 예산 창을 고친다."""
+        with self._cond:
+            now = time.monotonic()
+            self._expire(now)
+            # 항목이 이미 창에서 빠졌으면 (긴 스트림, 재시도) 고칠 것이 없다
+            if used_tokens is not None and now - ticket._usage[0] < 60:
+                self._window_tokens = max(
+                    0, self._window_tokens + used_tokens - ticket._usage[1]
+                )
+                ticket._usage[1] = used_tokens
+            self._running -= 1
+            self._cond.notify_all()
+
+    def _backoff(self, attempt, error):
+        delay = min(self.max_backoff, self.backoff * (2**attempt))
+        delay *= random.uniform(0.5, 1.5)
+        retry_after = _retry_after(error)
+        if retry_after is not None:
+            delay = max(delay, retry_after)
+        if _status_code(error) == 429:
+            # 한도 초과면 다른 요청도 같이 쉰다
+            with self._cond:
+                self._paused_until = max(self._paused_until, time.monotonic() + delay)
+                self._cond.notify_all()
+        self.retries += 1
+        tracer.event("llm.retry", attempt=attempt + 1, delay=round(delay, 2))
+        return delay
+
+    def run(self, fn, priority=INTERACTIVE, tokens=0, key=None, usage=None):
+        """허가를 받아 fn()을 실행하고 결과를 반환한다 (재시도 포함).
+
+        key를 주면 같은 key로 진행 중인 BACKGROUND 요청이 있을 때 새로 보내지 않고
+        그 결과를 같이 받는다. usage(result)가 있으면 실제 토큰 수로 예산을 고친다.
+        """
+        if key is None or priority != BACKGROUND:
+            return self._run(fn, priority, tokens, usage)
+
+        with self._cond:
+            future = self._coalesced.get(key)
+            owner = future is None
+            if owner:
+                future = self._coalesced[key] = Future()
+            else:
+                self.coalesced += 1
+        if not owner:
+            return future.result()
+        try:
+            future.set_result(self._run(fn, priority, tokens, usage))
+        except BaseException as e:
+            future.set_exception(e)
+        finally:
+            with self._cond:
+                del self._coalesced[key]
+        return future.result()
+
+    def _run(self, fn, priority, tokens, usage):
+        for attempt in range(self.max_retries + 1):
+            ticket = self.acquire(priority, tokens)
+            used = None
+            try:
+                result = fn()
+                used = usage(result) if usage else None
+                return result
+            except Exception as e:
+                if attempt == self.max_retries or not is_retryable(e):
+                    raise
+                delay = self._backoff(attempt, e)
+            finally:
+                self.release(ticket, used)
+            time.sleep(delay)
+
+    def stream(self, fn, priority=INTERACTIVE, tokens=0, usage=None):
+        """fn()이 돌려주는 스트림을 허가를 받은 뒤 흘려보낸다.
+
+        첫 조각을 받기 전에 실패하면 재시도하고, 이미 일부를 돌려준 뒤에는 그대로
+        예외를 올린다 (같은 응답을 두 번 말하지 않도록). usage(item)가 토큰 수를
+        돌려주면 스트림이 끝날 때 마지막 값으로 예산을 고친다.
+        """
+        for attempt in range(self.max_retries + 1):
+            ticket = self.acquire(priority, tokens)
+            started = False
+            used = None
+            try:
+                for item in fn():
+                    started = True
+                    used = usage(item) if usage else None
+                    yield item
+                return
+            except Exception as e:
+                if started or attempt == self.max_retries or not is_retryable(e):
+                    raise
+                delay = self._backoff(attempt, e)
+            finally:
+                self.release(ticket, used)
+            time.sleep(delay)
+
+    async def _aacquire(self, priority, tokens):
+        loop = asyncio.get_running_loop()
+        future = loop.run_in_executor(None, self.acquire, priority, tokens)
+        try:
+            return await asyncio.shield(future)
+        except asyncio.CancelledError:
+            # 기다리던 태스크가 취소돼도 허가는 나중에 나오므로 받자마자 돌려준다
+            future.add_done_callback(lambda f: self.release(f.result()))
+            raise
+
+    async def astream(self, fn, priority=INTERACTIVE, tokens=0, usage=None):
+        """stream()의 asyncio 버전. fn()은 async iterator를 돌려준다."""
+        for attempt in range(self.max_retries + 1):
+            ticket = await self._aacquire(priority, tokens)
+            started = False
+            used = None
+            try:
+                async for item in fn():
+                    started = True
+                    used = usage(item) if usage else None
+                    yield item
+                return
+            except Exception as e:
+                if started or attempt == self.max_retries or not is_retryable(e):
+                    raise
+                delay = self._backoff(attempt, e)
+            finally:
+                self.release(ticket, used)
+            await asyncio.sleep(delay)
+
+    def stats(self):
+        with self._cond:
+            self._expire(time.monotonic())
+            stats = {
+                "running": self._running,
+                "window_requests": len(self._window),
+                "window_tokens": self._window_tokens,
+                "retries": self.retries,
+                "coalesced": self.coalesced,
+            }
+            for priority, name in PRIORITY_NAMES.items():
+                stats[f"{name}_queued"] = sum(
+                    1 for item in self._waiting if item[0] == priority
+                )
+                stats[f"{name}_wait"] = _quantiles(self._waits[priority])
+        return stats
+
+    def render_metrics(self, prefix):
+        """Prometheus 텍스트 형식의 대기열 길이/대기 시간 지표."""
+        stats = self.stats()
+        depth = [f"# TYPE {prefix}_llm_queue_depth gauge"]
+        wait = [f"# TYPE {prefix}_llm_wait_seconds summary"]
+        for name in PRIORITY_NAMES.values():
+            label = f'priority="{name}"'
+            queued = stats[f"{name}_queued"]
+            depth.append(f"{prefix}_llm_queue_depth{{{label}}} {queued}")
+            for quantile, value in stats[f"{name}_wait"].items():
+                quantile_label = f'{label},quantile="{quantile}"'
+                wait.append(f"{prefix}_llm_wait_seconds{{{quantile_label}}} {value}")
+        lines = depth + wait
+        lines += [
+            f"# TYPE {prefix}_llm_running gauge",
+            f"{prefix}_llm_running {stats['running']}",
+            f"# TYPE {prefix}_llm_retries_total counter",
+            f"{prefix}_llm_retries_total {stats['retries']}",
+            f"# TYPE {prefix}_llm_coalesced_total counter",
+            f"{prefix}_llm_coalesced_total {stats['coalesced']}",
+        ]
+        return "\n".join(lines) + "\n"
+
+    def close(self):
+        """/metrics 등록을 해제하고, 기다리는 요청과 이후 요청은 RuntimeError로 거절한다."""
+        unregister_metrics(self.render_metrics)
+        with self._cond:
+            self._closed = True
+            self._cond.notify_all()
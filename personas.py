@@ -0,0 +1,234 @@
+"""페르소나(캐릭터) 정의를 한 번 읽어 메모리에 들고 있는 레지스트리.
+
+personas.json 형식 (prompt_file은 personas.json 기준 상대 경로):
+
+    {
+      "default": "megami",
+      "personas": {
+        "megami": {
+          "prompt_file": "System_prompt.txt",
+          "speaker": "8",
+          "prosody": {"intonationScale": 0.6, ...},
+          "sampling": {"temperature": 1.0, "top_p": 1.0}
+        }
+      }
+    }
+
+프롬프트 파일은 읽을 때 ChatPromptTemplate으로 만들어 두므로, 턴마다 파일을 읽거나
+템플릿을 만들지 않는다. 파일 변경은 백그라운드 스레드가 mtime으로 확인해 바뀐
+페르소나만 다시 만든다.
+
+    python personas.py   # 등록된 페르소나 목록
+"""
+
+import itertools
+import json
+import os
+import sys
+import threading
+
+from conversation_engine import build_prompt
+from tracing import tracer
+
+DEFAULT_PERSONAS_PATH = "personas.json"
+
+# personas.json이 없을 때 쓰는 기본 정의 (기존 run.py의 하드코딩 값)
+DEFAULT_DEFINITIONS = {
+    "default": "megami",
+    "personas": {
+        "megami": {
+            "prompt_file": "System_prompt.txt",
+            "speaker": "8",
+            "prosody": {
+                "volumeScale": 1.00,
+                "intonationScale": 0.60,
+                "prePhonemeLength": 0.10,
+                "postPhonemeLength": 0.10,
+            },
+            "sampling": {},
+        }
+    },
+}
+
+FALLBACK_PROMPT = (
+    "Default system prompt: 캐릭터성이 필요합니다. "
+    "이 응답은 기본 시스템 프롬프트를 사용합니다."
+)
+
+# 페르소나를 다시 만들 때마다 올라가는 번호 (엔진이 체인을 다시 만들지 판단)
+_versions = itertools.count(1)
+
+
+def _mtime(path):
+    try:
+        return os.stat(path).st_mtime_ns
+    except OSError:
+        return None
+
+
+class Persona:
+    """한 캐릭터의 system 프롬프트, 목소리(VOICEVOX 화자/운율), 샘플링 값.
+
+    prompt_template은 system 프롬프트를 미리 채운 ChatPromptTemplate이다.
+    """
+
+    def __init__(self, name, prompt, speaker, prosody=None, sampling=None):
+        self.name = name
+        self.prompt = prompt
+        self.speaker = str(speaker)
+        self.prosody = prosody  # None이면 voicevox_client.DEFAULT_PROSODY
+        self.sampling = dict(sampling or {})
+        self.prompt_template = build_prompt(prompt)
+        self.version = next(_versions)
+
+    def __repr__(self):
+        return f"Persona({self.name!r}, speaker={self.speaker!r})"
+
+
+class PersonaRegistry:
+    """페르소나 정의를 읽어 두고 이름으로 바로 꺼내 준다.
+
+    get()과 switch()는 딕셔너리 조회만 하므로 디스크를 건드리지 않는다.
+    start()로 감시 스레드를 띄우면 poll_interval마다 정의 파일과 프롬프트 파일의
+    mtime만 확인하고, 바뀐 경우에만 다시 읽어 스냅샷을 통째로 교체한다.
+    """
+
+    def __init__(self, path=DEFAULT_PERSONAS_PATH, active=None, poll_interval=2.0):
+        self.path = path
+        self.poll_interval = poll_interval
+
+        self._personas = {}  # 이름 -> Persona
+        self._sources = {}  # 이름 -> (정의, 프롬프트 파일 경로, mtime)
+        self._mtimes = {}  # 감시하는 파일 경로 -> mtime
+        self._default = None
+        self._active = None
+        self._lock = threading.Lock()
+        self._stop = threading.Event()
+        self._thread = None
+
+        self.reload()
+        if active:
+            self.switch(active)
+
+    def _load_definitions(self):
+        if not os.path.exists(self.path):
+            return DEFAULT_DEFINITIONS, os.getcwd()
+        with open(self.path, "r", encoding="utf-8") as file:
+            definitions = json.load(file)
+        return definitions, os.path.dirname(os.path.abspath(self.path))
+
+    @staticmethod
+    def _read_prompt(path):
+        try:
+            with open(path, "r", encoding="utf-8") as file:
+                return file.read()
+        except OSError as e:
+            print(f"Error: Failed to load system prompt from {path} - {e}")
+            return FALLBACK_PROMPT
+
+    def reload(self):
+        """정의를 다시 읽는다. 정의와 프롬프트 파일이 그대로인 페르소나는 재사용."""
+        try:
+            definitions, base_dir = self._load_definitions()
+            entries = definitions["personas"]
+        except (OSError, ValueError, KeyError) as e:
+            # 편집 중인 잘못된 파일이면 이전 스냅샷을 계속 쓴다
+            print(f"Error: 페르소나 정의를 읽지 못했습니다 ({self.path}) - {e}")
+            if self._personas:
+                self._mtimes[self.path] = _mtime(self.path)
+                return False
+            definitions, base_dir = DEFAULT_DEFINITIONS, os.getcwd()
+            entries = definitions["personas"]
+
+        personas, sources = {}, {}
+        mtimes = {self.path: _mtime(self.path)}
+        for name, entry in entries.items():
+            prompt_path = os.path.join(base_dir, entry["prompt_file"])
+            mtime = _mtime(prompt_path)
+            mtimes[prompt_path] = mtime
+            source = (entry, prompt_path, mtime)
+            if self._sources.get(name) == source:
+                personas[name] = self._personas[name]
+            else:
+                personas[name] = Persona(
+                    name,
+                    self._read_prompt(prompt_path),
+                    entry["speaker"],
+                    prosody=entry.get("prosody"),
+                    sampling=entry.get("sampling"),
+                )
+                tracer.event("persona.loaded", persona=name, path=prompt_path)
+            sources[name] = source
+
+        default = definitions.get("default") or next(iter(personas))
+        with self._lock:
+            active = self._active.name if self._active else default
+            self._personas, self._sources, self._mtimes = personas, sources, mtimes
+            self._default = personas.get(default) or next(iter(personas.values()))
+            self._active = personas.get(active) or self._default
+        return True
+
+    def changed(self):
+        """감시 중인 파일 중 mtime이 바뀐 것이 있는지 (stat만 한다)."""
+        return any(_mtime(path) != mtime for path, mtime in self._mtimes.items())
+
+    def check(self):
+        """바뀐 파일이 있으면 다시 읽는다. 다시 읽었으면 True."""
+        if not self.changed():
+            return False
+        return self.reload()
+
+    def _watch(self):
+        while not self._stop.wait(self.poll_interval):
+            try:
+                self.check()
+            except Exception as e:
+                print(f"Error: 페르소나 갱신 실패 - {e}")
+
+    def start(self):
+        """파일 변경을 감시하는 백그라운드 스레드를 시작한다."""
+        if self._thread is None and self.poll_interval:
+            self._thread = threading.Thread(target=self._watch, daemon=True)
+            self._thread.start()
+        return self
+
+    def close(self):
+        self._stop.set()
+
+    @property
+    def active(self):
+        return self._active
+
+    def names(self):
+        return list(self._personas)
+
+    def get(self, name=None):
+        """이름으로 페르소나를 꺼낸다 (없으면 None, 이름이 없으면 현재 페르소나)."""
+        if name is None:
+            return self._active
+        return self._personas.get(name)
+
+    def switch(self, name):
+        """현재 페르소나를 바꾼다. 없는 이름이면 그대로 두고 None을 반환한다."""
+        persona = self._personas.get(name)
+        if persona is None:
+            print(f"Error: 알 수 없는 페르소나입니다 - {name} ({', '.join(self.names())})")
+            return None
+        self._active = persona
+        tracer.event("persona.switched", persona=name)
+        return persona
+
+
+def main(argv):
+    registry = PersonaRegistry(argv[0] if argv else DEFAULT_PERSONAS_PATH)
+    for name in registry.names():
+        persona = registry.get(name)
+        marker = "*" if persona is registry.active else " "
+        print(
+            f"{marker} {name}: speaker={persona.speaker} "
+            f"sampling={persona.sampling} prompt={len(persona.prompt)}자"
+        )
+
+
+if __name__ == "__main__":
+    main(sys.argv[1:])
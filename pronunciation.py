@@ -0,0 +1,341 @@
+import functools
+import json
+import os
+import re
+import threading
+import time
+import unicodedata
+from concurrent.futures import ThreadPoolExecutor
+
+from langchain_core.messages import HumanMessage
+
+# 영어 단어와 한글 묶음. 나머지(일본어, 숫자, 기호)는 그대로 VOICEVOX에 넘긴다
+WORD_PATTERN = re.compile(r"[A-Za-z][A-Za-z']*|[가-힣]+")
+KATAKANA_PATTERN = re.compile(r"^[ァ-ヴー]+$")
+
+# 자주 나오는 단어의 기본 읽기 (사용자 사전이 우선한다)
+DEFAULT_WORDS = {
+    "ai": "エーアイ",
+    "gpt": "ジーピーティー",
+    "openai": "オープンエーアイ",
+    "voicevox": "ボイスボックス",
+    "google": "グーグル",
+    "calendar": "カレンダー",
+    "python": "パイソン",
+    "hello": "ハロー",
+}
+
+# 약어는 알파벳 이름으로 읽는다
+# fmt: off
+LETTER_NAMES = {
+    "a": "エー", "b": "ビー", "c": "シー", "d": "ディー", "e": "イー", "f": "エフ",
+    "g": "ジー", "h": "エイチ", "i": "アイ", "j": "ジェー", "k": "ケー", "l": "エル",
+    "m": "エム", "n": "エヌ", "o": "オー", "p": "ピー", "q": "キュー", "r": "アール",
+    "s": "エス", "t": "ティー", "u": "ユー", "v": "ブイ", "w": "ダブリュー",
+    "x": "エックス", "y": "ワイ", "z": "ゼット",
+}
+# fmt: on
+
+# 자음 -> 모음 a, i, u, e, o 순서의 가나
+ROWS = {
+    "": ["ア", "イ", "ウ", "エ", "オ"],
+    "k": ["カ", "キ", "ク", "ケ", "コ"],
+    "g": ["ガ", "ギ", "グ", "ゲ", "ゴ"],
+    "s": ["サ", "シ", "ス", "セ", "ソ"],
+    "z": ["ザ", "ジ", "ズ", "ゼ", "ゾ"],
+    "t": ["タ", "ティ", "トゥ", "テ", "ト"],
+    "d": ["ダ", "ディ", "ドゥ", "デ", "ド"],
+    "n": ["ナ", "ニ", "ヌ", "ネ", "ノ"],
+    "h": ["ハ", "ヒ", "フ", "ヘ", "ホ"],
+    "b": ["バ", "ビ", "ブ", "ベ", "ボ"],
+    "p": ["パ", "ピ", "プ", "ペ", "ポ"],
+    "m": ["マ", "ミ", "ム", "メ", "モ"],
+    "y": ["ヤ", "イ", "ユ", "イェ", "ヨ"],
+    "r": ["ラ", "リ", "ル", "レ", "ロ"],
+    "w": ["ワ", "ウィ", "ウ", "ウェ", "ウォ"],
+    "f": ["ファ", "フィ", "フ", "フェ", "フォ"],
+    "j": ["ジャ", "ジ", "ジュ", "ジェ", "ジョ"],
+    "ch": ["チャ", "チ", "チュ", "チェ", "チョ"],
+    "sh": ["シャ", "シ", "シュ", "シェ", "ショ"],
+}
+VOWELS = "aiueo"
+SMALL_Y = {"a": "ャ", "u": "ュ", "o": "ョ", "e": "ェ", "i": ""}
+SMALL_W = {"a": "ァ", "i": "ィ", "e": "ェ", "o": "ォ", "u": ""}
+
+# 한글 초성/중성/종성 (유니코드 순서)
+# fmt: off
+HANGUL_INITIALS = [
+    "k", "k", "n", "t", "t", "r", "m", "p", "p", "s",
+    "s", "", "ch", "ch", "ch", "k", "t", "p", "h",
+]
+# fmt: on
+# 어중에서 유성음이 되는 초성 (ㄱ, ㄷ, ㅂ, ㅈ)
+HANGUL_VOICED = {0: "g", 3: "d", 7: "b", 12: "j"}
+# 된소리 (ㄲ, ㄸ, ㅃ, ㅆ, ㅉ): 어중에서는 앞에 ッ
+HANGUL_TENSE = {1, 4, 8, 10, 13}
+# (반모음, 모음). ㅓ는 オ, ㅡ는 ウ로 읽는다
+# fmt: off
+HANGUL_MEDIALS = [
+    ("", "a"), ("", "e"), ("y", "a"), ("y", "e"), ("", "o"), ("", "e"), ("y", "o"),
+    ("y", "e"), ("", "o"), ("w", "a"), ("w", "e"), ("w", "e"), ("y", "o"), ("", "u"),
+    ("w", "o"), ("w", "e"), ("w", "i"), ("y", "u"), ("", "u"), ("", "ui"), ("", "i"),
+]
+HANGUL_FINALS = [
+    "", "ク", "ク", "ク", "ン", "ン", "ン", "ッ", "ル", "ク", "ム", "ル", "ル", "ル",
+    "プ", "ル", "ム", "プ", "プ", "ッ", "ッ", "ン", "ッ", "ッ", "ク", "ッ", "プ", "ッ",
+]
+# fmt: on
+
+# 영어 철자 -> 자음 (두 글자 묶음을 먼저 본다)
+# fmt: off
+LATIN_CONSONANTS = {
+    "sh": "sh", "ch": "ch", "th": "s", "ph": "f", "ck": "k", "qu": "k",
+    "b": "b", "c": "k", "d": "d", "f": "f", "g": "g", "h": "h", "j": "j", "k": "k",
+    "l": "r", "m": "m", "n": "n", "p": "p", "q": "k", "r": "r", "s": "s", "t": "t",
+    "v": "b", "w": "w", "x": "ks", "y": "y", "z": "z",
+}
+# fmt: on
+
+READING_PROMPT = (
+    "다음 단어들을 일본어 음성 합성기가 읽을 수 있도록 가타카나 발음으로 바꾸세요. "
+    "한 줄에 하나씩 '단어=カタカナ' 형식으로만 답하세요.\n\n{words}"
+)
+
+
+def _kana(consonant, glide, vowel):
+    row = ROWS[consonant]
+    if vowel == "ui":
+        return row[VOWELS.index("u")] + "イ"
+    if glide == "y":
+        if consonant == "":
+            return {"a": "ヤ", "u": "ユ", "o": "ヨ", "e": "イェ", "i": "イ"}[vowel]
+        return row[VOWELS.index("i")] + SMALL_Y[vowel]
+    if glide == "w":
+        if consonant == "":
+            return ROWS["w"][VOWELS.index(vowel)]
+        return row[VOWELS.index("u")] + SMALL_W[vowel]
+    return row[VOWELS.index(vowel)]
+
+
+@functools.lru_cache(maxsize=4096)
+def hangul_to_katakana(word):
+    """한글 음절을 초성/중성/종성으로 나눠 가타카나 근사 발음으로 바꾼다."""
+    out = []
+    for position, char in enumerate(word):
+        code = ord(char) - 0xAC00
+        initial, rest = divmod(code, 21 * 28)
+        medial, final = divmod(rest, 28)
+
+        consonant = HANGUL_INITIALS[initial]
+        if position > 0:
+            consonant = HANGUL_VOICED.get(initial, consonant)
+            if initial in HANGUL_TENSE and not (out and out[-1].endswith("ッ")):
+                out.append("ッ")
+        glide, vowel = HANGUL_MEDIALS[medial]
+        out.append(_kana(consonant, glide, vowel) + HANGUL_FINALS[final])
+    reading = "".join(out)
+    # 단어 끝의 받침 ㄷ/ㅅ/ㅈ 등은 ッ로 끝나면 읽히지 않으므로 ト로 읽는다
+    return reading[:-1] + "ト" if reading.endswith("ッ") else reading
+
+
+def _coda(consonant):
+    # 모음 없이 끝나는 자음: n -> ン, t/d -> ト/ド, 나머지는 u 단
+    if consonant == "n":
+        return "ン"
+    if consonant in ("t", "d"):
+        return ROWS[consonant][VOWELS.index("o")]
+    if consonant == "ks":
+        return "クス"
+    return ROWS[consonant][VOWELS.index("u")]
+
+
+@functools.lru_cache(maxsize=4096)
+def latin_to_katakana(word):
+    """영어 단어를 규칙으로 읽는다. 약어는 알파벳 이름, 나머지는 로마자 읽기."""
+    if (word.isupper() and len(word) <= 6) or not re.search("[aeiouy]", word.lower()):
+        return "".join(LETTER_NAMES.get(c, "") for c in word.lower())
+
+    word = word.lower().replace("'", "")
+    out = []
+    i = 0
+    while i < len(word):
+        consonant = None
+        for size in (2, 1):
+            if word[i : i + size] in LATIN_CONSONANTS:
+                consonant = LATIN_CONSONANTS[word[i : i + size]]
+                i += size
+                break
+        if consonant is None:
+            # 모음으로 시작하는 음절
+            out.append(ROWS[""][VOWELS.index(word[i] if word[i] in VOWELS else "i")])
+            i += 1
+            continue
+        if i < len(word) and word[i] == word[i - 1] and word[i] not in VOWELS:
+            # 겹자음: 파열음/마찰음은 ッ, 나머지(ll, mm, nn, rr)는 한 번만 읽는다
+            if word[i] in "bcdfgkpstz":
+                out.append("ッ")
+            continue
+        vowel = word[i] if i < len(word) else None
+        if vowel == "y" and consonant != "y":
+            vowel = "i"
+        if vowel is None or vowel not in VOWELS:
+            out.append("ン" if consonant == "n" else _coda(consonant))
+            continue
+        i += 1
+        if consonant == "ks":
+            out.append("ク" + ROWS["s"][VOWELS.index(vowel)])
+        else:
+            out.append(_kana(consonant, "", vowel))
+    return "".join(out)
+
+
+def llm_readings(llm, words):
+    """LLM에 단어 목록의 가타카나 읽기를 묻는다. {단어: 읽기}를 반환."""
+    prompt = READING_PROMPT.format(words="\n".join(words))
+    answer = llm.invoke([HumanMessage(content=prompt)]).content
+    readings = {}
+    for line in answer.splitlines():
+        word, sep, reading = line.partition("=")
+        if sep:
+            readings[word.strip()] = reading.strip()
+    return readings
+
+
+class PronunciationConverter:
+    """VOICEVOX에 넘기기 전에 영어/한국어를 가타카나 읽기로 바꾸는 변환기.
+
+    읽기는 사용자 사전 -> 기본 사전 -> 규칙(메모이즈) 순서로 정한다. 사전에 없는
+    영어 단어는 이번 발화에서는 규칙 읽기를 쓰고, fallback(LLM)에 백그라운드로
+    물어본 결과를 사전에 저장해 다음부터 쓴다. 발화가 LLM 왕복을 기다리지 않는다.
+    LLM이 읽기를 주지 못한 단어는 failure_ttl초 동안 다시 묻지 않는다.
+
+    register_with_engine=True면 사전에 추가되는 단어를 엔진의 사용자 사전
+    (/user_dict_word)에도 등록하고, 등록된 단어는 변환하지 않고 그대로 넘겨
+    audio_query가 직접 읽게 한다.
+    """
+
+    def __init__(
+        self,
+        dict_path="pronunciation_dict.json",
+        fallback=None,
+        client=None,
+        register_with_engine=False,
+        failure_ttl=3600.0,
+    ):
+        self.dict_path = dict_path
+        self.fallback = fallback
+        self.client = client
+        self.register_with_engine = register_with_engine and client is not None
+        self.failure_ttl = failure_ttl
+
+        self.words = self._load()
+        self._engine_words = None  # 엔진 사용자 사전에 있는 단어 (처음 쓸 때 조회)
+        self._pending = set()  # LLM에 묻고 있는 단어
+        self._failed = {}  # LLM이 읽기를 주지 못한 단어 -> 다시 물어도 되는 시각
+        self._lock = threading.Lock()
+        self.executor = ThreadPoolExecutor(
+            max_workers=1, thread_name_prefix="pronunciation"
+        )
+
+    def _load(self):
+        try:
+            with open(self.dict_path, "r", encoding="utf-8") as file:
+                return json.load(file)
+        except (OSError, ValueError):
+            return {}
+
+    def _save(self):
+        # 쓰다가 중단돼도 깨진 파일이 남지 않도록 임시 파일에 쓴 뒤 교체
+        tmp_path = f"{self.dict_path}.tmp"
+        try:
+            with open(tmp_path, "w", encoding="utf-8") as file:
+                json.dump(self.words, file, ensure_ascii=False, indent=2)
+            os.replace(tmp_path, self.dict_path)
+        except OSError as e:
+            print(f"Error: 발음 사전 저장 실패 - {e}")
+
+    @staticmethod
+    def _normalize(word):
+        return unicodedata.normalize("NFKC", word).lower()
+
+    def engine_words(self):
+        if self._engine_words is None:
+            try:
+                entries = self.client.user_dict().values()
+                self._engine_words = {self._normalize(e["surface"]) for e in entries}
+            except Exception as e:
+                print(f"Error: VOICEVOX 사용자 사전 조회 실패 - {e}")
+                self._engine_words = set()
+        return self._engine_words
+
+    def add_word(self, word, reading):
+        """사용자 사전에 읽기를 추가한다 (가타카나만 받는다)."""
+        if not reading or not KATAKANA_PATTERN.match(reading):
+            return False
+        key = self._normalize(word)
+        with self._lock:
+            self.words[key] = reading
+            self._save()
+        if self.register_with_engine and key not in self.engine_words():
+            try:
+                self.client.add_user_dict_word(word, reading)
+                self._engine_words.add(key)
+            except Exception as e:
+                print(f"Error: VOICEVOX 사용자 사전 등록 실패 ({word}) - {e}")
+        return True
+
+    def reading(self, word):
+        """단어 하나의 가타카나 읽기. 엔진 사전에 있는 단어는 None (변환하지 않음)."""
+        key = self._normalize(word)
+        if self.register_with_engine and key in self.engine_words():
+            return None
+        reading = self.words.get(key) or DEFAULT_WORDS.get(key)
+        if reading:
+            return reading
+        if "가" <= word[0] <= "힣":
+            return hangul_to_katakana(word)
+        if self.fallback is not None and not word.isupper():
+            self._ask_fallback(key)
+        return latin_to_katakana(word)
+
+    def convert(self, text):
+        def replace(match):
+            word = match.group(0)
+            return self.reading(word) or word
+
+        return WORD_PATTERN.sub(replace, text)
+
+    def _ask_fallback(self, word):
+        with self._lock:
+            if word in self._pending:
+                return
+            retry_at = self._failed.get(word)
+            if retry_at is not None:
+                if time.monotonic() < retry_at:
+                    return
+                del self._failed[word]
+            self._pending.add(word)
+        self.executor.submit(self._run_fallback, word)
+
+    def _run_fallback(self, word):
+        # 그사이 밀린 단어가 있으면 한 번의 요청으로 함께 묻는다
+        with self._lock:
+            words = sorted(self._pending - set(self.words))
+        if not words:
+            return
+        try:
+            readings = self.fallback(words)
+        except Exception as e:
+            print(f"Error: 발음 변환 LLM 호출 실패 - {e}")
+            readings = {}
+        # LLM이 대소문자를 바꿔 돌려줘도 (chatgpt -> ChatGPT) 찾을 수 있게 정규화한다
+        readings = {self._normalize(key): value for key, value in readings.items()}
+        failed = [word for word in words if not self.add_word(word, readings.get(word))]
+        retry_at = time.monotonic() + self.failure_ttl
+        with self._lock:
+            self._pending.difference_update(words)
+            for word in failed:
+                self._failed[word] = retry_at
+
+    def close(self):
+        self.executor.shutdown(wait=False, cancel_futures=True)
@@ -0,0 +1,163 @@
+import hashlib
+import json
+import re
+import threading
+import time
+import unicodedata
+from collections import OrderedDict
+
+# 캐시해도 되는 의도를 고르는 규칙 (정규화된 입력에 적용)
+INTENT_PATTERNS = {
+    "greeting": re.compile(
+        r"^(안녕|하이|헬로|hi|hello|hey|こんにちは|こんばんは|おはよう)"
+    ),
+    "schedule": re.compile(r"일정|캘린더|회의|약속|스케줄|予定|スケジュール"),
+    "status": re.compile(r"뭐해|뭐하고있|잘지내|기분어때|元気|調子"),
+}
+
+# 정규화할 때 지우는 문장 부호와 공백 (한국어는 띄어쓰기가 들쭉날쭉하므로 공백도 지운다)
+_IGNORED = re.compile(r"[\s!-/:-@\[-`{-~。、！？…・「」『』（）~]+")
+
+
+def normalize_input(text):
+    """'내일 일정 뭐야?' 와 '내일일정 뭐야' 가 같은 키가 되도록 정규화한다."""
+    return _IGNORED.sub("", unicodedata.normalize("NFKC", text).lower())
+
+
+def classify_intent(text):
+    normalized = normalize_input(text)
+    for intent, pattern in INTENT_PATTERNS.items():
+        if pattern.search(normalized):
+            return intent
+    return None
+
+
+def _digest(value):
+    payload = json.dumps(value, sort_keys=True, ensure_ascii=False, default=str)
+    return hashlib.sha256(payload.encode("utf-8")).hexdigest()
+
+
+class CachedResponse:
+    """캐시된 한 턴: 응답 텍스트와 문장별로 합성해 둔 오디오 클립."""
+
+    def __init__(self, text, clips, intent, expires_at):
+        self.text = text
+        self.clips = clips
+        self.intent = intent
+        self.expires_at = expires_at
+
+
+class ResponseCache:
+    """반복되는 질문의 응답을 재사용하는 캐시 (TTL + LRU).
+
+    키는 (정규화된 입력, system 프롬프트 해시, 컨텍스트 지문)이다. 컨텍스트 지문은
+    응답에 영향을 주는 외부 데이터(예: 그 날짜의 캘린더 일정)로, 바뀌면 다른 키가
+    된다. intents에 들어 있는 의도만 캐시하므로 운영자가 범위를 고를 수 있다.
+    히트하면 합성해 둔 오디오도 함께 돌려주므로 턴 전체가 네트워크 요청 없이 끝난다.
+    """
+
+    def __init__(self, intents=(), ttl=600, max_items=256, classify=classify_intent):
+        self.intents = set(intents)
+        self.ttl = ttl
+        self.max_items = max_items
+        self.classify = classify
+
+        self._entries = OrderedDict()
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+
+    @property
+    def enabled(self):
+        return bool(self.intents) and self.max_items > 0
+
+    def make_key(self, user_input, system_prompt, context=None):
+        """캐시할 수 없는 입력이면 None.
+
+        context가 함수면 캐시할 수 있는 입력일 때만 호출해 지문을 만든다.
+        """
+        if not self.enabled:
+            return None
+        intent = self.classify(user_input)
+        if intent not in self.intents:
+            return None
+        if callable(context):
+            context = context()
+        return (
+            normalize_input(user_input),
+            hashlib.sha256(system_prompt.encode("utf-8")).hexdigest(),
+            _digest(context),
+            intent,
+        )
+
+    def get(self, key):
+        if key is None:
+            return None
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is not None and entry.expires_at <= time.monotonic():
+                del self._entries[key]
+                entry = None
+            if entry is None:
+                self.misses += 1
+                return None
+            self._entries.move_to_end(key)
+            self.hits += 1
+            return entry
+
+    def put(self, key, text, clips):
+        if key is None or not text:
+            return
+        entry = CachedResponse(text, list(clips), key[3], time.monotonic() + self.ttl)
+        with self._lock:
+            self._entries[key] = entry
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.max_items:
+                self._entries.popitem(last=False)
+
+    def stats(self):
+        with self._lock:
+            return {
+                "items": len(self._entries),
+                "hits": self.hits,
+                "misses": self.misses,
+            }
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+
+
+class RecordingSynthesizer:
+    """speak_streaming()에 넘기는 synthesize를 감싸 문장별 클립을 모아 둔다.
+
+    합성이 하나라도 실패하면 complete가 False가 되어 캐시에 넣지 않는다.
+    """
+
+    def __init__(self, synthesize):
+        self.synthesize = synthesize
+        self._clips = {}
+        self.failed = False
+
+    def __call__(self, sentence, index):
+        try:
+            clip = self.synthesize(sentence, index)
+        except Exception:
+            self.failed = True
+            raise
+        self._clips[index] = clip
+        return clip
+
+    @property
+    def complete(self):
+        return not self.failed
+
+    @property
+    def clips(self):
+        return [self._clips[index] for index in sorted(self._clips)]
+
+
+def remember_turn(history, user_input, text):
+    """캐시 히트로 LLM을 건너뛴 턴도 세션 기록에는 남긴다 (다음 턴의 문맥 유지)."""
+    history.add_user_message(user_input)
+    history.add_ai_message(text)
@@ -1,172 +1,574 @@
+import asyncio
+import contextvars
 import os
-from langchain_openai import ChatOpenAI
-from langchain_core.prompts import ChatPromptTemplate, MessagesPlaceholder
-from langchain_core.runnables.history import RunnableWithMessageHistory
-from langchain_community.chat_message_histories import ChatMessageHistory
-import requests
-import urllib.parse
-import wave
-import winsound
 import sys
-import pyaudio
 import threading
+import time
 import logging
+from concurrent.futures import ThreadPoolExecutor
+
+# 프로세스 시작 시점 (--startup-time 측정 기준)
+_started_at = time.perf_counter()
+
 from dotenv import load_dotenv
+from tts_pipeline import speak_streaming
+from audio_clip import AudioClip
+from async_chat import AsyncChatRuntime
+from response_cache import RecordingSynthesizer, ResponseCache, remember_turn
+from tracing import configure_from_env, tracer
+
+# langchain, pyaudio, requests 등 무거운 모듈은 load_components()에서 백그라운드로
+# 불러온다. 그동안 프롬프트를 먼저 띄워 사용자가 입력하는 시간과 겹치게 한다.
 
 # .env 파일에서 환경 변수 로드
 load_dotenv()
 
 logging.getLogger("langchain").setLevel(logging.ERROR)
 
-# to help the CLI write unicode characters to the terminal
-sys.stdout = open(sys.stdout.fileno(), mode="w", encoding="utf8", buffering=1)
+# 턴별 지연 시간 추적 (TRACE_ENABLED, TRACE_FILE, METRICS_PORT, TRACE_LOG)
+configure_from_env()
+
+# 시작할 때 미리 합성해 둘 자주 쓰는 문구
+prewarm_phrases = ["さようなら"]
+
+# 페르소나 정의 파일 (system 프롬프트 파일, VOICEVOX 화자/운율, 샘플링 값)
+personas_path = os.environ.get("PERSONAS_PATH", "personas.json")
+
+# load_components()가 채우는 구성 요소
+tts_client = None
+tts_cache = None
+pronunciation_converter = None
+synthesis_scheduler = None
+personas = None
+audio_output = None
+device_registry = None
+vb_cable_device = None
+audio_router = None
+session_store = None
+engine = None
+response_cache = None
+clip_assembler = None
+
+components_ready = threading.Event()
+_startup_error = None
+_warm_up_thread = None
+
+
+def load_components(sinks=None):
+    """무거운 모듈을 불러오고 구성 요소를 만든다 (네트워크 요청은 하지 않는다).
+
+    sinks를 주면 오디오 장치를 열지 않고 그 싱크들로만 재생한다 (benchmark.py).
+    """
+    global tts_client, tts_cache, pronunciation_converter, synthesis_scheduler
+    global personas, audio_router
+    global session_store, engine, response_cache, clip_assembler
+
+    from voicevox_client import VoicevoxClient
+    from tts_cache import TTSCache
+    from synthesis_scheduler import SynthesisScheduler
+    from audio_router import AudioRouter
+    from conversation_engine import ConversationEngine
+    from history_manager import HistoryManager, count_tokens, summarize_messages
+    from llm_scheduler import LLMScheduler
+    from session_store import SQLiteSessionStore
+    from pronunciation import PronunciationConverter, llm_readings
+    from personas import PersonaRegistry
+
+    # 사전에 없는 단어의 읽기를 LLM에 묻는다 (같은 단어 묶음은 한 번만 요청)
+    def ask_readings(words):
+        return engine.background(
+            lambda llm: llm_readings(llm, words),
+            tokens=100 + 20 * len(words),
+            key=("readings", tuple(sorted(words))),
+        )
 
-base_url = "http://localhost:50021"
+    # VOICEVOX 엔진 클라이언트 (VOICEVOX_HOST / VOICEVOX_PORT, 기본 localhost:50021)
+    tts_client = VoicevoxClient()
+    tts_cache = TTSCache(
+        tts_client, cache_dir=os.environ.get("TTS_CACHE_DIR", ".tts_cache")
+    )
 
+    # 영어/한국어를 가타카나 읽기로 바꿔서 넘긴다. 사전에 없는 영어 단어는
+    # 백그라운드에서 LLM에 물어 사전에 저장한다 (VOICEVOX_USER_DICT=1이면 엔진 사전에도 등록)
+    pronunciation_converter = PronunciationConverter(
+        fallback=ask_readings,
+        client=tts_client,
+        register_with_engine=os.environ.get("VOICEVOX_USER_DICT") == "1",
+    )
 
-def load_system_prompt(filepath):
-    with open(filepath, "r", encoding="utf-8") as file:
-        return file.read()
+    # 긴 응답은 구절 단위로 나눠 병렬 합성하고, 첫 구절이 준비되면 바로 재생
+    synthesis_scheduler = SynthesisScheduler(
+        tts_cache, client=tts_client, max_workers=2
+    )
 
+    # 페르소나는 한 번만 읽어 템플릿으로 만들어 두고, 파일이 바뀔 때만 다시 읽는다.
+    # PERSONA로 시작 페르소나를 고른다 (대화 중에는 "/persona 이름"으로 전환)
+    personas = PersonaRegistry(personas_path, active=os.environ.get("PERSONA")).start()
 
-# 파일 경로 설정 (필요 시 절대 경로나 환경 변수 사용)
-system_prompt_path = "System_prompt.txt"
+    # 문장 클립의 앞뒤 무음을 자르고 크로스페이드로 이어 붙이며 음량을 맞춘다
+    # (AUDIO_ASSEMBLY=0이면 VOICEVOX 출력을 그대로 재생)
+    clip_assembler = new_clip_assembler()
 
-# system 프롬프트 로드
-system_prompt = load_system_prompt(system_prompt_path)
+    # VB-CABLE과 기본 스피커로 동시에 내보내는 라우터 (기존 pyaudio + winsound 스레드 쌍 대체)
+    audio_router = AudioRouter(open_audio_sinks() if sinks is None else sinks)
 
+    # 오래된 대화를 요약하는 함수 (history_manager의 백그라운드 스레드에서 호출).
+    # 대화 턴보다 낮은 우선순위로 스케줄러를 거쳐 나간다
+    def summarize_history(summary, messages):
+        text = summary + "".join(str(m.content) for m in messages)
+        return engine.background(
+            lambda llm: summarize_messages(llm, summary, messages),
+            tokens=count_tokens(text) * 2,
+        )
 
-def play_with_pyaudio(speech_filename):
-    p = pyaudio.PyAudio()
-    wav_file = wave.open(speech_filename, "rb")
-    stream = p.open(
-        format=p.get_format_from_width(wav_file.getsampwidth()),
-        channels=wav_file.getnchannels(),
-        rate=wav_file.getframerate(),
-        output_device_index=6,
-        output=True,
+    # 세션 기록을 관리할 변수: SQLite에 영구 저장하고,
+    # 프롬프트에 들어가는 history는 토큰 예산 안으로 유지
+    session_store = HistoryManager(
+        max_tokens=int(os.environ.get("HISTORY_MAX_TOKENS", 2000)),
+        summarize=summarize_history,
+        store=SQLiteSessionStore(os.environ.get("SESSION_DB_PATH", "sessions.db")),
     )
 
-    data = wav_file.readframes(1024)
-    while data:
-        stream.write(data)
-        data = wav_file.readframes(1024)
+    # 모든 OpenAI 호출의 분당 요청/토큰 예산 (계정 한도에 맞춰 OPENAI_RPM / OPENAI_TPM).
+    # 기본값 500 / 10,000은 gpt-4 최하위 등급 기준이다. 턴마다 기록 전체를 보내므로
+    # 한도가 더 높은 계정이면 올려 두어야 대화 턴이 예산 대기로 멈추지 않는다
+    llm_scheduler = LLMScheduler(
+        requests_per_minute=int(os.environ.get("OPENAI_RPM", 500)),
+        tokens_per_minute=int(os.environ.get("OPENAI_TPM", 10000)),
+    )
 
-    stream.stop_stream()
-    stream.close()
-    wav_file.close()
-    p.terminate()
+    # 클라이언트, 커넥션 풀, 프롬프트는 한 번만 만들어 모든 턴/세션에서 재사용
+    engine = ConversationEngine(
+        api_key=os.environ["OPENAI_API_KEY"],  # OpenAI API 키 설정
+        system_prompt=personas.active.prompt,  # 턴마다 persona를 넘기면 그쪽을 쓴다
+        get_session_history=get_session_history,
+        model_name="gpt-4",
+        temperature=float(os.environ.get("OPENAI_TEMPERATURE", 1)),
+        top_p=float(os.environ.get("OPENAI_TOP_P", 1)),
+        scheduler=llm_scheduler,
+    )
 
+    # 반복되는 질문(인사, 일정, 상태)의 응답과 음성을 재사용한다.
+    # RESPONSE_CACHE_INTENTS=greeting,schedule,status 처럼 캐시할 의도를 고른다 (기본은 끔)
+    response_cache = ResponseCache(
+        intents=[
+            intent.strip()
+            for intent in os.environ.get("RESPONSE_CACHE_INTENTS", "").split(",")
+            if intent.strip()
+        ],
+        ttl=float(os.environ.get("RESPONSE_CACHE_TTL", 600)),
+    )
 
-def speak_with_voicevox(text):
-    speaker_id = "8"
 
-    params_encoded = urllib.parse.urlencode({"text": text, "speaker": speaker_id})
-    req = requests.post(f"{base_url}/audio_query?{params_encoded}")
-    req.raise_for_status()
+def open_audio_sinks():
+    """VB-CABLE과 기본 스피커 출력 싱크를 만든다 (PyAudio는 여기서만 초기화)."""
+    global audio_output, device_registry, vb_cable_device
+
+    from audio_output import AudioOutputManager
+    from audio_router import PyAudioSink
+    from audio_devices import DeviceRegistry, device_pattern
+
+    # PyAudio 초기화와 스트림 열기는 한 번만 하고 클립마다 재사용
+    audio_output = AudioOutputManager()
+
+    # 장치 번호는 부팅마다 바뀌므로 이름으로 찾는다 (결과는 디스크에 캐시)
+    device_registry = DeviceRegistry(audio_output.pa)
+    # VB-CABLE이 없는 환경이면 경고만 하고 기본 스피커로만 재생한다
+    vb_cable_device = device_registry.resolve_or_default(device_pattern("vb_cable"))
+
+    sinks = [PyAudioSink(audio_output.pa, device=None, name="speaker")]
+    if vb_cable_device is not None:
+        sinks.insert(
+            0,
+            PyAudioSink(
+                audio_output.pa,
+                device=vb_cable_device,
+                name="VB-CABLE",
+                supports=device_registry.supports,
+            ),
+        )
+    return sinks
 
-    query = req.json()
-    query["volumeScale"] = 1.00
-    query["intonationScale"] = 0.60
-    query["prePhonemeLength"] = 0.10
-    query["postPhonemeLength"] = 0.10
 
-    params_encoded = urllib.parse.urlencode({"speaker": speaker_id})
-    req = requests.post(f"{base_url}/synthesis?{params_encoded}", json=query)
-    req.raise_for_status()
+def new_clip_assembler():
+    if os.environ.get("AUDIO_ASSEMBLY", "1") != "1":
+        return None
+    from audio_assembly import ClipAssembler
 
-    speech_filename = "speech.wav"
-    with open(speech_filename, "wb") as outfile:
-        outfile.write(req.content)
+    return ClipAssembler()
 
-    return speech_filename  # 파일 이름을 반환
 
+def _run_timed(name, func, *args):
+    started = time.perf_counter()
+    try:
+        with tracer.span(f"startup.{name}"):
+            func(*args)
+    except Exception as e:
+        print(f"Error: 시작 준비 실패 ({name}) - {e}")
+    return name, time.perf_counter() - started
 
-def speak_and_play(text):
-    # 음성 파일 생성
-    speech_filename = speak_with_voicevox(text)
 
-    if speech_filename and os.path.exists(speech_filename):
-        # PyAudio를 사용하여 파일 재생
-        pyaudio_thread = threading.Thread(
-            target=play_with_pyaudio, args=(speech_filename,)
-        )
-        pyaudio_thread.start()
+def warm_up():
+    """첫 턴이 이후 턴만큼 빠르도록 느린 준비 작업을 동시에 미리 해 둔다.
 
-        # Winsound를 사용하여 재생을 별도의 스레드에서 실행
-        winsound_thread = threading.Thread(
-            target=winsound.PlaySound, args=(speech_filename, winsound.SND_FILENAME)
-        )
-        winsound_thread.start()
+    화자 모델 로드(/initialize_speaker)와 자주 쓰는 문구 합성, 오디오 장치 열기,
+    LLM 엔드포인트 사전 연결. 단계별 소요 시간(초)을 반환한다.
+    """
 
-        # 두 스레드가 종료될 때까지 대기
-        pyaudio_thread.join()
-        winsound_thread.join()
-    else:
-        print(f"Error: 음성 파일을 찾을 수 없습니다. 파일 이름: {speech_filename}")
+    def open_audio_devices():
+        for done in audio_router.prepare():
+            done.wait(5)
 
+    def prewarm_tts_cache():
+        # 자주 쓰는 문구는 미리 합성해 캐시에 넣어 둔다 (화자 모델 로드 이후)
+        persona = personas.active
+        tts_client.initialize_speaker(persona.speaker)
+        tts_cache.prewarm(prewarm_phrases, persona.speaker, persona.prosody)
 
-# OpenAI API 키 설정
-api_key = os.environ["OPENAI_API_KEY"]
+    steps = [
+        ("speaker", prewarm_tts_cache),
+        ("audio_device", open_audio_devices),
+        ("llm_connect", engine.warm_up),
+    ]
+    with ThreadPoolExecutor(max_workers=len(steps)) as executor:
+        return dict(executor.map(lambda step: _run_timed(*step), steps))
 
-# 세션 기록을 관리할 변수 (직접 관리)
-session_store = {}
 
+def _startup(warm):
+    global _startup_error
+    try:
+        load_components()
+    except Exception as e:
+        _startup_error = e
+    finally:
+        components_ready.set()
+    if warm and _startup_error is None:
+        warm_up()
 
-# 세션 기록을 가져오는 함수
-def get_session_history(session_id: str):
-    if session_id not in session_store:
-        session_store[session_id] = ChatMessageHistory()
-    return session_store[session_id]
 
+def start_background_startup(warm=True):
+    """구성 요소 로드와 워밍업을 백그라운드 스레드에서 시작한다."""
+    global _warm_up_thread
+    _warm_up_thread = threading.Thread(target=_startup, args=(warm,), daemon=True)
+    _warm_up_thread.start()
+    return _warm_up_thread
 
-# response를 생성하는 함수
-def generate_response(user_input: str, session_id: str):
-    llm = ChatOpenAI(openai_api_key=api_key, model_name="gpt-4", temperature=1)
-
-    prompt = ChatPromptTemplate.from_messages(
-        [
-            ("system", system_prompt),  # 외부 파일에서 불러온 system 프롬프트 사용
-            MessagesPlaceholder(variable_name="history"),
-            ("human", "{question}"),
-        ]
-    )
 
-    chain = prompt | llm  # 프롬프트를 llm에 넣어 chain 구성
+def wait_until_ready():
+    components_ready.wait()
+    if _startup_error is not None:
+        raise _startup_error
 
-    chain_with_memory = RunnableWithMessageHistory(
-        chain,
-        get_session_history,
-        input_messages_key="question",
-        history_messages_key="history",
-    )
 
-    response = chain_with_memory.invoke(
-        {"question": user_input},
-        config={"configurable": {"session_id": session_id}},
-    )
+def speak_with_voicevox(text):
+    text = pronunciation_converter.convert(text)
+    persona = personas.active
+
+    # 캐시 히트면 VOICEVOX 요청 없이 바로 반환된다
+    wav = tts_cache.synthesize(text, persona.speaker, prosody=persona.prosody)
+
+    # 파일에 쓰지 않고 메모리에서 바로 재생할 수 있는 클립으로 반환
+    return AudioClip.from_wav_bytes(wav)
 
-    return response.content
 
+def play_clip(clip):
+    # 콜백 모드 싱크별 링 버퍼로 전달하므로 한 장치가 멈춰도 다른 장치는 계속 재생된다
+    audio_router.play_sync(clip)
 
-def chat():
+
+def flush_audio():
+    if audio_router is not None:
+        audio_router.flush()
+
+
+def play_assembled(clips):
+    """클립들을 무음 없이 이어 재생한다 (clip_assembler가 꺼져 있으면 그대로 재생)."""
+    if clip_assembler is None:
+        for clip in clips:
+            play_clip(clip)
+        return
+    clip_assembler.reset()
+    for clip in clips:
+        for part in clip_assembler.process(clip):
+            play_clip(part)
+    for part in clip_assembler.flush():
+        play_clip(part)
+
+
+def speak_and_play(text):
+    # 구절별로 합성되는 대로 재생 (뒤 구절은 재생 중에 합성된다). 합성한 클립 목록을 반환
+    text = pronunciation_converter.convert(text)
+    persona = personas.active
+    clips = []
+
+    def synthesized():
+        for wav in synthesis_scheduler.iter_synthesize(
+            text, persona.speaker, prosody=persona.prosody
+        ):
+            clips.append(AudioClip.from_wav_bytes(wav))
+            yield clips[-1]
+
+    play_assembled(synthesized())
+    return clips
+
+
+def synthesize_sentence(sentence, index):
+    return speak_with_voicevox(sentence)
+
+
+# 세션 기록을 가져오는 함수
+def get_session_history(session_id: str):
+    return session_store.get_session_history(session_id)
+
+
+# response를 생성하는 함수
+def generate_response(user_input: str, session_id: str):
+    return engine.invoke(user_input, session_id, persona=personas.active)
+
+
+# 토큰이 도착하는 대로 텍스트 조각을 돌려주는 스트리밍 버전
+def generate_response_stream(user_input: str, session_id: str):
+    return engine.stream(user_input, session_id, persona=personas.active)
+
+
+async def generate_response_astream(user_input: str, session_id: str):
+    # 첫 입력이 로드보다 빨리 들어오면 준비될 때까지 기다린다
+    await asyncio.to_thread(wait_until_ready)
+    async for chunk in engine.astream(
+        user_input, session_id, persona=personas.active
+    ):
+        yield chunk
+
+
+def replay_cached_response(cached, user_input, session_id):
+    """캐시된 응답을 출력하고 합성해 둔 음성을 재생한다 (LLM/VOICEVOX 요청 없음)."""
+    tracer.event("response_cache.hit", intent=cached.intent)
+    print(f"メガミ: {cached.text}")
+    remember_turn(get_session_history(session_id), user_input, cached.text)
+    play_assembled(cached.clips)
+
+
+def shutdown():
+    if engine is None:
+        return
+    speak_with_voicevox(f"さようなら")
+    logging.info(f"TTS cache: {tts_cache.stats()}")
+    logging.info(f"audio_query cache: {tts_client.query_cache_stats()}")
+    logging.info(f"Response cache: {response_cache.stats()}")
+    logging.info(f"LLM scheduler: {engine.scheduler.stats()}")
+    # 백그라운드 요약이 엔진을 쓰므로 요약이 끝난 뒤에 엔진을 닫는다
+    session_store.close()
+    # 나머지는 load_components()에서 만든 순서의 역순으로 닫는다
+    engine.close()
+    engine.scheduler.close()
+    audio_router.close()
+    if device_registry is not None:
+        device_registry.close()
+    if audio_output is not None:
+        audio_output.close()
+    personas.close()
+    synthesis_scheduler.close()
+    pronunciation_converter.close()
+    tts_cache.close()
+    tts_client.close()
+    tracer.close()
+
+
+def chat(streaming=True, read_input=None):
     print("メガミ: hello!")
     session_id = "unique_session_id"
     while True:
-        user_input = input("You: ")
+        user_input = read_input() if read_input else input("You: ")
         if user_input.lower() in ["종료", "exit", "quit"]:
             print("メガミ: 안녕히 가세요!")
-            speak_with_voicevox(f"さようなら")
+            wait_until_ready()
+            shutdown()
             break
 
-        response = generate_response(user_input, session_id)
-        print(f"メガミ: {response}")
+        # 첫 입력이 로드보다 빨리 들어오면 준비될 때까지 기다린다
+        wait_until_ready()
+
+        if user_input.startswith("/persona"):
+            name = user_input[len("/persona") :].strip()
+            if not name:
+                print(f"페르소나: {', '.join(personas.names())}")
+            elif personas.switch(name):
+                print(f"페르소나를 {name}(으)로 바꿨습니다.")
+            continue
+
+        # 이 턴에서 생기는 span에는 모두 같은 turn_id가 붙는다
+        with tracer.turn(session_id):
+            # 캐시를 허용한 의도의 반복 질문이면 이전 응답과 음성을 그대로 재사용
+            # 같은 프롬프트라도 목소리가 다르면 다른 키가 된다
+            persona = personas.active
+            cache_key = response_cache.make_key(
+                user_input,
+                persona.prompt,
+                context={"speaker": persona.speaker, "prosody": persona.prosody},
+            )
+            cached = response_cache.get(cache_key)
+            if cached is not None:
+                replay_cached_response(cached, user_input, session_id)
+                continue
+
+            if streaming:
+                # 문장이 완성될 때마다 합성/재생을 시작해 첫 음성까지의 시간을 줄인다
+                print("メガミ: ", end="", flush=True)
+                recorder = RecordingSynthesizer(synthesize_sentence)
+                response, time_to_first_audio = speak_streaming(
+                    generate_response_stream(user_input, session_id),
+                    recorder,
+                    play_clip,
+                    on_text=lambda chunk: print(chunk, end="", flush=True),
+                    assembler=clip_assembler,
+                )
+                print()
+                if time_to_first_audio is not None:
+                    logging.info(f"time-to-first-audio: {time_to_first_audio:.2f}s")
+                if recorder.complete:
+                    response_cache.put(cache_key, response, recorder.clips)
+                continue
+
+            response = generate_response(user_input, session_id)
+            print(f"メガミ: {response}")
+
+            # 음성 합성 및 재생을 위한 스레드 생성 (턴 컨텍스트를 함께 넘긴다)
+            clips = []
+            tts_thread = threading.Thread(
+                target=contextvars.copy_context().run,
+                args=(lambda: clips.extend(speak_and_play(response)),),
+            )
+            tts_thread.start()
+            tts_thread.join()  # 재생이 완료될 때까지 대기
+            response_cache.put(cache_key, response, clips)
+
+
+async def warm_up_async():
+    """asyncio 경로(chat_async, serve)가 쓰는 비동기 HTTP 클라이언트를 미리 연결한다.
+
+    비동기 커넥션은 이벤트 루프에 묶이므로 그 경로가 도는 루프 안에서 실행한다.
+    """
+    try:
+        await asyncio.to_thread(wait_until_ready)
+        with tracer.span("startup.llm_connect_async"):
+            await engine.awarm_up()
+    except Exception as e:
+        print(f"Error: 시작 준비 실패 (llm_connect_async) - {e}")
+
+
+async def close_async():
+    """비동기 HTTP 클라이언트를 그 클라이언트를 쓴 이벤트 루프 안에서 닫는다."""
+    if engine is not None:
+        await engine.aclose()
+
+
+# 재생 중에도 입력을 받고, 새 메시지가 오면 진행 중인 응답을 끊는 asyncio 버전
+async def chat_async():
+    runtime = AsyncChatRuntime(
+        generate=generate_response_astream,
+        synthesize=speak_with_voicevox,
+        play=play_clip,
+        flush=flush_audio,
+        assembler_factory=new_clip_assembler,
+    )
+    warming = asyncio.create_task(warm_up_async())
+    await runtime.run()
+    warming.cancel()
+    await asyncio.to_thread(wait_until_ready)
+    await close_async()
+    shutdown()
+
+
+def voice_chat(streaming=True):
+    """키보드 대신 마이크로 대화한다 (--voice).
+
+    MICROPHONE_DEVICE로 입력 장치를 고르고 STT_BACKEND(openai, stub)로 인식한다.
+    응답을 재생하는 동안에는 마이크 입력을 무시한다.
+    """
+    from audio_devices import device_pattern
+    from voice_input import MicrophoneSource, VoiceInput, create_stt
+
+    wait_until_ready()
+    device = device_registry.resolve_or_default(device_pattern("microphone"), "input")
+    voice = VoiceInput(MicrophoneSource(device), create_stt())
+    texts = voice.texts()
+
+    def read_input():
+        voice.resume()
+        user_input = next(texts, "exit")
+        voice.pause()
+        print(f"You: {user_input}")
+        return user_input
+
+    try:
+        chat(streaming, read_input)
+    finally:
+        texts.close()
+
+
+def serve():
+    """여러 클라이언트를 받는 HTTP/WebSocket 서버 모드 (chat_server.py 참고).
+
+    연결마다 세션이 따로 생기고, 세션 기록은 같은 session_store에 저장된다.
+    """
+    from chat_server import ChatServer
+
+    server = ChatServer(
+        generate=generate_response_astream,
+        synthesize=speak_with_voicevox,
+        llm_concurrency=int(os.environ.get("CHAT_SERVER_LLM_CONCURRENCY", 4)),
+        requests_per_minute=int(os.environ.get("CHAT_SERVER_LLM_RPM", 0)) or None,
+        synthesis_workers=int(os.environ.get("CHAT_SERVER_TTS_WORKERS", 2)),
+        on_startup=warm_up_async,
+        on_cleanup=close_async,
+    )
+    try:
+        server.run(
+            host=os.environ.get("CHAT_SERVER_HOST", "127.0.0.1"),
+            port=int(os.environ.get("CHAT_SERVER_PORT", 8080)),
+        )
+    finally:
+        wait_until_ready()
+        shutdown()
+
+
+def measure_startup():
+    """시작 시간 측정: 프롬프트 표시, 구성 요소 로드, 워밍업 단계별 시간을 출력한다.
 
-        # 음성 합성 및 재생을 위한 스레드 생성
-        tts_thread = threading.Thread(target=speak_and_play, args=(response,))
-        tts_thread.start()
-        tts_thread.join()  # 재생이 완료될 때까지 대기
+    import 단계를 더 자세히 보려면: python -X importtime run.py --startup-time
+    """
+    prompt_ready = time.perf_counter() - _started_at
+    thread = start_background_startup(warm=False)
+    wait_until_ready()
+    components_loaded = time.perf_counter() - _started_at
+    thread.join()
+
+    steps = warm_up()
+    warmed_up = time.perf_counter() - _started_at
+
+    print(f"prompt ready      {prompt_ready:7.3f}s")
+    print(f"components loaded {components_loaded:7.3f}s")
+    for name, seconds in steps.items():
+        print(f"  warm-up {name:<12} {seconds:7.3f}s")
+    print(f"warmed up         {warmed_up:7.3f}s")
+    shutdown()
 
 
 if __name__ == "__main__":
-    chat()
+    # to help the CLI write unicode characters to the terminal
+    sys.stdout = open(sys.stdout.fileno(), mode="w", encoding="utf8", buffering=1)
+
+    if "--startup-time" in sys.argv:
+        measure_startup()
+    elif "--serve" in sys.argv:
+        start_background_startup()
+        serve()
+    elif "--async" in sys.argv:
+        start_background_startup()
+        asyncio.run(chat_async())
+    elif "--voice" in sys.argv:
+        start_background_startup()
+        voice_chat(streaming="--no-stream" not in sys.argv)
+    else:
+        start_background_startup()
+        chat(streaming="--no-stream" not in sys.argv)
@@ -0,0 +1,223 @@
+import json
+import sqlite3
+import threading
+import time
+from collections import OrderedDict
+
+from langchain_core.chat_history import BaseChatMessageHistory
+from langchain_core.messages import message_to_dict, messages_from_dict
+
+
+class PersistentChatMessageHistory(BaseChatMessageHistory):
+    """최근 window개 메시지만 메모리에 들고, 추가되는 메시지는 스토어에 append 하는 기록.
+
+    offset은 메모리에 없는 (창 앞쪽의) 메시지 수로, 요약이 어디까지 덮는지 맞출 때 쓴다.
+    """
+
+    def __init__(self, store, session_id, messages, window, offset=0):
+        self.store = store
+        self.session_id = session_id
+        self.window = window
+        self.offset = offset
+        self._messages = list(messages)
+        self._lock = threading.Lock()
+
+    @property
+    def messages(self):
+        with self._lock:
+            return list(self._messages)
+
+    def add_message(self, message):
+        self.add_messages([message])
+
+    def add_messages(self, messages):
+        with self._lock:
+            self._messages.extend(messages)
+            dropped = max(0, len(self._messages) - self.window)
+            del self._messages[:dropped]
+            self.offset += dropped
+        self.store.append(self.session_id, messages)
+
+    def load_summary(self):
+        """저장된 (요약, 요약에 들어간 메시지 수). 없으면 ("", 0)."""
+        return self.store.load_summary(self.session_id)
+
+    def save_summary(self, summary, covered):
+        self.store.save_summary(self.session_id, summary, covered)
+
+    def clear(self):
+        with self._lock:
+            self._messages.clear()
+            self.offset = 0
+        self.store.delete(self.session_id)
+
+
+class SQLiteSessionStore:
+    """대화 기록을 SQLite에 영구 저장하는 세션 스토어.
+
+    - 메시지는 한 행씩 append만 한다 (WAL 모드, 일정 개수/시간마다 묶어서 commit)
+    - 세션의 최근 window개 메시지는 처음 접근할 때 읽어 온다
+    - 메모리에 올라온 세션은 max_sessions개까지만 유지하고 LRU로 내린다
+    - 오래된 대화의 요약은 세션마다 한 행으로 덮어쓴다 (history_manager가 사용)
+
+    get_session_history를 RunnableWithMessageHistory에 그대로 넘길 수 있다.
+    """
+
+    def __init__(
+        self,
+        path="sessions.db",
+        window=50,
+        max_sessions=64,
+        commit_batch=20,
+        commit_interval=1.0,
+    ):
+        self.window = window
+        self.max_sessions = max_sessions
+        self.commit_batch = commit_batch
+        self.commit_interval = commit_interval
+
+        self._conn = sqlite3.connect(path, check_same_thread=False)
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.execute("PRAGMA synchronous=NORMAL")
+        self._conn.execute(
+            """
+            CREATE TABLE IF NOT EXISTS messages (
+                id INTEGER PRIMARY KEY AUTOINCREMENT,
+                session_id TEXT NOT NULL,
+                message TEXT NOT NULL,
+                created_at REAL NOT NULL
+            )
+            """
+        )
+        self._conn.execute(
+            "CREATE INDEX IF NOT EXISTS idx_messages_session"
+            " ON messages (session_id, id)"
+        )
+        # covered: 세션 처음부터 요약에 들어간 메시지 수
+        self._conn.execute(
+            """
+            CREATE TABLE IF NOT EXISTS summaries (
+                session_id TEXT PRIMARY KEY,
+                summary TEXT NOT NULL,
+                covered INTEGER NOT NULL,
+                updated_at REAL NOT NULL
+            )
+            """
+        )
+        self._conn.commit()
+
+        self._db_lock = threading.Lock()
+        self._pending = []  # 아직 commit 되지 않은 행
+        self._sessions = OrderedDict()
+        self._sessions_lock = threading.Lock()
+
+        self._closed = threading.Event()
+        self._flusher = threading.Thread(target=self._flush_loop, daemon=True)
+        self._flusher.start()
+
+    def _flush_loop(self):
+        while not self._closed.wait(self.commit_interval):
+            self.flush()
+
+    def flush(self):
+        with self._db_lock:
+            if not self._pending:
+                return
+            rows, self._pending = self._pending, []
+            self._conn.executemany(
+                "INSERT INTO messages (session_id, message, created_at)"
+                " VALUES (?, ?, ?)",
+                rows,
+            )
+            self._conn.commit()
+
+    def append(self, session_id, messages):
+        now = time.time()
+        rows = [
+            (session_id, json.dumps(message_to_dict(m), ensure_ascii=False), now)
+            for m in messages
+        ]
+        with self._db_lock:
+            self._pending.extend(rows)
+            full = len(self._pending) >= self.commit_batch
+        if full:
+            self.flush()
+
+    def load(self, session_id, limit=None):
+        """세션의 최근 limit개 메시지를 오래된 순서로 읽는다."""
+        self.flush()
+        with self._db_lock:
+            rows = self._conn.execute(
+                "SELECT message FROM messages WHERE session_id = ?"
+                " ORDER BY id DESC LIMIT ?",
+                (session_id, limit or self.window),
+            ).fetchall()
+        return messages_from_dict([json.loads(row[0]) for row in reversed(rows)])
+
+    def count(self, session_id):
+        """세션에 저장된 전체 메시지 수."""
+        self.flush()
+        with self._db_lock:
+            row = self._conn.execute(
+                "SELECT COUNT(*) FROM messages WHERE session_id = ?", (session_id,)
+            ).fetchone()
+        return row[0]
+
+    def load_summary(self, session_id):
+        with self._db_lock:
+            row = self._conn.execute(
+                "SELECT summary, covered FROM summaries WHERE session_id = ?",
+                (session_id,),
+            ).fetchone()
+        return tuple(row) if row else ("", 0)
+
+    def save_summary(self, session_id, summary, covered):
+        # 요약은 드물게 바뀌므로 묶지 않고 바로 commit 한다
+        with self._db_lock:
+            self._conn.execute(
+                "INSERT OR REPLACE INTO summaries"
+                " (session_id, summary, covered, updated_at) VALUES (?, ?, ?, ?)",
+                (session_id, summary, covered, time.time()),
+            )
+            self._conn.commit()
+
+    def delete(self, session_id):
+        self.flush()
+        with self._db_lock:
+            self._conn.execute(
+                "DELETE FROM messages WHERE session_id = ?", (session_id,)
+            )
+            self._conn.execute(
+                "DELETE FROM summaries WHERE session_id = ?", (session_id,)
+            )
+            self._conn.commit()
+
+    def get_session_history(self, session_id):
+        with self._sessions_lock:
+            history = self._sessions.get(session_id)
+            if history is not None:
+                self._sessions.move_to_end(session_id)
+                return history
+
+        # 처음 접근할 때만 DB에서 최근 메시지를 읽어 온다
+        messages = self.load(session_id)
+        history = PersistentChatMessageHistory(
+            self,
+            session_id,
+            messages,
+            self.window,
+            offset=self.count(session_id) - len(messages),
+        )
+        with self._sessions_lock:
+            history = self._sessions.setdefault(session_id, history)
+            self._sessions.move_to_end(session_id)
+            while len(self._sessions) > self.max_sessions:
+                self._sessions.popitem(last=False)
+        return history
+
+    def close(self):
+        self._closed.set()
+        self._flusher.join()
+        self.flush()
+        with self._db_lock:
+            self._conn.close()
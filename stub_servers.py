@@ -0,0 +1,262 @@
+import array
+import io
+import json
+import math
+import sys
+import threading
+import time
+import wave
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+# 스텁 LLM이 돌려주는 응답 문장 (길이에 맞춰 반복해서 자른다)
+STUB_REPLY = "はい、ナンマンキャット様。今日もお手伝いできてうれしいです。"
+
+
+def tone_wav(seconds, rate=24000, frequency=220.0, amplitude=0.3):
+    """seconds 길이의 사인파 WAV 바이트 (VOICEVOX 기본 출력 형식: 24kHz 16bit 모노).
+
+    무음을 돌려주면 ClipAssembler가 앞뒤 무음으로 보고 전부 잘라 내므로 소리를 넣는다.
+    """
+    peak = int(32767 * amplitude)
+    samples = array.array(
+        "h",
+        (
+            int(peak * math.sin(2 * math.pi * frequency * i / rate))
+            for i in range(int(rate * seconds))
+        ),
+    )
+    if sys.byteorder == "big":
+        samples.byteswap()
+    buffer = io.BytesIO()
+    with wave.open(buffer, "wb") as wav_file:
+        wav_file.setnchannels(1)
+        wav_file.setsampwidth(2)
+        wav_file.setframerate(rate)
+        wav_file.writeframes(samples.tobytes())
+    return buffer.getvalue()
+
+
+class _StubHandler(BaseHTTPRequestHandler):
+    # keep-alive를 지원해야 실제 클라이언트의 커넥션 풀 동작이 재현된다
+    protocol_version = "HTTP/1.1"
+
+    def log_message(self, format, *args):
+        pass
+
+    def _body(self):
+        length = int(self.headers.get("Content-Length", 0))
+        return self.rfile.read(length) if length else b""
+
+    def _send(self, status, body, content_type):
+        self.send_response(status)
+        self.send_header("Content-Type", content_type)
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def _send_json(self, data, status=200):
+        body = json.dumps(data, ensure_ascii=False).encode("utf-8")
+        self._send(status, body, "application/json")
+
+
+class StubServer:
+    """백그라운드 스레드에서 도는 로컬 HTTP 스텁 서버의 공통 부분."""
+
+    handler = _StubHandler
+
+    def __init__(self, host="127.0.0.1", port=0):
+        handler = type(self.handler.__name__, (self.handler,), {"stub": self})
+        self.httpd = ThreadingHTTPServer((host, port), handler)
+        self.httpd.daemon_threads = True
+        self.thread = None
+
+    @property
+    def host(self):
+        return self.httpd.server_address[0]
+
+    @property
+    def port(self):
+        return self.httpd.server_address[1]
+
+    @property
+    def base_url(self):
+        return f"http://{self.host}:{self.port}"
+
+    def start(self):
+        self.thread = threading.Thread(target=self.httpd.serve_forever, daemon=True)
+        self.thread.start()
+        return self
+
+    def close(self):
+        self.httpd.shutdown()
+        self.httpd.server_close()
+
+
+class _VoicevoxHandler(_StubHandler):
+    def do_GET(self):
+        if self.path == "/version":
+            self._send_json("0.0.0-stub")
+        else:
+            self._send_json({"detail": "Not Found"}, 404)
+
+    def do_POST(self):
+        path = self.path.split("?", 1)[0]
+        self._body()
+        if path == "/audio_query":
+            time.sleep(self.stub.query_latency)
+            self._send_json(
+                {
+                    "accent_phrases": [],
+                    "speedScale": 1.0,
+                    "pitchScale": 0.0,
+                    "intonationScale": 1.0,
+                    "volumeScale": 1.0,
+                    "prePhonemeLength": 0.1,
+                    "postPhonemeLength": 0.1,
+                    "outputSamplingRate": self.stub.rate,
+                    "outputStereo": False,
+                }
+            )
+        elif path == "/initialize_speaker":
+            self.send_response(204)
+            self.send_header("Content-Length", "0")
+            self.end_headers()
+        elif path == "/synthesis":
+            time.sleep(self.stub.synthesis_latency)
+            self._send(200, self.stub.wav, "audio/wav")
+        else:
+            self._send_json({"detail": "Not Found"}, 404)
+
+
+class StubVoicevoxServer(StubServer):
+    """/audio_query, /synthesis, /initialize_speaker만 흉내 내는 VOICEVOX 엔진 스텁.
+
+    요청마다 지정한 지연 뒤에 wav_seconds 길이의 사인파 WAV를 돌려준다.
+    """
+
+    handler = _VoicevoxHandler
+
+    def __init__(
+        self,
+        query_latency=0.02,
+        synthesis_latency=0.1,
+        wav_seconds=1.0,
+        rate=24000,
+        **kwargs,
+    ):
+        self.query_latency = query_latency
+        self.synthesis_latency = synthesis_latency
+        self.rate = rate
+        self.wav = tone_wav(wav_seconds, rate)
+        super().__init__(**kwargs)
+
+
+class _OpenAIHandler(_StubHandler):
+    def do_GET(self):
+        # ConversationEngine.warm_up()이 연결을 미리 맺을 때 부르는 모델 목록
+        if self.path.endswith("/models"):
+            self._send_json({"object": "list", "data": []})
+        else:
+            self._send_json({"error": {"message": "Not Found"}}, 404)
+
+    def do_POST(self):
+        if not self.path.endswith("/chat/completions"):
+            self._send_json({"error": {"message": "Not Found"}}, 404)
+            return
+        request = json.loads(self._body() or b"{}")
+        model = request.get("model", "gpt-4")
+        tokens = self.stub.tokens()
+        content = "".join(tokens)
+
+        time.sleep(self.stub.first_token_latency)
+        if not request.get("stream"):
+            time.sleep(self.stub.token_interval * len(tokens))
+            self._send_json(
+                {
+                    "id": "chatcmpl-stub",
+                    "object": "chat.completion",
+                    "created": int(time.time()),
+                    "model": model,
+                    "choices": [
+                        {
+                            "index": 0,
+                            "message": {"role": "assistant", "content": content},
+                            "finish_reason": "stop",
+                        }
+                    ],
+                    "usage": {
+                        "prompt_tokens": 0,
+                        "completion_tokens": len(tokens),
+                        "total_tokens": len(tokens),
+                    },
+                }
+            )
+            return
+
+        # SSE 스트리밍 (keep-alive 유지를 위해 chunked 인코딩으로 보낸다)
+        self.send_response(200)
+        self.send_header("Content-Type", "text/event-stream")
+        self.send_header("Transfer-Encoding", "chunked")
+        self.end_headers()
+
+        deltas = [{"role": "assistant", "content": ""}]
+        deltas += [{"content": token} for token in tokens]
+        for index, delta in enumerate(deltas):
+            if index > 1:
+                time.sleep(self.stub.token_interval)
+            self._write_event(self._chunk(model, delta, None))
+        self._write_event(self._chunk(model, {}, "stop"))
+        self._write_chunk(b"data: [DONE]\n\n")
+        self._write_chunk(b"")
+
+    @staticmethod
+    def _chunk(model, delta, finish_reason):
+        return {
+            "id": "chatcmpl-stub",
+            "object": "chat.completion.chunk",
+            "created": int(time.time()),
+            "model": model,
+            "choices": [{"index": 0, "delta": delta, "finish_reason": finish_reason}],
+        }
+
+    def _write_event(self, data):
+        event = f"data: {json.dumps(data, ensure_ascii=False)}\n\n"
+        self._write_chunk(event.encode("utf-8"))
+
+    def _write_chunk(self, data):
+        self.wfile.write(f"{len(data):X}\r\n".encode("ascii") + data + b"\r\n")
+        self.wfile.flush()
+
+
+class StubOpenAIServer(StubServer):
+    """OpenAI 호환 /v1/chat/completions 스텁 (stream=true면 SSE로 토큰을 흘려보낸다).
+
+    응답은 STUB_REPLY를 reply_chars 글자로 맞춘 것이고, chars_per_token 글자씩
+    token_interval 간격으로 보낸다. 첫 토큰 전에는 first_token_latency만큼 기다린다.
+    """
+
+    handler = _OpenAIHandler
+
+    def __init__(
+        self,
+        first_token_latency=0.3,
+        token_interval=0.02,
+        reply_chars=120,
+        chars_per_token=2,
+        **kwargs,
+    ):
+        self.first_token_latency = first_token_latency
+        self.token_interval = token_interval
+        self.reply_chars = reply_chars
+        self.chars_per_token = chars_per_token
+        super().__init__(**kwargs)
+
+    @property
+    def base_url(self):
+        return f"{super().base_url}/v1"
+
+    def tokens(self):
+        repeat = self.reply_chars // len(STUB_REPLY) + 1
+        reply = (STUB_REPLY * repeat)[: self.reply_chars]
+        step = self.chars_per_token
+        return [reply[i : i + step] for i in range(0, len(reply), step)]
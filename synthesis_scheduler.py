@@ -0,0 +1,120 @@
+import contextvars
+import io
+import re
+import wave
+from concurrent.futures import ThreadPoolExecutor
+
+from tts_pipeline import split_sentences
+from voicevox_client import DEFAULT_PROSODY
+
+# 문장 안에서 더 잘게 나눌 수 있는 위치 (쉼표류)
+PHRASE_BOUNDARY = re.compile(r"(?<=[、，,;；:：])")
+
+
+def split_phrases(text, max_chars=60):
+    """긴 텍스트를 문장 -> 쉼표 단위로 나눠 max_chars 이하의 조각 목록으로 만든다."""
+    chunks = []
+    for sentence in split_sentences([text]):
+        if len(sentence) <= max_chars:
+            chunks.append(sentence)
+            continue
+
+        current = ""
+        for phrase in PHRASE_BOUNDARY.split(sentence):
+            if current and len(current) + len(phrase) > max_chars:
+                chunks.append(current)
+                current = ""
+            current += phrase
+            # 쉼표 없이 긴 구간은 글자 수로 자른다
+            while len(current) > max_chars:
+                chunks.append(current[:max_chars])
+                current = current[max_chars:]
+        if current.strip():
+            chunks.append(current)
+    return [chunk.strip() for chunk in chunks if chunk.strip()]
+
+
+def join_wavs(wavs):
+    """같은 포맷의 WAV 바이트들을 순서대로 이어 붙인 WAV 하나를 만든다."""
+    output = io.BytesIO()
+    with wave.open(output, "wb") as out:
+        for index, wav in enumerate(wavs):
+            with wave.open(io.BytesIO(wav), "rb") as part:
+                if index == 0:
+                    out.setparams(part.getparams())
+                out.writeframes(part.readframes(part.getnframes()))
+    return output.getvalue()
+
+
+class SynthesisScheduler:
+    """긴 응답을 구절 단위로 나눠 병렬 합성하고, 순서대로 돌려주는 스케줄러.
+
+    iter_synthesize()는 첫 조각이 준비되는 즉시 돌려주므로 나머지가 합성되는 동안
+    재생을 시작할 수 있다. synthesizer는 VoicevoxClient 또는 TTSCache처럼
+    synthesize(text, speaker, prosody)를 가진 객체면 된다.
+    """
+
+    def __init__(
+        self,
+        synthesizer,
+        client=None,
+        max_workers=2,
+        max_chars=60,
+        use_multi_synthesis=False,
+    ):
+        self.synthesizer = synthesizer
+        self.client = client or synthesizer
+        self.max_chars = max_chars
+        self.use_multi_synthesis = use_multi_synthesis
+        self.executor = ThreadPoolExecutor(
+            max_workers=max_workers, thread_name_prefix="synthesis"
+        )
+
+    def _multi_synthesize(self, chunks, speaker, prosody):
+        def synthesize(texts):
+            # 같은 풀에 다시 작업을 넣으면 워커가 모자랄 때 교착되므로 여기서는 순서대로 조회
+            queries = [self.client.audio_query(text, speaker) for text in texts]
+            for query in queries:
+                query.update(DEFAULT_PROSODY if prosody is None else prosody)
+            return self.client.multi_synthesis(queries, speaker)
+
+        # synthesizer가 TTSCache면 캐시에 있는 조각은 재사용하고 없는 조각만 한 번에 합성
+        synthesize_many = getattr(self.synthesizer, "synthesize_many", None)
+        if synthesize_many is None:
+            return synthesize(chunks)
+        return synthesize_many(chunks, speaker, prosody, synthesize)
+
+    def _submit(self, fn, *args):
+        # 워커 스레드의 span도 호출한 턴에 묶이도록 컨텍스트를 복사해 넘긴다
+        return self.executor.submit(contextvars.copy_context().run, fn, *args)
+
+    def iter_synthesize(self, text, speaker, prosody=None):
+        chunks = split_phrases(text, self.max_chars)
+        if not chunks:
+            return
+
+        first = self._submit(self.synthesizer.synthesize, chunks[0], speaker, prosody)
+        if self.use_multi_synthesis and len(chunks) > 1:
+            # 첫 조각은 단독으로 빨리 합성하고, 나머지는 multi_synthesis 한 번으로 처리
+            rest = self._submit(self._multi_synthesize, chunks[1:], speaker, prosody)
+            yield first.result()
+            yield from rest.result()
+            return
+
+        futures = [first] + [
+            self._submit(self.synthesizer.synthesize, chunk, speaker, prosody)
+            for chunk in chunks[1:]
+        ]
+        try:
+            for future in futures:
+                yield future.result()
+        finally:
+            for future in futures:
+                future.cancel()
+
+    def synthesize(self, text, speaker, prosody=None):
+        """모든 조각을 합성한 뒤 하나의 WAV로 이어 붙여 반환한다."""
+        return join_wavs(list(self.iter_synthesize(text, speaker, prosody)))
+
+    def close(self):
+        self.executor.shutdown(wait=False, cancel_futures=True)
@@ -1,29 +1,70 @@
+import asyncio
 import os
+import sys
 import threading
 from datetime import datetime
-from functools import lru_cache
-from pytz import timezone
-from langchain_openai import ChatOpenAI
-from langchain_core.prompts import ChatPromptTemplate, MessagesPlaceholder
-from langchain_core.runnables.history import RunnableWithMessageHistory
-from langchain_community.chat_message_histories import ChatMessageHistory
-from dateutil import parser
 from Google_Calendar import get_upcoming_events
 from dotenv import load_dotenv
-import requests
-import urllib.parse
-import wave
-import pyaudio
 import logging
 import re
+from tts_pipeline import speak_streaming
+from audio_clip import AudioClip
+from audio_assembly import ClipAssembler
+from voicevox_client import VoicevoxClient
+from tts_cache import TTSCache
+from synthesis_scheduler import SynthesisScheduler
+from audio_output import AudioOutputManager
+from audio_router import AudioRouter, PyAudioSink
+from audio_devices import DeviceRegistry, device_pattern
+from conversation_engine import ConversationEngine
+from llm_scheduler import LLMScheduler
+from async_chat import AsyncChatRuntime
+from session_store import SQLiteSessionStore
+from history_manager import HistoryManager, count_tokens, summarize_messages
+from calendar_index import EventIndex
+from context_providers import ContextPipeline
+from tracing import configure_from_env, tracer
+from pronunciation import PronunciationConverter, llm_readings
+from response_cache import RecordingSynthesizer, ResponseCache, remember_turn
+from personas import PersonaRegistry
 
 # .env 파일에서 환경 변수 로드
 load_dotenv()
 
 logging.getLogger("langchain").setLevel(logging.ERROR)
 
-# Voicevox 관련 설정
-base_url = "http://localhost:50021"
+# 턴별 지연 시간 추적 (TRACE_ENABLED, TRACE_FILE, METRICS_PORT, TRACE_LOG)
+configure_from_env()
+
+# Voicevox 관련 설정 (VOICEVOX_HOST / VOICEVOX_PORT, 기본 localhost:50021)
+tts_client = VoicevoxClient()
+tts_cache = TTSCache(tts_client)
+
+# 페르소나(system 프롬프트 파일, 화자, 운율, 샘플링 값)는 personas.json에서 한 번만 읽고,
+# 파일이 바뀌면 백그라운드에서 다시 읽는다 (PERSONAS_PATH / PERSONA)
+personas = PersonaRegistry(
+    os.environ.get("PERSONAS_PATH", "personas.json"),
+    active=os.environ.get("PERSONA"),
+).start()
+
+# 영어/한국어는 VOICEVOX가 읽지 못하므로 가타카나 읽기로 바꿔서 넘긴다.
+# 사전에 없는 영어 단어는 백그라운드에서 LLM에 물어 사전에 저장한다
+# (VOICEVOX_USER_DICT=1이면 엔진 사용자 사전에도 등록)
+pronunciation_converter = PronunciationConverter(
+    fallback=lambda words: engine.background(
+        lambda llm: llm_readings(llm, words),
+        tokens=100 + 20 * len(words),
+        key=("readings", tuple(sorted(words))),
+    ),
+    client=tts_client,
+    register_with_engine=os.environ.get("VOICEVOX_USER_DICT") == "1",
+)
+
+# 긴 응답은 구절 단위로 나눠 병렬 합성하고, 첫 구절이 준비되면 바로 재생
+synthesis_scheduler = SynthesisScheduler(tts_cache, client=tts_client, max_workers=2)
+
+# 문장 클립의 앞뒤 무음을 자르고 크로스페이드로 이어 붙이며 음량을 맞춘다
+clip_assembler = ClipAssembler()
 
 # Google Calendar 관련 키워드
 CALENDAR_KEYWORDS = ["일정", "캘린더", "회의", "약속"]
@@ -35,13 +76,13 @@ def parse_korean_date(user_input):
         if match:
             month, day = map(int, match.groups())
             parsed_date = datetime(datetime.now().year, month, day)
-            print(f"Debug: Successfully parsed date - {parsed_date}")
+            tracer.event("calendar.date_parsed", date=parsed_date)
             return parsed_date
         else:
-            print(f"Debug: Failed to match date format in input - {user_input}")
+            tracer.event("calendar.date_unmatched", user_input=user_input)
             return None
     except ValueError as e:
-        print(f"Debug: ValueError in parsing date - {e}")
+        tracer.event("calendar.date_invalid", error=e)
         return None
 
 
@@ -53,264 +94,420 @@ def analyze_user_intent(user_input):
     return "unknown"
 
 
-@lru_cache(maxsize=128)
-def get_upcoming_events_cached():
-    try:
-        return get_upcoming_events()
-    except Exception as e:
-        print(f"Google Calendar API 호출 중 에러 발생: {e}")
-        return []
+# 캘린더 이벤트 인덱스: 타임스탬프를 한 번만 파싱해 정렬해 두고, TTL마다 백그라운드에서 갱신
+calendar_index = EventIndex(get_upcoming_events, ttl=300).start()
 
 
-def filter_calendar_by_date(user_input, events):
+def filter_calendar_by_date(user_input):
     intent = analyze_user_intent(user_input)
-    print(f"Debug: Detected user intent - {intent}")
+    tracer.event("calendar.intent", intent=intent)
 
     if intent == "recent":
-        now = datetime.now(timezone("Asia/Seoul"))
-        upcoming_events = sorted(
-            events,
-            key=lambda event: parser.isoparse(event["time"]).astimezone(
-                timezone("Asia/Seoul")
-            ),
-        )
-        for event in upcoming_events:
-            event_time = parser.isoparse(event["time"]).astimezone(
-                timezone("Asia/Seoul")
-            )
-            if event_time > now:
-                print(f"Debug: Nearest upcoming event - {event}")
-                return [event]
+        event = calendar_index.next_upcoming()
+        if event:
+            tracer.event("calendar.next_upcoming", event=event)
+            return [event]
         return []
 
     elif intent == "date_specific":
         try:
             parsed_date = parse_korean_date(user_input)
             if not parsed_date:
-                print(f"날짜 파싱 실패: {user_input}")
+                tracer.event("calendar.date_parse_failed", user_input=user_input)
                 return None
             target_date = parsed_date.date()
         except Exception as e:
             print(f"날짜 파싱 중 오류 발생: {e}")
             return None
 
-        print(f"Debug: Target date for filtering - {target_date}")
-
-        filtered_events = []
-        for event in events:
-            try:
-                event_time = parser.isoparse(event["time"]).astimezone(
-                    timezone("Asia/Seoul")
-                )
-                if event_time.date() == target_date:
-                    filtered_events.append(event)
-            except Exception as e:
-                print(f"이벤트 시간 파싱 에러: {e}")
-                continue
+        tracer.event("calendar.target_date", date=target_date)
 
-        print(f"Debug: Filtered events - {filtered_events}")
+        filtered_events = calendar_index.on_date(target_date)
+        tracer.event("calendar.filtered", events=filtered_events)
         return filtered_events
 
     else:
-        print("Debug: Unknown intent detected. No specific action taken.")
+        tracer.event("calendar.unknown_intent")
         return []
 
 
-def load_system_prompt(file_path="System_Prompt.txt"):
-    try:
-        with open(file_path, "r", encoding="utf-8") as file:
-            prompt_content = file.read()
-            print(f"Debug: System prompt loaded successfully from {file_path}")
-            return prompt_content
-    except Exception as e:
-        print(f"Error: Failed to load system prompt from {file_path} - {e}")
-        return "Default system prompt: 캐릭터성이 필요합니다. 이 응답은 기본 시스템 프롬프트를 사용합니다."
-
-
+@tracer.traced("speak_with_voicevox")
 def speak_with_voicevox(text):
-    speaker_id = "8"
+    text = pronunciation_converter.convert(text)
+    persona = personas.active
 
-    params_encoded = urllib.parse.urlencode({"text": text, "speaker": speaker_id})
-    req = requests.post(f"{base_url}/audio_query?{params_encoded}")
-    req.raise_for_status()
+    # 캐시 히트면 VOICEVOX 요청 없이 바로 반환된다
+    wav = tts_cache.synthesize(text, persona.speaker, prosody=persona.prosody)
 
-    query = req.json()
-    query["volumeScale"] = 1.00
-    query["intonationScale"] = 0.60
-    query["prePhonemeLength"] = 0.10
-    query["postPhonemeLength"] = 0.10
+    # speech.wav 파일 대신 메모리 버퍼로 반환
+    return AudioClip.from_wav_bytes(wav)
 
-    params_encoded = urllib.parse.urlencode({"speaker": speaker_id})
-    req = requests.post(f"{base_url}/synthesis?{params_encoded}", json=query)
-    req.raise_for_status()
 
-    speech_filename = "speech.wav"
-    with open(speech_filename, "wb") as outfile:
-        outfile.write(req.content)
+# PyAudio 초기화와 장치별 출력 스트림은 한 번만 열어 두고 재사용
+audio_output = AudioOutputManager()
 
-    return speech_filename
+# 장치 번호는 부팅마다 바뀌므로 이름으로 찾는다 (VB_CABLE_DEVICE / SPEAKER_DEVICE).
+# 찾은 결과는 디스크에 캐시되어 다음 실행 때는 장치를 다시 나열하지 않는다
+device_registry = DeviceRegistry(audio_output.pa)
+vb_cable_device = device_registry.resolve_or_default(device_pattern("vb_cable"))
+speaker_device = device_registry.resolve_or_default(device_pattern("speaker"))
 
 
-def play_with_pyaudio(speech_filename):
-    """VB-CABLE로 오디오 파일 재생."""
-    p = pyaudio.PyAudio()
-    vb_cable_index = 6
+@tracer.traced("play_with_pyaudio")
+def play_with_pyaudio(clip):
+    """VB-CABLE로 오디오 클립 재생."""
+    vb_cable_index = vb_cable_device
 
     if vb_cable_index is None:
         print("Error: VB-CABLE 장치가 설정되지 않았습니다.")
         return
 
-    wav_file = wave.open(speech_filename, "rb")
-    stream = p.open(
-        format=p.get_format_from_width(wav_file.getsampwidth()),
-        channels=wav_file.getnchannels(),
-        rate=wav_file.getframerate(),
-        output_device_index=vb_cable_index,  # VB-CABLE 장치 ID 사용
-        output=True,
-    )
+    audio_output.play_sync(clip, device=vb_cable_index)  # VB-CABLE 장치 ID 사용
 
-    data = wav_file.readframes(1024)
-    while data:
-        stream.write(data)
-        data = wav_file.readframes(1024)
 
-    stream.stop_stream()
-    stream.close()
-    wav_file.close()
-    p.terminate()
+def iter_speech_clips(text):
+    """긴 텍스트를 구절 단위로 병렬 합성해, 준비되는 순서대로 클립을 돌려준다."""
+    text = pronunciation_converter.convert(text)
+    persona = personas.active
+    for wav in synthesis_scheduler.iter_synthesize(
+        text, persona.speaker, prosody=persona.prosody
+    ):
+        yield AudioClip.from_wav_bytes(wav)
 
 
 def speak_and_play(text):
-    speech_filename = speak_with_voicevox(text)
+    for clip in iter_speech_clips(text):
+        play_with_pyaudio(clip)
 
-    if speech_filename and os.path.exists(speech_filename):
-        play_with_pyaudio(speech_filename)
-    else:
-        print(f"Error: 음성 파일을 찾을 수 없습니다. 파일 이름: {speech_filename}")
 
+# (VB-CABLE ID, 스피커 ID) 조합별 라우터
+audio_routers = {}
 
-def play_with_multiple_outputs(speech_filename, vb_cable_id, speaker_id):
-    """VB-CABLE 및 지정된 스피커로 동시 출력."""
-    p = pyaudio.PyAudio()
-
-    # 오디오 파일 열기
-    wav_file = wave.open(speech_filename, "rb")
-    audio_format = p.get_format_from_width(wav_file.getsampwidth())
-    channels = wav_file.getnchannels()
-    rate = wav_file.getframerate()
-
-    # VB-CABLE 출력 스트림 생성
-    vb_cable_stream = p.open(
-        format=audio_format,
-        channels=channels,
-        rate=rate,
-        output_device_index=vb_cable_id,  # VB-CABLE ID
-        output=True,
-    )
 
-    # 스피커 출력 스트림 생성
-    speaker_stream = p.open(
-        format=audio_format,
-        channels=channels,
-        rate=rate,
-        output_device_index=speaker_id,  # 스피커 ID
-        output=True,
-    )
+def get_audio_router(vb_cable_id, speaker_id):
+    key = (vb_cable_id, speaker_id)
+    if key not in audio_routers:
+        sinks = [
+            PyAudioSink(
+                audio_output.pa,
+                device=speaker_id,
+                name="speaker",
+                supports=device_registry.supports,
+            )
+        ]
+        # VB-CABLE이 없으면 (경고 후 None) 스피커로만 재생한다
+        if vb_cable_id is not None:
+            sinks.insert(
+                0,
+                PyAudioSink(
+                    audio_output.pa,
+                    device=vb_cable_id,
+                    name="VB-CABLE",
+                    supports=device_registry.supports,
+                ),
+            )
+        audio_routers[key] = AudioRouter(sinks)
+    return audio_routers[key]
+
 
-    # 오디오 데이터를 읽어 두 출력 장치로 동시에 전송
-    data = wav_file.readframes(1024)
-    while data:
-        vb_cable_stream.write(data)
-        speaker_stream.write(data)
-        data = wav_file.readframes(1024)
+@tracer.traced("play_with_multiple_outputs")
+def play_with_multiple_outputs(clip, vb_cable_id, speaker_id):
+    """VB-CABLE 및 지정된 스피커로 동시 출력."""
+    # 장치별 링 버퍼 + 콜백 모드로 보내므로 한쪽이 멈춰도 다른 쪽이 밀리지 않는다
+    get_audio_router(vb_cable_id, speaker_id).play_sync(clip)
 
-    # 스트림 정리
-    vb_cable_stream.stop_stream()
-    vb_cable_stream.close()
-    speaker_stream.stop_stream()
-    speaker_stream.close()
-    wav_file.close()
-    p.terminate()
+
+def play_assembled_multiple(clips, vb_cable_id, speaker_id):
+    """클립들의 무음을 자르고 크로스페이드로 이어서 VB-CABLE 및 스피커로 출력."""
+    clip_assembler.reset()
+    for clip in clips:
+        for part in clip_assembler.process(clip):
+            play_with_multiple_outputs(part, vb_cable_id, speaker_id)
+    for part in clip_assembler.flush():
+        play_with_multiple_outputs(part, vb_cable_id, speaker_id)
 
 
 def speak_and_play_multiple(text, vb_cable_id, speaker_id):
-    """텍스트를 음성으로 변환 후 VB-CABLE 및 스피커로 출력."""
-    speech_filename = speak_with_voicevox(text)
+    """텍스트를 음성으로 변환 후 VB-CABLE 및 스피커로 출력. 합성한 클립 목록을 반환."""
+    clips = []
 
-    if speech_filename and os.path.exists(speech_filename):
-        play_with_multiple_outputs(speech_filename, vb_cable_id, speaker_id)
-    else:
-        print(f"Error: 음성 파일을 찾을 수 없습니다. 파일 이름: {speech_filename}")
+    def synthesized():
+        for clip in iter_speech_clips(text):
+            clips.append(clip)
+            yield clip
 
+    play_assembled_multiple(synthesized(), vb_cable_id, speaker_id)
+    return clips
 
-def generate_response(user_input, session_id):
-    llm = ChatOpenAI(
-        openai_api_key=os.environ["OPENAI_API_KEY"], model_name="gpt-4", temperature=1
-    )
 
-    system_prompt = load_system_prompt()
+# 오래된 대화를 요약하는 함수 (history_manager의 백그라운드 스레드에서 호출).
+# 대화 턴보다 낮은 우선순위로 스케줄러를 거쳐 나간다
+def summarize_history(summary, messages):
+    text = summary + "".join(str(m.content) for m in messages)
+    return engine.background(
+        lambda llm: summarize_messages(llm, summary, messages),
+        tokens=count_tokens(text) * 2,
+    )
 
-    if any(keyword in user_input for keyword in CALENDAR_KEYWORDS):
-        events = get_upcoming_events_cached()
-        filtered_events = filter_calendar_by_date(user_input, events)
 
-        if filtered_events:
-            event_descriptions = "\n".join(
-                f"시간: {event['time']}, 제목: {event['title']}, 설명: {event['description']}, 위치: {event['location']} "
-                for event in filtered_events
-            )
-            extended_prompt = (
-                f"{system_prompt}\n\n"
-                f"ナンマンキャット様, 아래는 요청하신 '{user_input}' 관련 일정입니다:\n{event_descriptions}\n"
-                "이 정보를 바탕으로 캐릭터성을 유지하며 응답하세요."
-            )
-        else:
-            extended_prompt = (
-                f"{system_prompt}\n\n"
-                f"ナンマンキャット様, '{user_input}' 관련 일정이 없습니다. 다른 도움을 요청해 주세요."
-            )
-    else:
-        extended_prompt = (
-            f"{system_prompt}\n\n"
-            f"ナンマンキャット様, '{user_input}'에 대한 직접적인 정보는 없지만, 다른 요청이 있다면 알려주세요."
+# 대화 기록은 SQLite에 저장해 턴/재시작 사이에도 유지하고,
+# 프롬프트에 들어가는 history는 토큰 예산 안으로 유지 (run.py와 같은 구성)
+session_store = HistoryManager(
+    max_tokens=int(os.environ.get("HISTORY_MAX_TOKENS", 2000)),
+    summarize=summarize_history,
+    store=SQLiteSessionStore(os.environ.get("SESSION_DB_PATH", "sessions.db")),
+)
+
+# 모든 OpenAI 호출의 분당 요청/토큰 예산. 대화 턴이 발음 조회 같은 뒷작업보다 먼저 나간다.
+# 기본값 OPENAI_RPM=500 / OPENAI_TPM=10000은 gpt-4 최하위 등급 기준 (계정 한도에 맞춰 조정)
+llm_scheduler = LLMScheduler(
+    requests_per_minute=int(os.environ.get("OPENAI_RPM", 500)),
+    tokens_per_minute=int(os.environ.get("OPENAI_TPM", 10000)),
+)
+
+engine = ConversationEngine(
+    api_key=os.environ["OPENAI_API_KEY"],
+    system_prompt=personas.active.prompt,
+    get_session_history=session_store.get_session_history,
+    model_name="gpt-4",
+    temperature=float(os.environ.get("OPENAI_TEMPERATURE", 1)),
+    top_p=float(os.environ.get("OPENAI_TOP_P", 1)),
+    scheduler=llm_scheduler,
+)
+
+
+@tracer.traced("calendar_context")
+def calendar_context(user_input):
+    """캘린더 컨텍스트 공급자: 요청과 관련된 일정을 프롬프트용 문장으로 만든다."""
+    filtered_events = filter_calendar_by_date(user_input)
+
+    if filtered_events:
+        event_descriptions = "\n".join(
+            f"시간: {event['time']}, 제목: {event['title']}, 설명: {event['description']}, 위치: {event['location']} "
+            for event in filtered_events
         )
+        return (
+            f"ナンマンキャット様, 아래는 요청하신 '{user_input}' 관련 일정입니다:\n{event_descriptions}\n"
+            "이 정보를 바탕으로 캐릭터성을 유지하며 응답하세요."
+        )
+    return f"ナンマンキャット様, '{user_input}' 관련 일정이 없습니다. 다른 도움을 요청해 주세요."
+
+
+# 컨텍스트 공급자 파이프라인: 트리거가 맞는 공급자를 동시에 실행하고, 공급자별 제한 시간을 둔다.
+# 입력을 받자마자 observe()로 조회를 시작해 두면 gather()가 그 결과를 이어받는다.
+context_pipeline = ContextPipeline()
+context_pipeline.register(
+    "calendar",
+    calendar_context,
+    keywords=CALENDAR_KEYWORDS,
+    deadline=2.0,
+)
+
+
+# 반복되는 질문의 응답과 음성을 재사용하는 캐시.
+# RESPONSE_CACHE_INTENTS=greeting,schedule,status 처럼 캐시할 의도를 고른다 (기본은 끔)
+response_cache = ResponseCache(
+    intents=[
+        intent.strip()
+        for intent in os.environ.get("RESPONSE_CACHE_INTENTS", "").split(",")
+        if intent.strip()
+    ],
+    ttl=float(os.environ.get("RESPONSE_CACHE_TTL", 600)),
+)
+
+
+def context_fingerprint(contexts):
+    """응답 캐시 키에 넣을 컨텍스트: 목소리, 오늘 날짜와 gather()가 모은 컨텍스트.
+
+    컨텍스트(캘린더 일정 등)를 다시 조회하지 않고 이번 턴에 모은 것을 그대로 쓴다.
+    """
+    persona = personas.active
+    return {
+        "speaker": persona.speaker,
+        "prosody": persona.prosody,
+        "date": datetime.now().date(),
+        "contexts": contexts,
+    }
+
+
+@tracer.traced("build_system_prompt")
+def build_system_prompt(user_input, contexts=None):
+    """컨텍스트 공급자들의 결과를 덧붙인 이번 턴의 system 프롬프트를 만든다."""
+    system_prompt = personas.active.prompt  # 메모리에 있는 값 (디스크를 읽지 않는다)
+    if contexts is None:
+        contexts = context_pipeline.gather(user_input)
+    if contexts:
+        return "\n\n".join([system_prompt, *contexts.values()])
+
+    return (
+        f"{system_prompt}\n\n"
+        f"ナンマンキャット様, '{user_input}'에 대한 직접적인 정보는 없지만, 다른 요청이 있다면 알려주세요."
+    )
 
-    prompt = ChatPromptTemplate.from_messages(
-        [
-            ("system", extended_prompt),
-            MessagesPlaceholder(variable_name="history"),
-            ("human", "{question}"),
-        ]
+
+@tracer.traced("generate_response")
+def generate_response(user_input, session_id, system_prompt=None):
+    return engine.invoke(
+        user_input,
+        session_id,
+        system_prompt=system_prompt or build_system_prompt(user_input),
+        persona=personas.active,
     )
 
-    chain = prompt | llm
-    chain_with_memory = RunnableWithMessageHistory(
-        chain,
-        lambda _: ChatMessageHistory(),
-        input_messages_key="question",
-        history_messages_key="history",
+
+def generate_response_stream(user_input, session_id, system_prompt=None):
+    """토큰이 도착하는 대로 응답 텍스트 조각을 돌려준다."""
+    return engine.stream(
+        user_input,
+        session_id,
+        system_prompt=system_prompt or build_system_prompt(user_input),
+        persona=personas.active,
     )
-    response = chain_with_memory.invoke(
-        {"question": user_input}, config={"configurable": {"session_id": session_id}}
+
+
+def speak_streaming_multiple(chunks, vb_cable_id, speaker_id, synthesize=None):
+    """문장 단위로 합성하면서 앞 문장을 VB-CABLE 및 스피커로 재생."""
+
+    def synthesize_sentence(sentence, index):
+        return speak_with_voicevox(sentence)
+
+    def play(clip):
+        play_with_multiple_outputs(clip, vb_cable_id, speaker_id)
+
+    return speak_streaming(
+        chunks,
+        synthesize or synthesize_sentence,
+        play,
+        on_text=lambda chunk: print(chunk, end="", flush=True),
+        assembler=clip_assembler,
     )
-    return response.content
 
 
-def chat():
+def replay_cached_response(cached, user_input, session_id, vb_cable_id, speaker_id):
+    """캐시된 응답을 출력하고 합성해 둔 음성을 재생한다 (LLM/VOICEVOX 요청 없음)."""
+    tracer.event("response_cache.hit", intent=cached.intent)
+    print(f"メガミ: {cached.text}")
+    remember_turn(
+        session_store.get_session_history(session_id), user_input, cached.text
+    )
+    play_assembled_multiple(cached.clips, vb_cable_id, speaker_id)
+
+
+def shutdown():
+    tracer.event("tts_cache.stats", **tts_cache.stats())
+    tracer.event("audio_query_cache.stats", **tts_client.query_cache_stats())
+    tracer.event("response_cache.stats", **response_cache.stats())
+    # 백그라운드 요약이 엔진을 쓰므로 요약이 끝난 뒤에 엔진을 닫는다
+    session_store.close()
+    # 나머지는 만든 순서의 역순으로 닫는다
+    context_pipeline.close()
+    engine.close()
+    llm_scheduler.close()
+    for router in audio_routers.values():
+        router.close()
+    device_registry.close()
+    audio_output.close()
+    calendar_index.close()
+    synthesis_scheduler.close()
+    pronunciation_converter.close()
+    personas.close()
+    tts_cache.close()
+    tts_client.close()
+    tracer.close()
+
+
+def chat(streaming=True):
     print("メガミ: 안녕하세요! 무엇을 도와드릴까요?")
     session_id = "unique_session_id"
     while True:
         user_input = input("You: ")
+        # 입력을 받자마자 컨텍스트 조회부터 시작 (gather()가 결과를 이어받는다)
+        context_pipeline.observe(user_input)
         if user_input.lower() in ["종료", "exit", "quit"]:
             print("メガミ: 안녕히 가세요!")
+            shutdown()
             break
+        if user_input.startswith("/persona"):
+            name = user_input[len("/persona") :].strip()
+            if not name:
+                print(f"페르소나: {', '.join(personas.names())}")
+            elif personas.switch(name):
+                print(f"페르소나를 {name}(으)로 바꿨습니다.")
+            continue
+
+        # 이 턴에서 생기는 span에는 모두 같은 turn_id가 붙는다
+        with tracer.turn(session_id):
+            contexts = context_pipeline.gather(user_input)
+            system_prompt = build_system_prompt(user_input, contexts)
+
+            # 캐시를 허용한 의도의 반복 질문이면 (일정이 그대로인 한) 이전 응답을 재사용
+            cache_key = response_cache.make_key(
+                user_input,
+                personas.active.prompt,
+                context=lambda: context_fingerprint(contexts),
+            )
+            cached = response_cache.get(cache_key)
+            if cached is not None:
+                replay_cached_response(
+                    cached, user_input, session_id, vb_cable_device, speaker_device
+                )
+                continue
+
+            if streaming:
+                print("メガミ: ", end="", flush=True)
+                recorder = RecordingSynthesizer(
+                    lambda sentence, index: speak_with_voicevox(sentence)
+                )
+                response, time_to_first_audio = speak_streaming_multiple(
+                    generate_response_stream(user_input, session_id, system_prompt),
+                    vb_cable_id=vb_cable_device,
+                    speaker_id=speaker_device,
+                    synthesize=recorder,
+                )
+                print()
+                tracer.event("turn.time_to_first_audio", seconds=time_to_first_audio)
+                if recorder.complete:
+                    response_cache.put(cache_key, response, recorder.clips)
+                continue
 
-        response = generate_response(user_input, session_id)
-        print(f"メガミ: {response}")
+            response = generate_response(user_input, session_id, system_prompt)
+            print(f"メガミ: {response}")
 
-        # 음성 출력 (VB-CABLE ID: 6, 스피커 ID: 4)
-        speak_and_play_multiple(response, vb_cable_id=6, speaker_id=4)
+            # 음성 출력 (VB-CABLE 및 스피커)
+            clips = speak_and_play_multiple(
+                response, vb_cable_id=vb_cable_device, speaker_id=speaker_device
+            )
+            response_cache.put(cache_key, response, clips)
+
+
+async def generate_response_astream(user_input, session_id):
+    """generate_response_stream()의 asyncio 버전. 캘린더 조회는 스레드에서 실행."""
+    system_prompt = await asyncio.to_thread(build_system_prompt, user_input)
+    async for chunk in engine.astream(
+        user_input, session_id, system_prompt=system_prompt, persona=personas.active
+    ):
+        yield chunk
+
+
+async def chat_async(vb_cable_id=vb_cable_device, speaker_id=speaker_device):
+    """재생 중에도 입력을 받고, 새 메시지가 오면 진행 중인 응답을 끊는다."""
+    router = get_audio_router(vb_cable_id, speaker_id)
+    runtime = AsyncChatRuntime(
+        generate=generate_response_astream,
+        synthesize=speak_with_voicevox,
+        play=router.play_sync,
+        flush=router.flush,
+        assembler_factory=ClipAssembler,
+        on_input=context_pipeline.observe,
+    )
+    await runtime.run()
+    # 비동기 HTTP 클라이언트는 그 클라이언트를 쓴 이벤트 루프 안에서 닫는다
+    await engine.aclose()
+    shutdown()
 
 
 if __name__ == "__main__":
-    chat()
+    if "--async" in sys.argv:
+        asyncio.run(chat_async())
+    else:
+        chat(streaming="--no-stream" not in sys.argv)
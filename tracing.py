@@ -0,0 +1,335 @@
+import contextvars
+import functools
+import itertools
+import json
+import logging
+import os
+import queue
+import threading
+import time
+import uuid
+from contextlib import contextmanager
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+# 히스토그램 버킷 (초)
+DEFAULT_BUCKETS = (0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0)
+
+_STOP = object()
+
+# 현재 턴 (turn_id, session_id)과 현재 span. 스레드로 넘길 때는 copy_context()로 전달한다
+_current_turn = contextvars.ContextVar("trace_turn", default=None)
+_current_span = contextvars.ContextVar("trace_span", default=None)
+
+logger = logging.getLogger("trace")
+
+# PrometheusExporter.render()가 히스토그램 뒤에 덧붙이는 추가 지표 (prefix -> 텍스트)
+_metric_collectors = []
+
+
+def register_metrics(collector):
+    """/metrics에 내보낼 지표 함수를 등록한다 (예: LLM 대기열 길이)."""
+    _metric_collectors.append(collector)
+
+
+def unregister_metrics(collector):
+    if collector in _metric_collectors:
+        _metric_collectors.remove(collector)
+
+
+class _NoopSpan:
+    """트레이싱이 꺼져 있을 때 돌려주는 span. 아무것도 기록하지 않는다."""
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        return False
+
+    def set(self, **attrs):
+        pass
+
+    def mark(self, name):
+        pass
+
+
+_NOOP_SPAN = _NoopSpan()
+
+
+class Span:
+    """with 블록 하나의 실행 시간. 끝나면 tracer의 exporter들로 넘어간다."""
+
+    _ids = itertools.count(1)
+
+    def __init__(self, tracer, name, attrs):
+        self.tracer = tracer
+        self.name = name
+        self.attrs = attrs
+        self.span_id = None
+        self.parent_id = None
+        self._started = None
+        self._token = None
+
+    def set(self, **attrs):
+        self.attrs.update(attrs)
+
+    def mark(self, name):
+        """span 시작부터 지금까지 걸린 시간을 name 속성으로 남긴다 (예: 첫 토큰)."""
+        self.attrs.setdefault(name, time.perf_counter() - self._started)
+
+    def __enter__(self):
+        parent = _current_span.get()
+        self.span_id = next(self._ids)
+        self.parent_id = parent.span_id if parent is not None else None
+        self._token = _current_span.set(self)
+        self._wall_started = time.time()
+        self._started = time.perf_counter()
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        duration = time.perf_counter() - self._started
+        try:
+            _current_span.reset(self._token)
+        except ValueError:
+            pass  # 제너레이터가 다른 컨텍스트에서 닫힌 경우
+        turn_id, session_id = _current_turn.get() or (None, None)
+        self.tracer._export(
+            {
+                "kind": "span",
+                "name": self.name,
+                "turn_id": turn_id,
+                "session_id": session_id,
+                "span_id": self.span_id,
+                "parent_id": self.parent_id,
+                "start": self._wall_started,
+                "duration": duration,
+                "thread": threading.current_thread().name,
+                "error": None if exc is None else repr(exc),
+                "attrs": self.attrs,
+            }
+        )
+        return False
+
+
+class Tracer:
+    """턴 단위 지연 시간 추적기.
+
+    enabled가 False면 span()은 공유 no-op 객체를 돌려주므로 거의 비용이 없다.
+    event()는 예전 print("Debug: ...")를 대신한다: "trace" 로거에 debug로 남기고,
+    트레이싱이 켜져 있으면 exporter에도 기록한다.
+    """
+
+    def __init__(self, enabled=False, exporters=None):
+        self.enabled = enabled
+        self.exporters = list(exporters or [])
+
+    def add_exporter(self, exporter):
+        self.exporters.append(exporter)
+        return exporter
+
+    def span(self, name, **attrs):
+        if not self.enabled:
+            return _NOOP_SPAN
+        return Span(self, name, attrs)
+
+    def traced(self, name=None):
+        """함수 호출 전체를 span으로 감싸는 데코레이터."""
+
+        def decorator(func):
+            span_name = name or func.__name__
+
+            @functools.wraps(func)
+            def wrapper(*args, **kwargs):
+                if not self.enabled:
+                    return func(*args, **kwargs)
+                with Span(self, span_name, {}):
+                    return func(*args, **kwargs)
+
+            return wrapper
+
+        return decorator
+
+    @contextmanager
+    def turn(self, session_id):
+        """이 블록 안(과 여기서 복사된 컨텍스트)의 span에 같은 turn_id를 붙인다."""
+        turn_id = uuid.uuid4().hex[:16]
+        token = _current_turn.set((turn_id, session_id))
+        try:
+            with self.span("turn"):
+                yield turn_id
+        finally:
+            _current_turn.reset(token)
+
+    def event(self, name, **attrs):
+        if logger.isEnabledFor(logging.DEBUG):
+            logger.debug("%s %s", name, attrs)
+        if not self.enabled:
+            return
+        turn_id, session_id = _current_turn.get() or (None, None)
+        self._export(
+            {
+                "kind": "event",
+                "name": name,
+                "turn_id": turn_id,
+                "session_id": session_id,
+                "start": time.time(),
+                "attrs": attrs,
+            }
+        )
+
+    def _export(self, record):
+        for exporter in self.exporters:
+            try:
+                exporter.export(record)
+            except Exception as e:
+                logger.warning("trace exporter 실패 - %s", e)
+
+    def close(self):
+        for exporter in self.exporters:
+            exporter.close()
+
+
+class JSONLExporter:
+    """span/event를 한 줄에 하나씩 JSON으로 파일에 덧붙인다 (쓰기는 별도 스레드에서)."""
+
+    def __init__(self, path):
+        self.path = path
+        self.queue = queue.Queue()
+        self.thread = threading.Thread(target=self._run, daemon=True)
+        self.thread.start()
+
+    def export(self, record):
+        self.queue.put(record)
+
+    def _run(self):
+        with open(self.path, "a", encoding="utf-8") as file:
+            while True:
+                record = self.queue.get()
+                if record is _STOP:
+                    return
+                line = json.dumps(record, ensure_ascii=False, default=str)
+                file.write(line + "\n")
+                if self.queue.empty():
+                    file.flush()
+
+    def close(self):
+        self.queue.put(_STOP)
+        self.thread.join()
+
+
+class PrometheusExporter:
+    """span 이름별 실행 시간 히스토그램을 Prometheus 텍스트 형식으로 내보낸다."""
+
+    def __init__(self, buckets=DEFAULT_BUCKETS, prefix="gpt_chatbot"):
+        self.buckets = tuple(sorted(buckets))
+        self.prefix = prefix
+        self._histograms = {}  # span 이름 -> [버킷별 개수, 합계, 개수, 에러 수]
+        self._lock = threading.Lock()
+        self.server = None
+
+    def export(self, record):
+        if record["kind"] != "span":
+            return
+        duration = record["duration"]
+        with self._lock:
+            histogram = self._histograms.get(record["name"])
+            if histogram is None:
+                histogram = [[0] * len(self.buckets), 0.0, 0, 0]
+                self._histograms[record["name"]] = histogram
+            for index, bound in enumerate(self.buckets):
+                if duration <= bound:
+                    histogram[0][index] += 1
+                    break
+            histogram[1] += duration
+            histogram[2] += 1
+            if record["error"] is not None:
+                histogram[3] += 1
+
+    def render(self):
+        metric = f"{self.prefix}_span_duration_seconds"
+        errors = f"{self.prefix}_span_errors_total"
+        lines = [
+            f"# HELP {metric} Span duration in seconds.",
+            f"# TYPE {metric} histogram",
+        ]
+        error_lines = [
+            f"# HELP {errors} Spans that raised an exception.",
+            f"# TYPE {errors} counter",
+        ]
+        with self._lock:
+            for name, (counts, total, count, failed) in sorted(
+                self._histograms.items()
+            ):
+                label = f'span="{name}"'
+                cumulative = 0
+                for bound, bucket_count in zip(self.buckets, counts):
+                    cumulative += bucket_count
+                    lines.append(
+                        f'{metric}_bucket{{{label},le="{bound}"}} {cumulative}'
+                    )
+                lines.append(f'{metric}_bucket{{{label},le="+Inf"}} {count}')
+                lines.append(f"{metric}_sum{{{label}}} {total}")
+                lines.append(f"{metric}_count{{{label}}} {count}")
+                error_lines.append(f"{errors}{{{label}}} {failed}")
+        text = "\n".join(lines + error_lines) + "\n"
+        for collector in _metric_collectors:
+            text += collector(self.prefix)
+        return text
+
+    def serve(self, port, host="127.0.0.1"):
+        """GET /metrics 로 render() 결과를 돌려주는 HTTP 서버를 백그라운드로 띄운다."""
+        exporter = self
+
+        class Handler(BaseHTTPRequestHandler):
+            def do_GET(self):
+                if self.path != "/metrics":
+                    self.send_error(404)
+                    return
+                body = exporter.render().encode("utf-8")
+                self.send_response(200)
+                self.send_header("Content-Type", "text/plain; version=0.0.4")
+                self.send_header("Content-Length", str(len(body)))
+                self.end_headers()
+                self.wfile.write(body)
+
+            def log_message(self, format, *args):
+                pass
+
+        self.server = ThreadingHTTPServer((host, port), Handler)
+        self.server.daemon_threads = True
+        threading.Thread(target=self.server.serve_forever, daemon=True).start()
+        return self
+
+    def close(self):
+        if self.server is not None:
+            self.server.shutdown()
+            self.server.server_close()
+            self.server = None
+
+
+# 모든 모듈이 공유하는 기본 tracer (configure_from_env()로 켠다)
+tracer = Tracer()
+
+
+def configure_from_env():
+    """환경 변수로 기본 tracer를 설정한다.
+
+    TRACE_ENABLED=1  span 기록 시작
+    TRACE_FILE       JSONL 트레이스 파일 (기본 traces.jsonl)
+    METRICS_PORT     지정하면 http://127.0.0.1:<port>/metrics 로 히스토그램 노출
+    TRACE_LOG=1      event()를 표준 에러로 출력 (예전 Debug print)
+    """
+    if os.environ.get("TRACE_LOG") == "1":
+        handler = logging.StreamHandler()
+        handler.setFormatter(logging.Formatter("Debug: %(message)s"))
+        logger.addHandler(handler)
+        logger.setLevel(logging.DEBUG)
+
+    if os.environ.get("TRACE_ENABLED") != "1":
+        return tracer
+
+    tracer.add_exporter(JSONLExporter(os.environ.get("TRACE_FILE", "traces.jsonl")))
+    port = os.environ.get("METRICS_PORT")
+    if port:
+        tracer.add_exporter(PrometheusExporter().serve(int(port)))
+    tracer.enabled = True
+    return tracer
@@ -0,0 +1,242 @@
+import hashlib
+import json
+import os
+import threading
+import time
+from collections import OrderedDict
+from concurrent.futures import ThreadPoolExecutor
+
+from tracing import tracer
+from voicevox_client import DEFAULT_PROSODY
+
+
+class TTSCache:
+    """합성 결과(WAV 바이트)를 내용 주소로 저장하는 2단 캐시.
+
+    키는 (텍스트, 화자 ID, 운율 파라미터, 엔진 버전)의 해시이고,
+    메모리 LRU 계층과 용량 제한이 있는 디스크 계층으로 구성된다.
+    VoicevoxClient.synthesize()와 같은 시그니처의 synthesize()를 제공하므로
+    클라이언트 대신 그대로 쓸 수 있다. 캐시 히트 시 VOICEVOX 요청이 전혀 나가지 않는다.
+
+    디스크 쓰기와 오래된 파일 정리는 전용 스레드가 맡으므로 합성 경로에서는
+    파일을 쓰지 않는다. 엔진 버전을 알 수 없는 동안에는 메모리 계층만 쓴다.
+    """
+
+    def __init__(
+        self,
+        client,
+        cache_dir=".tts_cache",
+        max_memory_items=128,
+        max_disk_bytes=200 * 1024 * 1024,
+        version_retry=30.0,
+    ):
+        self.client = client
+        self.cache_dir = cache_dir
+        self.max_memory_items = max_memory_items
+        self.max_disk_bytes = max_disk_bytes
+        self.version_retry = version_retry
+
+        self._memory = OrderedDict()
+        self._disk_index = {}  # key -> (크기, 마지막 사용 시각)
+        self._disk_bytes = 0
+        self._lock = threading.Lock()
+        self._engine_version = None
+        self._version_retry_at = 0.0
+        self._writer = ThreadPoolExecutor(
+            max_workers=1, thread_name_prefix="tts_cache"
+        )
+
+        self.hits_memory = 0
+        self.hits_disk = 0
+        self.misses = 0
+
+        os.makedirs(cache_dir, exist_ok=True)
+        self._load_disk_index()
+
+    @property
+    def engine_version(self):
+        """엔진 버전 문자열. 조회에 실패하면 None이고 version_retry초 뒤에 다시 묻는다."""
+        # 엔진 버전이 바뀌면 같은 텍스트라도 다른 음성이 나오므로 키에 포함한다
+        if self._engine_version is None and time.monotonic() >= self._version_retry_at:
+            try:
+                self._engine_version = str(self.client.version())
+            except Exception as e:
+                # 매 요청마다 재시도하지 않도록 잠시 기다렸다가 다시 묻는다
+                print(f"Error: VOICEVOX 버전 조회 실패 - {e}")
+                self._version_retry_at = time.monotonic() + self.version_retry
+        return self._engine_version
+
+    def make_key(self, text, speaker, prosody=None):
+        return self._key(text, speaker, prosody, self.engine_version)
+
+    @staticmethod
+    def _key(text, speaker, prosody, engine_version):
+        payload = json.dumps(
+            {
+                "text": text,
+                "speaker": str(speaker),
+                "prosody": DEFAULT_PROSODY if prosody is None else prosody,
+                "engine": engine_version,
+            },
+            sort_keys=True,
+            ensure_ascii=False,
+        )
+        return hashlib.sha256(payload.encode("utf-8")).hexdigest()
+
+    def _path(self, key):
+        return os.path.join(self.cache_dir, f"{key}.wav")
+
+    def _load_disk_index(self):
+        for entry in os.scandir(self.cache_dir):
+            if not entry.name.endswith(".wav"):
+                continue
+            stat = entry.stat()
+            self._disk_index[entry.name[:-4]] = (stat.st_size, stat.st_mtime)
+            self._disk_bytes += stat.st_size
+
+    def _remember(self, key, wav):
+        self._memory[key] = wav
+        self._memory.move_to_end(key)
+        while len(self._memory) > self.max_memory_items:
+            self._memory.popitem(last=False)
+
+    def _evict_disk(self):
+        # 가장 오래 사용하지 않은 파일부터 삭제 (쓰기 스레드에서 실행)
+        with self._lock:
+            if self._disk_bytes <= self.max_disk_bytes:
+                return
+            victims = []
+            for key, _ in sorted(
+                self._disk_index.items(), key=lambda item: item[1][1]
+            ):
+                if self._disk_bytes <= self.max_disk_bytes:
+                    break
+                size, _ = self._disk_index.pop(key)
+                self._disk_bytes -= size
+                victims.append(key)
+        for key in victims:
+            try:
+                os.remove(self._path(key))
+            except OSError:
+                pass
+
+    def get(self, key, disk=True):
+        with self._lock:
+            if key in self._memory:
+                self._memory.move_to_end(key)
+                self.hits_memory += 1
+                return self._memory[key]
+            on_disk = disk and key in self._disk_index
+            if not on_disk:
+                self.misses += 1
+                return None
+
+        # 파일 읽기는 잠금 밖에서 한다
+        try:
+            with tracer.span("tts_cache.read"):
+                with open(self._path(key), "rb") as file:
+                    wav = file.read()
+            os.utime(self._path(key))
+        except OSError:
+            with self._lock:
+                size, _ = self._disk_index.pop(key, (0, 0))
+                self._disk_bytes -= size
+                self.misses += 1
+            return None
+
+        with self._lock:
+            if key in self._disk_index:
+                self._disk_index[key] = (len(wav), time.time())
+            self._remember(key, wav)
+            self.hits_disk += 1
+        return wav
+
+    def _write(self, key, wav):
+        # 쓰다가 중단돼도 깨진 파일이 남지 않도록 임시 파일에 쓴 뒤 교체
+        tmp_path = f"{self._path(key)}.tmp"
+        try:
+            with tracer.span("tts_cache.write"):
+                with open(tmp_path, "wb") as file:
+                    file.write(wav)
+                os.replace(tmp_path, self._path(key))
+        except OSError as e:
+            print(f"Error: TTS 캐시 저장 실패 - {e}")
+            return
+
+        with self._lock:
+            old_size, _ = self._disk_index.get(key, (0, 0))
+            self._disk_index[key] = (len(wav), time.time())
+            self._disk_bytes += len(wav) - old_size
+        self._evict_disk()
+
+    def put(self, key, wav, disk=True):
+        """메모리에 넣고, disk면 쓰기 스레드에 디스크 저장을 맡긴다 (기다리지 않음)."""
+        with self._lock:
+            self._remember(key, wav)
+        if disk:
+            try:
+                self._writer.submit(self._write, key, wav)
+            except RuntimeError:
+                pass  # close() 이후
+
+    def _keys(self, texts, speaker, prosody):
+        engine_version = self.engine_version
+        # 버전을 모르는 동안의 결과는 버전 없는 키로 디스크에 남지 않게 한다
+        disk = engine_version is not None
+        keys = [self._key(text, speaker, prosody, engine_version) for text in texts]
+        return keys, disk
+
+    def synthesize(self, text, speaker, prosody=None):
+        [key], disk = self._keys([text], speaker, prosody)
+        wav = self.get(key, disk)
+        if wav is None:
+            wav = self.client.synthesize(text, speaker, prosody)
+            self.put(key, wav, disk)
+        return wav
+
+    def synthesize_many(self, texts, speaker, prosody=None, synthesize=None):
+        """여러 문구를 합성해 순서대로 반환한다. 캐시에 없는 문구만 합성한다.
+
+        synthesize(texts)를 주면 (예: /multi_synthesis 한 번) 없는 문구를 모아서
+        넘기고, 없으면 하나씩 client.synthesize()로 합성한다.
+        """
+        keys, disk = self._keys(texts, speaker, prosody)
+        wavs = [self.get(key, disk) for key in keys]
+        missing = [index for index, wav in enumerate(wavs) if wav is None]
+        if not missing:
+            return wavs
+
+        texts = [texts[index] for index in missing]
+        if synthesize is None:
+            results = [self.client.synthesize(text, speaker, prosody) for text in texts]
+        else:
+            results = synthesize(texts)
+        for index, wav in zip(missing, results):
+            wavs[index] = wav
+            self.put(keys[index], wav, disk)
+        return wavs
+
+    def prewarm(self, phrases, speaker, prosody=None):
+        """자주 쓰는 문구를 미리 합성해 둔다. 시작 시 백그라운드 스레드에서 호출한다."""
+        for phrase in phrases:
+            try:
+                self.synthesize(phrase, speaker, prosody)
+            except Exception as e:
+                print(f"Error: TTS 캐시 미리 채우기 실패 ({phrase}) - {e}")
+
+    def stats(self):
+        hits = self.hits_memory + self.hits_disk
+        total = hits + self.misses
+        return {
+            "hits_memory": self.hits_memory,
+            "hits_disk": self.hits_disk,
+            "misses": self.misses,
+            "hit_rate": hits / total if total else 0.0,
+            "memory_items": len(self._memory),
+            "disk_items": len(self._disk_index),
+            "disk_bytes": self._disk_bytes,
+        }
+
+    def close(self):
+        """밀린 디스크 쓰기를 마친다."""
+        self._writer.shutdown(wait=True)
@@ -0,0 +1,172 @@
+import contextvars
+import queue
+import re
+import threading
+import time
+
+# 문장 경계: 일본어 。！？, 한국어/영어 ! ? … 그리고 줄바꿈.
+# "." 은 소수점(3.5)이나 약어를 자르지 않도록 뒤에 공백이 올 때만 경계로 본다.
+SENTENCE_BOUNDARY = re.compile(
+    r"(?:[。！？!?…]+|\.(?=\s))[」』）)\"'”’]*\s*|\n+"
+)
+
+# 파이프라인 종료 신호
+_STOP = object()
+
+
+class SentenceSplitter:
+    """토큰을 조금씩 받아 완성된 문장을 돌려주는 증분 분할기."""
+
+    def __init__(self, min_chars=2):
+        self.min_chars = min_chars
+        self.buffer = ""
+
+    def feed(self, chunk):
+        """chunk를 덧붙이고 이번에 완성된 문장 목록을 반환한다."""
+        if not chunk:
+            return []
+        self.buffer += chunk
+
+        sentences = []
+        start = 0
+        for match in SENTENCE_BOUNDARY.finditer(self.buffer):
+            # 버퍼 끝에 걸린 경계는 닫는 괄호/따옴표가 더 올 수 있으므로 다음 토큰까지 보류
+            if match.end() == len(self.buffer):
+                break
+            sentence = self.buffer[start : match.end()].strip()
+            if len(sentence) >= self.min_chars:
+                sentences.append(sentence)
+                start = match.end()
+        self.buffer = self.buffer[start:]
+        return sentences
+
+    def flush(self):
+        """스트림이 끝났을 때 남은 텍스트를 마지막 문장으로 반환한다."""
+        rest = self.buffer.strip()
+        self.buffer = ""
+        return [rest] if rest else []
+
+
+def split_sentences(chunks, min_chars=2):
+    """토큰 스트림을 받아 문장이 완성될 때마다 하나씩 돌려주는 제너레이터."""
+    splitter = SentenceSplitter(min_chars)
+    for chunk in chunks:
+        yield from splitter.feed(chunk)
+    yield from splitter.flush()
+
+
+class SpeechPipeline:
+    """문장 단위로 합성과 재생을 겹쳐서 실행하는 파이프라인.
+
+    합성 스레드가 n+1 번째 문장을 합성하는 동안 재생 스레드는 n 번째 문장을 재생한다.
+    assembler(audio_assembly.ClipAssembler)를 주면 합성 스레드에서 클립의 앞뒤 무음을
+    자르고 문장 사이를 크로스페이드로 이어서 재생 큐에 넣는다.
+    """
+
+    def __init__(self, synthesize, play, max_pending=2, assembler=None):
+        self.synthesize = synthesize
+        self.play = play
+        self.assembler = assembler
+        self.text_queue = queue.Queue()
+        self.audio_queue = queue.Queue(maxsize=max_pending)
+
+        self.started_at = None
+        self.first_audio_at = None
+        self.errors = []
+
+        # 워커 스레드의 span도 같은 턴으로 묶이도록 만든 쪽의 컨텍스트를 복사해 넘긴다
+        self._synth_thread = threading.Thread(
+            target=contextvars.copy_context().run,
+            args=(self._synth_worker,),
+            daemon=True,
+        )
+        self._play_thread = threading.Thread(
+            target=contextvars.copy_context().run,
+            args=(self._play_worker,),
+            daemon=True,
+        )
+
+    def start(self):
+        self.started_at = time.perf_counter()
+        self._synth_thread.start()
+        self._play_thread.start()
+        return self
+
+    def feed(self, sentence):
+        self.text_queue.put(sentence)
+
+    def close(self):
+        self.text_queue.put(_STOP)
+
+    def join(self):
+        self._synth_thread.join()
+        self._play_thread.join()
+
+    @property
+    def time_to_first_audio(self):
+        if self.started_at is None or self.first_audio_at is None:
+            return None
+        return self.first_audio_at - self.started_at
+
+    def _synth_worker(self):
+        if self.assembler is not None:
+            self.assembler.reset()
+        index = 0
+        while True:
+            sentence = self.text_queue.get()
+            if sentence is _STOP:
+                if self.assembler is not None:
+                    for audio in self.assembler.flush():
+                        self.audio_queue.put(audio)
+                self.audio_queue.put(_STOP)
+                return
+            try:
+                audio = self.synthesize(sentence, index)
+            except Exception as e:
+                print(f"Error: 음성 합성 실패 - {e}")
+                self.errors.append(e)
+                continue
+            if self.assembler is None:
+                self.audio_queue.put(audio)
+            else:
+                for part in self.assembler.process(audio):
+                    self.audio_queue.put(part)
+            index += 1
+
+    def _play_worker(self):
+        while True:
+            audio = self.audio_queue.get()
+            if audio is _STOP:
+                return
+            if self.first_audio_at is None:
+                self.first_audio_at = time.perf_counter()
+            try:
+                self.play(audio)
+            except Exception as e:
+                print(f"Error: 음성 재생 실패 - {e}")
+                self.errors.append(e)
+
+
+def speak_streaming(chunks, synthesize, play, on_text=None, assembler=None):
+    """LLM 토큰 스트림을 문장 단위로 끊어 바로 합성/재생한다.
+
+    전체 응답 텍스트와 time-to-first-audio(초)를 반환한다.
+    """
+    collected = []
+
+    def _tee():
+        for chunk in chunks:
+            collected.append(chunk)
+            if on_text:
+                on_text(chunk)
+            yield chunk
+
+    pipeline = SpeechPipeline(synthesize, play, assembler=assembler).start()
+    try:
+        for sentence in split_sentences(_tee()):
+            pipeline.feed(sentence)
+    finally:
+        pipeline.close()
+        pipeline.join()
+
+    return "".join(collected), pipeline.time_to_first_audio
@@ -0,0 +1,467 @@
+"""마이크 음성 입력: 콜백 모드 캡처 -> 에너지 기반 VAD -> 음성 인식.
+
+PyAudio 콜백은 링 버퍼에 쓰기만 하고, VAD 스레드가 프레임 단위로 읽어 발화의
+시작과 끝을 찾는다. 끝난 발화는 교체 가능한 STT 백엔드로 넘긴다.
+마이크 대신 WAV 파일을 넣어 끝점 검출 지연과 CPU 사용량을 잴 수 있다.
+
+    python voice_input.py bench sample.wav   # 발화별 끝점 지연, 실시간 대비 CPU
+    python voice_input.py bench sample.wav -44   # -44dBFS 백색 소음을 섞어서 측정
+    python voice_input.py mic                # 마이크로 받아 인식 결과 출력
+"""
+
+import collections
+import io
+import os
+import queue
+import sys
+import threading
+import time
+import wave
+
+import numpy as np
+
+# VAD 프레임 길이. 16kHz에서 30ms = 480 프레임
+DEFAULT_RATE = 16000
+DEFAULT_FRAME_MS = 30
+
+_STOP = object()
+
+
+def frame_level(frame):
+    """16bit PCM 프레임의 RMS 레벨(dBFS)."""
+    samples = np.frombuffer(frame, dtype=np.int16).astype(np.float32) / 32768.0
+    if len(samples) == 0:
+        return -100.0
+    rms = np.sqrt(np.dot(samples, samples) / len(samples))
+    return 20 * np.log10(max(rms, 1e-10))
+
+
+def add_noise(pcm, level_db, seed=0):
+    """16bit PCM에 level_db(dBFS RMS) 백색 소음을 섞는다 (시끄러운 환경 재현용)."""
+    samples = np.frombuffer(pcm, dtype=np.int16).astype(np.float32)
+    rng = np.random.default_rng(seed)
+    noise = rng.standard_normal(len(samples)) * 32768.0 * 10 ** (level_db / 20)
+    mixed = np.clip(np.rint(samples + noise), -32768, 32767)
+    return mixed.astype(np.int16).tobytes()
+
+
+class Utterance:
+    """끝점이 검출된 발화 하나.
+
+    started_at, ended_at: 스트림 시작부터의 말소리 시작/끝 (초)
+    detected_at: 끝점을 판정한 시점 (초). detected_at - ended_at이 끝점 검출 지연이다.
+    """
+
+    def __init__(self, pcm, rate, started_at, ended_at, detected_at):
+        self.pcm = pcm
+        self.rate = rate
+        self.sample_width = 2
+        self.channels = 1
+        self.started_at = started_at
+        self.ended_at = ended_at
+        self.detected_at = detected_at
+        self.text = None
+
+    @property
+    def duration(self):
+        return len(self.pcm) / (self.rate * self.sample_width)
+
+    @property
+    def endpoint_latency(self):
+        return self.detected_at - self.ended_at
+
+    def to_wav_bytes(self):
+        buffer = io.BytesIO()
+        with wave.open(buffer, "wb") as wav_file:
+            wav_file.setnchannels(self.channels)
+            wav_file.setsampwidth(self.sample_width)
+            wav_file.setframerate(self.rate)
+            wav_file.writeframes(self.pcm)
+        return buffer.getvalue()
+
+
+class EnergyVAD:
+    """프레임 에너지로 말소리 구간을 찾는 가벼운 VAD.
+
+    최근 noise_window_s 동안의 프레임 레벨 중 noise_percentile 백분위를 배경 소음
+    레벨로 보고, 그보다 margin_db 큰 프레임을 말소리로 본다. 말소리 사이사이의
+    쉼도 창에 들어가므로 말하는 중에도 소음 추정치가 말소리 쪽으로 끌려가지 않는다.
+    start_frames개가 연속으로 말소리면 발화 시작, end_silence_ms 동안 조용하면 끝.
+    시작 직전 pre_roll_ms는 링(deque)에 들고 있다가 발화 앞에 붙여 첫 음절이
+    잘리지 않게 한다.
+    """
+
+    def __init__(
+        self,
+        rate=DEFAULT_RATE,
+        frame_ms=DEFAULT_FRAME_MS,
+        margin_db=12.0,
+        min_level_db=-50.0,
+        start_frames=3,
+        end_silence_ms=600,
+        pre_roll_ms=300,
+        max_utterance_s=15.0,
+        noise_window_s=5.0,
+        noise_percentile=10,
+    ):
+        self.rate = rate
+        self.frame_ms = frame_ms
+        self.frame_bytes = rate * frame_ms // 1000 * 2
+        self.margin_db = margin_db
+        self.min_level_db = min_level_db
+        self.start_frames = start_frames
+        self.end_frames = max(1, end_silence_ms // frame_ms)
+        self.max_frames = int(max_utterance_s * 1000 // frame_ms)
+
+        self.noise_percentile = noise_percentile
+        self.noise_db = None  # 첫 프레임을 받으면 정해진다
+        self._levels = collections.deque(
+            maxlen=max(1, int(noise_window_s * 1000 // frame_ms))
+        )
+        self._pre_roll = collections.deque(maxlen=max(1, pre_roll_ms // frame_ms))
+        self._frames = []
+        self._voiced_run = 0
+        self._silent_run = 0
+        self._position = 0  # 지금까지 받은 프레임 수
+        self._speech_start = None
+        self._last_voiced = None
+
+    @property
+    def in_speech(self):
+        return self._speech_start is not None
+
+    def _seconds(self, frames):
+        return frames * self.frame_ms / 1000
+
+    def _is_voiced(self, level):
+        # 말소리 여부와 상관없이 모든 프레임으로 소음 레벨을 추정한다
+        self._levels.append(level)
+        self.noise_db = float(np.percentile(self._levels, self.noise_percentile))
+        return level > max(self.min_level_db, self.noise_db + self.margin_db)
+
+    def feed(self, frame):
+        """프레임 하나를 넣는다. 발화가 끝났으면 Utterance, 아니면 None."""
+        voiced = self._is_voiced(frame_level(frame))
+        self._position += 1
+
+        if not self.in_speech:
+            self._pre_roll.append(frame)
+            self._voiced_run = self._voiced_run + 1 if voiced else 0
+            if self._voiced_run >= self.start_frames:
+                self._speech_start = self._position - len(self._pre_roll)
+                self._frames = list(self._pre_roll)
+                self._pre_roll.clear()
+                self._silent_run = 0
+                self._last_voiced = self._position
+            return None
+
+        self._frames.append(frame)
+        if voiced:
+            self._silent_run = 0
+            self._last_voiced = self._position
+        else:
+            self._silent_run += 1
+        if self._silent_run >= self.end_frames or len(self._frames) >= self.max_frames:
+            return self._finish()
+        return None
+
+    def _finish(self):
+        # 끝의 무음은 끝점 판정에만 쓰고 발화에서는 뺀다 (조금만 남긴다)
+        keep = len(self._frames) - self._silent_run + min(self._silent_run, 3)
+        utterance = Utterance(
+            b"".join(self._frames[:keep]),
+            self.rate,
+            self._seconds(self._speech_start),
+            self._seconds(self._last_voiced),
+            self._seconds(self._position),
+        )
+        self._frames = []
+        self._speech_start = None
+        self._voiced_run = 0
+        self._silent_run = 0
+        return utterance
+
+    def flush(self):
+        """입력이 끝났을 때 진행 중이던 발화를 마무리한다."""
+        return self._finish() if self.in_speech else None
+
+
+class MicrophoneSource:
+    """PyAudio 콜백 모드로 입력 장치를 읽어 VAD 프레임을 돌려준다.
+
+    콜백은 링 버퍼에 쓰기만 하므로 VAD나 STT가 느려도 캡처가 밀리지 않는다
+    (버퍼가 가득 차면 가장 새 오디오를 버린다).
+    """
+
+    def __init__(
+        self,
+        device=None,
+        rate=DEFAULT_RATE,
+        frame_ms=DEFAULT_FRAME_MS,
+        pa=None,
+        buffer_seconds=5.0,
+    ):
+        from audio_router import RingBuffer
+
+        self.device = device
+        self.rate = rate
+        self.frame_bytes = rate * frame_ms // 1000 * 2
+        self._pa = pa
+        self._owns_pa = pa is None
+        self.ring = RingBuffer(int(rate * buffer_seconds) * 2)
+        self.stream = None
+        self._continue = None
+        self._closed = threading.Event()
+
+    def _callback(self, in_data, frame_count, time_info, status):
+        self.ring.write(in_data, timeout=0)
+        return (None, self._continue)
+
+    def start(self):
+        import pyaudio
+
+        self._continue = pyaudio.paContinue
+        if self._pa is None:
+            self._pa = pyaudio.PyAudio()
+        self.stream = self._pa.open(
+            format=pyaudio.paInt16,
+            channels=1,
+            rate=self.rate,
+            input=True,
+            input_device_index=self.device,
+            frames_per_buffer=self.frame_bytes // 2,
+            stream_callback=self._callback,
+        )
+        self.stream.start_stream()
+        return self
+
+    def frames(self):
+        while not self._closed.is_set():
+            if self.ring.wait_readable(self.frame_bytes, timeout=0.1):
+                yield self.ring.read(self.frame_bytes)
+
+    def close(self):
+        self._closed.set()
+        if self.stream is not None:
+            self.stream.stop_stream()
+            self.stream.close()
+            self.stream = None
+        if self._owns_pa and self._pa is not None:
+            self._pa.terminate()
+            self._pa = None
+
+
+class WavFileSource:
+    """WAV 파일을 VAD 프레임으로 돌려준다 (16bit 모노). realtime이면 실제 속도로."""
+
+    def __init__(self, path, frame_ms=DEFAULT_FRAME_MS, realtime=False):
+        with wave.open(path, "rb") as wav_file:
+            if wav_file.getsampwidth() != 2 or wav_file.getnchannels() != 1:
+                raise ValueError(f"{path}: 16bit 모노 WAV만 지원합니다.")
+            self.rate = wav_file.getframerate()
+            self.pcm = wav_file.readframes(wav_file.getnframes())
+        self.frame_bytes = self.rate * frame_ms // 1000 * 2
+        self.frame_seconds = frame_ms / 1000
+        self.realtime = realtime
+
+    @property
+    def duration(self):
+        return len(self.pcm) / (self.rate * 2)
+
+    def start(self):
+        return self
+
+    def frames(self):
+        started = time.perf_counter()
+        count = len(self.pcm) // self.frame_bytes
+        for index in range(count):
+            if self.realtime:
+                delay = started + index * self.frame_seconds - time.perf_counter()
+                if delay > 0:
+                    time.sleep(delay)
+            yield self.pcm[index * self.frame_bytes : (index + 1) * self.frame_bytes]
+
+    def close(self):
+        pass
+
+
+class StubSTT:
+    """테스트용 로컬 STT. 정해 둔 문장을 차례로 돌려주고, 없으면 길이를 적는다."""
+
+    def __init__(self, replies=()):
+        self.replies = collections.deque(replies)
+        self.calls = []
+
+    def transcribe(self, utterance):
+        self.calls.append(utterance)
+        if self.replies:
+            return self.replies.popleft()
+        return f"({utterance.duration:.1f}초 발화)"
+
+
+class OpenAISTT:
+    """OpenAI 음성 인식 API (/audio/transcriptions) 백엔드."""
+
+    def __init__(self, api_key=None, model="whisper-1", language="ko", timeout=30.0):
+        import httpx
+
+        self.api_key = api_key or os.environ["OPENAI_API_KEY"]
+        self.model = model
+        self.language = language
+        self.client = httpx.Client(timeout=timeout)
+
+    def transcribe(self, utterance):
+        res = self.client.post(
+            "https://api.openai.com/v1/audio/transcriptions",
+            headers={"Authorization": f"Bearer {self.api_key}"},
+            data={"model": self.model, "language": self.language},
+            files={"file": ("speech.wav", utterance.to_wav_bytes(), "audio/wav")},
+        )
+        res.raise_for_status()
+        return res.json()["text"].strip()
+
+    def close(self):
+        self.client.close()
+
+
+# STT_BACKEND 환경 변수로 고르는 백엔드
+STT_BACKENDS = {"stub": StubSTT, "openai": OpenAISTT}
+
+
+def create_stt(name=None):
+    name = name or os.environ.get("STT_BACKEND", "openai")
+    if name not in STT_BACKENDS:
+        raise ValueError(f"알 수 없는 STT 백엔드: {name} ({', '.join(STT_BACKENDS)})")
+    return STT_BACKENDS[name]()
+
+
+class VoiceInput:
+    """소스 -> VAD -> STT를 이어 인식된 발화를 차례로 돌려준다.
+
+    VAD는 별도 스레드에서 돌고 STT는 utterances()를 도는 스레드에서 돌아서,
+    인식하는 동안에도 다음 발화의 끝점 검출이 계속된다. 응답을 스피커로 재생하는
+    동안에는 pause()로 입력을 무시해 자기 목소리를 발화로 잡지 않게 한다.
+    """
+
+    def __init__(self, source, stt, vad=None):
+        self.source = source
+        self.stt = stt
+        self.vad = vad or EnergyVAD(rate=source.rate)
+        self._results = None
+        self._paused = threading.Event()
+
+    def _drain(self):
+        # 멈추기 직전에 끝난 발화가 다음 턴의 입력으로 나가지 않게 버린다
+        if self._results is None:
+            return
+        while True:
+            try:
+                item = self._results.get_nowait()
+            except queue.Empty:
+                return
+            if item is _STOP:
+                self._results.put(_STOP)
+                return
+
+    def pause(self):
+        self._paused.set()
+        self._drain()
+
+    def resume(self):
+        self._drain()
+        self._paused.clear()
+
+    def _detect(self):
+        try:
+            for frame in self.source.frames():
+                if self._paused.is_set():
+                    self.vad.flush()  # 진행 중이던 발화는 버린다
+                    continue
+                utterance = self.vad.feed(frame)
+                if utterance is not None:
+                    self._results.put(utterance)
+            utterance = self.vad.flush()
+            if utterance is not None:
+                self._results.put(utterance)
+        finally:
+            self._results.put(_STOP)
+
+    def utterances(self):
+        """인식 결과(text)가 채워진 Utterance를 발화가 끝나는 순서대로 돌려준다."""
+        self._results = queue.Queue()
+        self.source.start()
+        threading.Thread(target=self._detect, daemon=True).start()
+        try:
+            while True:
+                utterance = self._results.get()
+                if utterance is _STOP:
+                    return
+                try:
+                    utterance.text = self.stt.transcribe(utterance)
+                except Exception as e:
+                    print(f"Error: 음성 인식 실패 - {e}")
+                    continue
+                if utterance.text:
+                    yield utterance
+        finally:
+            self.source.close()
+
+    def texts(self):
+        for utterance in self.utterances():
+            yield utterance.text
+
+
+def benchmark(path, vad=None, noise_db=None):
+    """WAV 파일로 끝점 검출 지연과 VAD CPU 사용량을 잰다 (STT 제외).
+
+    noise_db를 주면 그 레벨의 백색 소음을 섞어서 잰다.
+    """
+    source = WavFileSource(path)
+    if noise_db is not None:
+        source.pcm = add_noise(source.pcm, noise_db)
+    vad = vad or EnergyVAD(rate=source.rate)
+    utterances = []
+    cpu_started = time.process_time()
+    for frame in source.frames():
+        utterance = vad.feed(frame)
+        if utterance is not None:
+            utterances.append(utterance)
+    utterance = vad.flush()
+    if utterance is not None:
+        utterances.append(utterance)
+    cpu = time.process_time() - cpu_started
+    return utterances, cpu, source.duration
+
+
+def main(argv=None):
+    argv = sys.argv[1:] if argv is None else argv
+    if len(argv) in (2, 3) and argv[0] == "bench":
+        noise_db = float(argv[2]) if len(argv) == 3 else None
+        utterances, cpu, duration = benchmark(argv[1], noise_db=noise_db)
+        for index, u in enumerate(utterances):
+            print(
+                f"#{index} {u.started_at:7.2f}s - {u.ended_at:7.2f}s "
+                f"endpoint latency {u.endpoint_latency * 1000:5.0f}ms"
+            )
+        print(f"VAD CPU {cpu:.3f}s / 오디오 {duration:.1f}s ({cpu / duration:.4f}x)")
+        return 0
+    if argv == ["mic"]:
+        from audio_devices import DeviceRegistry, device_pattern
+
+        registry = DeviceRegistry()
+        device = registry.resolve_or_default(device_pattern("microphone"), "input")
+        voice = VoiceInput(MicrophoneSource(device, pa=registry.pa), create_stt())
+        try:
+            for utterance in voice.utterances():
+                print(f"[{utterance.endpoint_latency * 1000:.0f}ms] {utterance.text}")
+        except KeyboardInterrupt:
+            pass
+        finally:
+            registry.close()
+        return 0
+    print(__doc__)
+    return 1
+
+
+if __name__ == "__main__":
+    sys.exit(main())
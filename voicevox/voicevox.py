@@ -1,13 +1,15 @@
 import os
-import requests
-import urllib.parse
+import sys
 import winsound
 from dotenv import load_dotenv
 
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+from voicevox_client import VoicevoxClient
+
 load_dotenv()
 
-# Set the base URL for the Voicevox API
-base_url = 'http://localhost:50021'
+# VOICEVOX API client (VOICEVOX_HOST / VOICEVOX_PORT, default localhost:50021)
+client = VoicevoxClient()
 
 # Function to convert text to speech using VoiceVox and play it
 def speak_with_voicevox(text):
@@ -17,32 +19,16 @@ def speak_with_voicevox(text):
     # 8, 10, 14, 20, 54, 61, 66, 69
     # 80번까지 확인해봤음
 
-    # Create the query for VoiceVox API
-    params_encoded = urllib.parse.urlencode({'text': text, 'speaker': speaker_id})
-    req = requests.post(f'{base_url}/audio_query?{params_encoded}')
-    req.raise_for_status()  # 요청 실패 시 에러 발생
-
-    # Get the query response
-    query = req.json()
-    
-    # Optional: Modify query parameters like volume, intonation, etc.
-    query['volumeScale'] = 1.00  # 音量 (음량)
-    query['intonationScale'] = 1.00  # 抑揚 (억양)
-    query['prePhonemeLength'] = 0.10  # 開始無音 (시작 무음)
-    query['postPhonemeLength'] = 0.10  # 終了無音 (종료 무음)
-
-    # Synthesize the voice
-    params_encoded = urllib.parse.urlencode({'speaker': speaker_id})
-    req = requests.post(f'{base_url}/synthesis?{params_encoded}', json=query)
-    req.raise_for_status()  # 요청 실패 시 에러 발생
-
-    # Save the synthesized voice to a file
-    speech_filename = 'speech.wav'
-    with open(speech_filename, 'wb') as outfile:
-        outfile.write(req.content)
+    # Synthesize the voice (audio_query + synthesis)
+    wav = client.synthesize(text, speaker_id, prosody={
+        'volumeScale': 1.00,  # 音量 (음량)
+        'intonationScale': 1.00,  # 抑揚 (억양)
+        'prePhonemeLength': 0.10,  # 開始無音 (시작 무음)
+        'postPhonemeLength': 0.10,  # 終了無音 (종료 무음)
+    })
 
-    # Play the synthesized voice
-    winsound.PlaySound(speech_filename, winsound.SND_FILENAME)
+    # Play the synthesized voice from memory
+    winsound.PlaySound(wav, winsound.SND_MEMORY)
 
 # Example usage of the speak_with_voicevox function with the msg variable
 # msg = "これはテストメッセージです。"  # This is the Japanese text you want to convert to speech
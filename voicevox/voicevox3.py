@@ -1,36 +1,27 @@
-import requests, json
 import io
+import os
+import sys
 import wave
 import pyaudio
 import time
 
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+from voicevox_client import VoicevoxClient
+
 
 class Voicevox:
-    def __init__(self,host="172.21.240.1",port=50021):
-        self.host = host
-        self.port = port
+    # host/port を省略すると VOICEVOX_HOST / VOICEVOX_PORT (既定 localhost:50021) を使う
+    def __init__(self,host=None,port=None):
+        self.client = VoicevoxClient(host=host, port=port)
 
     def speak(self,text=None,speaker=8): # VOICEVOX:ナースロボ＿タイプＴ
 
-        params = (
-            ("text", text),
-            ("speaker", speaker)  # 音声の種類をInt型で指定
-        )
-
-        init_q = requests.post(
-            f"http://{self.host}:{self.port}/audio_query",
-            params=params
-        )
-
-        res = requests.post(
-            f"http://{self.host}:{self.port}/synthesis",
-            headers={"Content-Type": "application/json"},
-            params=params,
-            data=json.dumps(init_q.json())
-        )
+        # audio_query の結果をそのまま合成 (音声の種類をInt型で指定)
+        query = self.client.audio_query(text, speaker)
+        wav = self.client.synthesis(query, speaker)
 
         # メモリ上で展開
-        audio = io.BytesIO(res.content)
+        audio = io.BytesIO(wav)
 
         with wave.open(audio,'rb') as f:
             # 以下再生用処理
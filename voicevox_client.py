@@ -0,0 +1,212 @@
+import asyncio
+import io
+import json
+import os
+import random
+import threading
+import time
+import zipfile
+from collections import OrderedDict
+
+import requests
+from requests.adapters import HTTPAdapter
+
+from tracing import tracer
+
+# speak_with_voicevox()에서 쓰던 기본 운율 설정
+DEFAULT_PROSODY = {
+    "volumeScale": 1.00,  # 音量 (음량)
+    "intonationScale": 0.60,  # 抑揚 (억양)
+    "prePhonemeLength": 0.10,  # 開始無音 (시작 무음)
+    "postPhonemeLength": 0.10,  # 終了無音 (종료 무음)
+}
+
+# 재시도할 HTTP 상태 코드 (엔진 과부하/재시작 중)
+RETRY_STATUS = {429, 500, 502, 503, 504}
+
+
+class VoicevoxError(Exception):
+    pass
+
+
+class VoicevoxClient:
+    """keep-alive 세션을 재사용하는 VOICEVOX 엔진 클라이언트.
+
+    동기(synthesize)와 asyncio(asynthesize) 인터페이스를 모두 제공하고,
+    동시 요청 수는 max_concurrency로 제한한다. 모든 요청에 타임아웃과
+    백오프 재시도가 걸려 있어서 엔진이 느려도 chat()이 무한정 멈추지 않는다.
+
+    audio_query 결과는 (텍스트, 화자)별로 최근 query_cache_size개를 기억한다.
+    운율 값은 받은 쿼리에 덮어쓰기만 하므로, 운율만 바꿔 다시 합성할 때는
+    /audio_query 없이 /synthesis 한 번으로 끝난다.
+    """
+
+    def __init__(
+        self,
+        host=None,
+        port=None,
+        timeout=(3.05, 60.0),
+        max_retries=3,
+        backoff=0.5,
+        max_concurrency=2,
+        query_cache_size=256,
+    ):
+        self.host = host or os.environ.get("VOICEVOX_HOST", "localhost")
+        self.port = int(port or os.environ.get("VOICEVOX_PORT", 50021))
+        self.timeout = timeout  # (연결, 읽기) 초
+        self.max_retries = max_retries
+        self.backoff = backoff
+
+        self.session = requests.Session()
+        adapter = HTTPAdapter(
+            pool_connections=1, pool_maxsize=max(max_concurrency, 1) * 2
+        )
+        self.session.mount("http://", adapter)
+        self.session.mount("https://", adapter)
+
+        self._semaphore = threading.BoundedSemaphore(max_concurrency)
+
+        # (텍스트, 화자) -> audio_query 응답 본문. 꺼낼 때마다 새로 파싱하므로
+        # 호출한 쪽이 쿼리를 고쳐도 캐시된 값은 바뀌지 않는다
+        self.query_cache_size = query_cache_size
+        self._queries = OrderedDict()
+        self._queries_lock = threading.Lock()
+        self.query_hits = 0
+        self.query_misses = 0
+
+    @property
+    def base_url(self):
+        return f"http://{self.host}:{self.port}"
+
+    def _request(self, method, path, **kwargs):
+        # span 이름 예: voicevox.audio_query, voicevox.synthesis
+        with tracer.span("voicevox" + path.replace("/", ".")) as span:
+            return self._request_with_retry(method, path, span, **kwargs)
+
+    def _request_with_retry(self, method, path, span, **kwargs):
+        url = f"{self.base_url}{path}"
+        for attempt in range(self.max_retries + 1):
+            try:
+                with self._semaphore:
+                    res = self.session.request(
+                        method, url, timeout=self.timeout, **kwargs
+                    )
+                if res.status_code not in RETRY_STATUS:
+                    res.raise_for_status()
+                    return res
+                error = VoicevoxError(f"{path} 응답 코드 {res.status_code}")
+            except (requests.ConnectionError, requests.Timeout) as e:
+                error = e
+
+            if attempt == self.max_retries:
+                break
+            span.set(retries=attempt + 1)
+            # 지수 백오프 + 지터
+            time.sleep(self.backoff * (2**attempt) * random.uniform(0.5, 1.5))
+
+        raise VoicevoxError(f"VOICEVOX 요청 실패 ({path}): {error}") from error
+
+    def version(self):
+        """엔진 버전 문자열 (예: "0.14.5")."""
+        return self._request("GET", "/version").json()
+
+    def initialize_speaker(self, speaker, skip_reinit=True):
+        """화자 모델을 미리 로드해 둔다 (첫 합성 때의 모델 로딩 지연 제거)."""
+        self._request(
+            "POST",
+            "/initialize_speaker",
+            params={"speaker": speaker, "skip_reinit": str(skip_reinit).lower()},
+        )
+
+    def user_dict(self):
+        """엔진 사용자 사전 전체 ({단어 UUID: 항목})."""
+        return self._request("GET", "/user_dict").json()
+
+    def add_user_dict_word(self, surface, pronunciation, accent_type=0):
+        """엔진 사용자 사전에 단어를 등록한다. pronunciation은 가타카나. UUID를 반환."""
+        res = self._request(
+            "POST",
+            "/user_dict_word",
+            params={
+                "surface": surface,
+                "pronunciation": pronunciation,
+                "accent_type": accent_type,
+            },
+        )
+        # 사전이 바뀌면 같은 텍스트라도 읽기/악센트가 달라지므로 쿼리를 다시 받는다
+        self.clear_query_cache()
+        return res.json()
+
+    def audio_query(self, text, speaker):
+        """텍스트 분석 결과(AudioQuery)를 반환한다. 반환값은 자유롭게 고쳐도 된다."""
+        key = (text, str(speaker))
+        with self._queries_lock:
+            body = self._queries.get(key)
+            if body is not None:
+                self._queries.move_to_end(key)
+                self.query_hits += 1
+            else:
+                self.query_misses += 1
+        if body is None:
+            res = self._request(
+                "POST", "/audio_query", params={"text": text, "speaker": speaker}
+            )
+            body = res.content
+            self._remember_query(key, body)
+        return json.loads(body)
+
+    def _remember_query(self, key, body):
+        if self.query_cache_size <= 0:
+            return
+        with self._queries_lock:
+            self._queries[key] = body
+            self._queries.move_to_end(key)
+            while len(self._queries) > self.query_cache_size:
+                self._queries.popitem(last=False)
+
+    def clear_query_cache(self):
+        with self._queries_lock:
+            self._queries.clear()
+
+    def query_cache_stats(self):
+        with self._queries_lock:
+            return {
+                "items": len(self._queries),
+                "hits": self.query_hits,
+                "misses": self.query_misses,
+            }
+
+    def synthesis(self, query, speaker):
+        res = self._request(
+            "POST", "/synthesis", params={"speaker": speaker}, json=query
+        )
+        return res.content
+
+    def multi_synthesis(self, queries, speaker):
+        """여러 AudioQuery를 한 번의 요청으로 합성한다. 순서대로 WAV 바이트 목록을 반환."""
+        res = self._request(
+            "POST", "/multi_synthesis", params={"speaker": speaker}, json=queries
+        )
+        with zipfile.ZipFile(io.BytesIO(res.content)) as archive:
+            return [archive.read(name) for name in sorted(archive.namelist())]
+
+    def synthesize(self, text, speaker, prosody=None):
+        """audio_query에 운율 설정을 덮어쓴 뒤 합성한 WAV 바이트를 반환한다.
+
+        같은 텍스트/화자의 쿼리가 캐시에 있으면 /synthesis만 요청한다.
+        """
+        query = self.audio_query(text, speaker)
+        query.update(DEFAULT_PROSODY if prosody is None else prosody)
+        return self.synthesis(query, speaker)
+
+    async def aaudio_query(self, text, speaker):
+        return await asyncio.to_thread(self.audio_query, text, speaker)
+
+    async def asynthesis(self, query, speaker):
+        return await asyncio.to_thread(self.synthesis, query, speaker)
+
+    async def asynthesize(self, text, speaker, prosody=None):
+        return await asyncio.to_thread(self.synthesize, text, speaker, prosody)
+
+    def close(self):
+        self.session.close()